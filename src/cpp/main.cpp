@@ -88,6 +88,9 @@ struct RunConfig {
 
   // true to use CUDA execution provider
   bool useCuda = false;
+
+  // Onnx runtime session settings
+  piper::SessionConfig sessionConfig;
 };
 
 void parseArgs(int argc, char *argv[], RunConfig &runConfig);
@@ -115,6 +118,8 @@ int main(int argc, char *argv[]) {
                 runConfig.modelPath.string(),
                 runConfig.modelConfigPath.string());
 
+  voice.session.config = runConfig.sessionConfig;
+
   auto startTime = chrono::steady_clock::now();
   loadVoice(piperConfig, runConfig.modelPath.string(),
             runConfig.modelConfigPath.string(), voice, runConfig.speakerId,
@@ -440,6 +445,25 @@ void printUsage(char *argv[]) {
        << endl;
   cerr << "   --use-cuda                    use CUDA execution provider"
        << endl;
+  cerr << "   --intra_op_threads      NUM   threads used within an operator "
+          "(default: onnxruntime)"
+       << endl;
+  cerr << "   --inter_op_threads      NUM   threads used between operators "
+          "(default: onnxruntime)"
+       << endl;
+  cerr << "   --parallel_execution          run operators in parallel" << endl;
+  cerr << "   --graph_optimization    STR   disable, basic, extended, or all "
+          "(default: disable)"
+       << endl;
+  cerr << "   --use_mem_arena               pre-allocate a CPU memory arena"
+       << endl;
+  cerr << "   --use_mem_pattern             pre-plan memory allocations" << endl;
+  cerr << "   --thread_affinities     STR   logical processors for intra-op "
+          "threads (e.g., \"1,2;3,4\")"
+       << endl;
+  cerr << "   --save_optimized_model  FILE  save optimized model, or load it if "
+          "it exists"
+       << endl;
   cerr << "   --debug                       print DEBUG messages to the console"
        << endl;
   cerr << "   -q       --quiet              disable logging" << endl;
@@ -525,6 +549,47 @@ void parseArgs(int argc, char *argv[], RunConfig &runConfig) {
       runConfig.jsonInput = true;
     } else if (arg == "--use_cuda" || arg == "--use-cuda") {
       runConfig.useCuda = true;
+    } else if (arg == "--intra_op_threads" || arg == "--intra-op-threads") {
+      ensureArg(argc, argv, i);
+      runConfig.sessionConfig.intraOpNumThreads = stoi(argv[++i]);
+    } else if (arg == "--inter_op_threads" || arg == "--inter-op-threads") {
+      ensureArg(argc, argv, i);
+      runConfig.sessionConfig.interOpNumThreads = stoi(argv[++i]);
+    } else if (arg == "--parallel_execution" ||
+               arg == "--parallel-execution") {
+      runConfig.sessionConfig.parallelExecution = true;
+    } else if (arg == "--graph_optimization" ||
+               arg == "--graph-optimization") {
+      ensureArg(argc, argv, i);
+      std::string level = argv[++i];
+      if (level == "disable") {
+        runConfig.sessionConfig.graphOptimizationLevel =
+            GraphOptimizationLevel::ORT_DISABLE_ALL;
+      } else if (level == "basic") {
+        runConfig.sessionConfig.graphOptimizationLevel =
+            GraphOptimizationLevel::ORT_ENABLE_BASIC;
+      } else if (level == "extended") {
+        runConfig.sessionConfig.graphOptimizationLevel =
+            GraphOptimizationLevel::ORT_ENABLE_EXTENDED;
+      } else if (level == "all") {
+        runConfig.sessionConfig.graphOptimizationLevel =
+            GraphOptimizationLevel::ORT_ENABLE_ALL;
+      } else {
+        std::cerr << "Unknown graph optimization level '" << level
+                  << "' (--graph_optimization)" << std::endl;
+        exit(1);
+      }
+    } else if (arg == "--use_mem_arena" || arg == "--use-mem-arena") {
+      runConfig.sessionConfig.useCpuMemArena = true;
+    } else if (arg == "--use_mem_pattern" || arg == "--use-mem-pattern") {
+      runConfig.sessionConfig.useMemPattern = true;
+    } else if (arg == "--thread_affinities" || arg == "--thread-affinities") {
+      ensureArg(argc, argv, i);
+      runConfig.sessionConfig.intraOpThreadAffinities = argv[++i];
+    } else if (arg == "--save_optimized_model" ||
+               arg == "--save-optimized-model") {
+      ensureArg(argc, argv, i);
+      runConfig.sessionConfig.optimizedModelPath = argv[++i];
     } else if (arg == "--version") {
       std::cout << piper::getVersion() << std::endl;
       exit(0);
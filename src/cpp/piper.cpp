@@ -1,5 +1,6 @@
 #include <array>
 #include <chrono>
+#include <filesystem>
 #include <fstream>
 #include <limits>
 #include <sstream>
@@ -272,23 +273,67 @@ void loadModel(std::string modelPath, ModelSession &session, bool useCuda) {
     session.options.AppendExecutionProvider_CUDA(cuda_options);
   }
 
-  // Slows down performance by ~2x
-  // session.options.SetIntraOpNumThreads(1);
+  SessionConfig &sessionConfig = session.config;
 
-  // Roughly doubles load time for no visible inference benefit
-  // session.options.SetGraphOptimizationLevel(
-  //     GraphOptimizationLevel::ORT_ENABLE_EXTENDED);
+  // Slows down performance by ~2x with 1 thread
+  if (sessionConfig.intraOpNumThreads > 0) {
+    session.options.SetIntraOpNumThreads(sessionConfig.intraOpNumThreads);
+  }
+
+  if (sessionConfig.interOpNumThreads > 0) {
+    session.options.SetInterOpNumThreads(sessionConfig.interOpNumThreads);
+  }
 
+  // Roughly doubles load time for no visible inference benefit, unless the
+  // optimized model is saved (see optimizedModelPath).
   session.options.SetGraphOptimizationLevel(
-      GraphOptimizationLevel::ORT_DISABLE_ALL);
+      sessionConfig.graphOptimizationLevel);
 
   // Slows down performance very slightly
-  // session.options.SetExecutionMode(ExecutionMode::ORT_PARALLEL);
+  if (sessionConfig.parallelExecution) {
+    session.options.SetExecutionMode(ExecutionMode::ORT_PARALLEL);
+  }
+
+  if (!sessionConfig.useCpuMemArena) {
+    session.options.DisableCpuMemArena();
+  }
+
+  if (!sessionConfig.useMemPattern) {
+    session.options.DisableMemPattern();
+  }
 
-  session.options.DisableCpuMemArena();
-  session.options.DisableMemPattern();
   session.options.DisableProfiling();
 
+  if (sessionConfig.intraOpThreadAffinities) {
+    session.options.AddConfigEntry(
+        "session.intra_op_thread_affinities",
+        sessionConfig.intraOpThreadAffinities->c_str());
+  }
+
+#ifdef _WIN32
+  std::wstring optimizedModelPathW;
+#endif
+
+  if (sessionConfig.optimizedModelPath) {
+    std::string &optimizedModelPath = *sessionConfig.optimizedModelPath;
+    if (std::filesystem::exists(optimizedModelPath)) {
+      // Already optimized
+      spdlog::debug("Loading optimized model from {}", optimizedModelPath);
+      modelPath = optimizedModelPath;
+      session.options.SetGraphOptimizationLevel(
+          GraphOptimizationLevel::ORT_DISABLE_ALL);
+    } else {
+      spdlog::debug("Saving optimized model to {}", optimizedModelPath);
+#ifdef _WIN32
+      optimizedModelPathW = std::wstring(optimizedModelPath.begin(),
+                                         optimizedModelPath.end());
+      session.options.SetOptimizedModelFilePath(optimizedModelPathW.c_str());
+#else
+      session.options.SetOptimizedModelFilePath(optimizedModelPath.c_str());
+#endif
+    }
+  }
+
   auto startTime = std::chrono::steady_clock::now();
 
 #ifdef _WIN32
@@ -75,11 +75,31 @@ struct ModelConfig {
   std::optional<std::map<std::string, SpeakerId>> speakerIdMap;
 };
 
+struct SessionConfig {
+  // 0 = onnxruntime default
+  int intraOpNumThreads = 0;
+  int interOpNumThreads = 0;
+
+  bool parallelExecution = false;
+  GraphOptimizationLevel graphOptimizationLevel =
+      GraphOptimizationLevel::ORT_DISABLE_ALL;
+
+  bool useCpuMemArena = false;
+  bool useMemPattern = false;
+
+  // Logical processors for intra-op threads, e.g. "1,2;3,4"
+  std::optional<std::string> intraOpThreadAffinities;
+
+  // Optimized model is saved here on first load and loaded directly after
+  std::optional<std::string> optimizedModelPath;
+};
+
 struct ModelSession {
   Ort::Session onnx;
   Ort::AllocatorWithDefaultOptions allocator;
   Ort::SessionOptions options;
   Ort::Env env;
+  SessionConfig config;
 
   ModelSession() : onnx(nullptr){};
 };
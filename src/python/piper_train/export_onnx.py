@@ -7,6 +7,7 @@ from typing import Optional
 import torch
 
 from .vits.lightning import VitsModel
+from .vits.models import SynthesizerTrn
 
 _LOGGER = logging.getLogger("piper_train.export_onnx")
 
@@ -40,8 +41,13 @@ def main() -> None:
     args.output.parent.mkdir(parents=True, exist_ok=True)
 
     model = VitsModel.load_from_checkpoint(args.checkpoint, dataset=None)
-    model_g = model.model_g
+    export_model(model.model_g, args.output)
 
+    _LOGGER.info("Exported model to %s", args.output)
+
+
+def export_model(model_g: SynthesizerTrn, output_path: Path) -> None:
+    """Export a generator to Onnx for inference."""
     num_symbols = model_g.n_vocab
     num_speakers = model_g.n_speakers
 
@@ -51,22 +57,32 @@ def main() -> None:
     with torch.no_grad():
         model_g.dec.remove_weight_norm()
 
+    # Number of audio samples per mel frame
+    hop_length = 1
+    for upsample_rate in model_g.upsample_rates:
+        hop_length *= upsample_rate
+
     # old_forward = model_g.infer
 
     def infer_forward(text, text_lengths, scales, sid=None):
         noise_scale = scales[0]
         length_scale = scales[1]
         noise_scale_w = scales[2]
-        audio = model_g.infer(
+        audio, _attn, y_mask, _ = model_g.infer(
             text,
             text_lengths,
             noise_scale=noise_scale,
             length_scale=length_scale,
             noise_scale_w=noise_scale_w,
             sid=sid,
-        )[0].unsqueeze(1)
+        )
+        audio = audio.unsqueeze(1)
 
-        return audio
+        # Real number of samples for each utterance in the batch.
+        # Audio past this point is padding.
+        audio_lengths = y_mask.sum([1, 2]).long() * hop_length
+
+        return audio, audio_lengths
 
     model_g.forward = infer_forward
 
@@ -88,20 +104,20 @@ def main() -> None:
     torch.onnx.export(
         model=model_g,
         args=dummy_input,
-        f=str(args.output),
+        f=str(output_path),
         verbose=False,
         opset_version=OPSET_VERSION,
         input_names=["input", "input_lengths", "scales", "sid"],
-        output_names=["output"],
+        output_names=["output", "output_lengths"],
         dynamic_axes={
             "input": {0: "batch_size", 1: "phonemes"},
             "input_lengths": {0: "batch_size"},
+            "sid": {0: "batch_size"},
             "output": {0: "batch_size", 1: "time"},
+            "output_lengths": {0: "batch_size"},
         },
     )
 
-    _LOGGER.info("Exported model to %s", args.output)
-
 
 # -----------------------------------------------------------------------------
 
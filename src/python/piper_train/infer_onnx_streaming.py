@@ -27,6 +27,9 @@ class SpeechStreamer:
         sample_rate: output sample rate
         chunk_size: number of mel frames to decode in each steps (time in secs = chunk_size * 256)
         chunk_padding: number of mel frames to be concatinated to the start and end of the current chunk to reduce decoding artifacts
+        crossfade_frames: number of mel frames on each side of a chunk boundary that are overlap-added instead of cut off (at most chunk_padding)
+        crossfade_window: shape of the crossfade ("linear", "hann", or "equal_power")
+        first_chunk_size: number of mel frames in the first chunk, growing up to chunk_size once audio is buffered ahead of playback (default: chunk_size)
     """
 
     def __init__(
@@ -36,6 +39,9 @@ class SpeechStreamer:
         sample_rate,
         chunk_size=45,
         chunk_padding=10,
+        crossfade_frames=2,
+        crossfade_window="hann",
+        first_chunk_size=None,
     ):
         sess_options = onnxruntime.SessionOptions()
         _LOGGER.debug("Loading encoder model from %s", encoder_path)
@@ -50,6 +56,9 @@ class SpeechStreamer:
         self.sample_rate = sample_rate
         self.chunk_size = chunk_size
         self.chunk_padding = chunk_padding
+        self.crossfade_frames = max(0, min(crossfade_frames, chunk_padding))
+        self.crossfade_window = crossfade_window
+        self.first_chunk_size = first_chunk_size or chunk_size
 
     def encoder_infer(self, enc_input):
         ENC_START = time.perf_counter()
@@ -63,10 +72,10 @@ class SpeechStreamer:
 
     def decoder_infer(self, z, y_mask, g=None):
         dec_input = {"z": z, "y_mask": y_mask}
-        if g:
+        if g is not None:
             dec_input["g"] = g
         DEC_START = time.perf_counter()
-        audio = self.decoder.run(None, dec_input)[0].squeeze()
+        audio = self.decoder.run(None, dec_input)[0].reshape(-1)
         DEC_INFER = time.perf_counter() - DEC_START
         _LOGGER.debug(f"Decoder inference {round(DEC_INFER * 1000)}")
         dec_rtf = round(DEC_INFER / (len(audio) / self.sample_rate), 2)
@@ -76,36 +85,70 @@ class SpeechStreamer:
     def chunk(self, enc_output):
         z, y_mask, *dec_args = enc_output
         n_frames = z.shape[2]
-        if n_frames <= (self.chunk_size + (2 * self.chunk_padding)):
-            # Too short to stream
-            return self.decoder_infer(z, y_mask, *dec_args)
-        split_at = [
-            i * self.chunk_size for i in range(1, math.ceil(n_frames / self.chunk_size))
-        ]
-        chunks = list(
-            zip(
-                np.split(z, split_at, axis=2),
-                np.split(y_mask, split_at, axis=2),
-            )
+        overlap = self.crossfade_frames
+
+        # Chunks must be long enough to hold a crossfade on both ends
+        min_chunk_size = (2 * overlap) + 1
+        scheduler = ChunkScheduler(
+            first_chunk_size=max(min_chunk_size, self.first_chunk_size),
+            max_chunk_size=max(min_chunk_size, self.chunk_size),
         )
-        wav_start_pad = wav_end_pad = None
-        for idx, (z_chunk, y_mask_chunk) in enumerate(chunks):
-            if idx > 0:
-                prev_z, prev_y_mask = chunks[idx - 1]
-                start_zpad = prev_z[:, :, -self.chunk_padding :]
-                start_ypad = prev_y_mask[:, :, -self.chunk_padding :]
-                z_chunk = np.concatenate([start_zpad, z_chunk], axis=2)
-                y_mask_chunk = np.concatenate([start_ypad, y_mask_chunk], axis=2)
-                wav_start_pad = start_zpad.shape[2] * 256
-            if (idx + 1) < len(chunks):
-                next_z, next_y_mask = chunks[idx + 1]
-                end_zpad = next_z[:, :, : self.chunk_padding]
-                end_ypad = next_y_mask[:, :, : self.chunk_padding]
-                z_chunk = np.concatenate([z_chunk, end_zpad], axis=2)
-                y_mask_chunk = np.concatenate([y_mask_chunk, end_ypad], axis=2)
-                wav_end_pad = end_zpad.shape[2] * 256
-            audio = self.decoder_infer(z_chunk, y_mask_chunk, *dec_args)
-            yield audio[wav_start_pad:-wav_end_pad]
+        if n_frames <= (scheduler.chunk_size + (2 * self.chunk_padding)):
+            # Too short to stream
+            yield self.decoder_infer(z, y_mask, *dec_args)
+            return
+
+        tail = None
+        first_wav_time = None
+        n_samples = 0
+        chunk_start = 0
+        while chunk_start < n_frames:
+            chunk_end = min(n_frames, chunk_start + scheduler.chunk_size)
+            if (n_frames - chunk_end) < min_chunk_size:
+                # Too little left for another chunk
+                chunk_end = n_frames
+
+            overlap_start = overlap if chunk_start > 0 else 0
+            overlap_end = overlap if chunk_end < n_frames else 0
+            pad_start = min(self.chunk_padding, chunk_start)
+            pad_end = min(self.chunk_padding, n_frames - chunk_end)
+
+            frames = slice(chunk_start - pad_start, chunk_end + pad_end)
+            DEC_START = time.perf_counter()
+            audio = self.decoder_infer(z[:, :, frames], y_mask[:, :, frames], *dec_args)
+            DEC_INFER = time.perf_counter() - DEC_START
+
+            # Cut off padding, except for the overlap with neighboring chunks
+            hop_length = len(audio) // (frames.stop - frames.start)
+            audio = audio[
+                (pad_start - overlap_start)
+                * hop_length : len(audio)
+                - ((pad_end - overlap_end) * hop_length)
+            ]
+
+            if tail is not None:
+                fade_in, fade_out = make_crossfade(len(tail), self.crossfade_window)
+                audio = np.concatenate(
+                    [
+                        (tail * fade_out) + (audio[: len(tail)] * fade_in),
+                        audio[len(tail) :],
+                    ]
+                )
+
+            # Hold back the overlap with the next chunk
+            tail_samples = 2 * overlap_end * hop_length
+            tail = audio[len(audio) - tail_samples :] if tail_samples > 0 else None
+            wav = audio[: len(audio) - tail_samples]
+            yield wav
+
+            # Assume playback starts with the first chunk
+            now = time.perf_counter()
+            if first_wav_time is None:
+                first_wav_time = now
+            n_samples += len(wav)
+            buffered_seconds = (n_samples / self.sample_rate) - (now - first_wav_time)
+            scheduler.update(chunk_end - chunk_start, DEC_INFER, buffered_seconds)
+            chunk_start = chunk_end
 
     def stream(self, encoder_input):
         start_time = time.perf_counter()
@@ -124,6 +167,47 @@ class SpeechStreamer:
         _LOGGER.debug("Synthesis done!")
 
 
+def make_crossfade(num_samples, window="hann"):
+    """Fade in and fade out curves over num_samples."""
+    t = (np.arange(num_samples, dtype=np.float32) + 0.5) / max(1, num_samples)
+    if window == "linear":
+        fade_in = t
+    elif window == "hann":
+        fade_in = 0.5 - (0.5 * np.cos(np.pi * t))
+    elif window == "equal_power":
+        # Constant power for overlaps that aren't well correlated
+        return np.sin(0.5 * np.pi * t), np.cos(0.5 * np.pi * t)
+    else:
+        raise ValueError(f"Unknown crossfade window: {window}")
+
+    return fade_in, 1.0 - fade_in
+
+
+class ChunkScheduler:
+    """
+    Choose how many mel frames to decode next.
+
+    Starts small for a low time to first audio, and grows chunks (up to
+    max_chunk_size) once enough audio is buffered ahead of playback to cover
+    decoding the bigger chunk.
+    """
+
+    def __init__(self, first_chunk_size, max_chunk_size, growth=2.0, safety=1.5):
+        self.max_chunk_size = max(1, max_chunk_size)
+        self.chunk_size = max(1, min(first_chunk_size, self.max_chunk_size))
+        self.growth = growth
+        self.safety = safety
+
+    def update(self, n_frames, decode_seconds, buffered_seconds):
+        if (self.chunk_size >= self.max_chunk_size) or (n_frames <= 0):
+            return
+        next_size = min(self.max_chunk_size, math.ceil(self.chunk_size * self.growth))
+        seconds_per_frame = decode_seconds / n_frames
+        if buffered_seconds > (next_size * seconds_per_frame * self.safety):
+            _LOGGER.debug(f"Chunk size {self.chunk_size} -> {next_size}")
+            self.chunk_size = next_size
+
+
 def main():
     """Main entry point"""
     logging.basicConfig(level=logging.DEBUG)
@@ -150,6 +234,23 @@ def main():
         default=5,
         help="Number of mel frames to add to the start and end of the current chunk to reduce decoding artifacts"
     )
+    parser.add_argument(
+        "--crossfade-frames",
+        type=int,
+        default=2,
+        help="Number of mel frames to crossfade between chunks (at most --chunk-padding)"
+    )
+    parser.add_argument(
+        "--crossfade-window",
+        choices=["linear", "hann", "equal_power"],
+        default="hann",
+        help="Shape of the crossfade between chunks"
+    )
+    parser.add_argument(
+        "--first-chunk-size",
+        type=int,
+        help="Number of mel frames in the first chunk, growing up to --chunk-size"
+    )
 
     args = parser.parse_args()
 
@@ -159,6 +260,9 @@ def main():
         sample_rate=args.sample_rate,
         chunk_size=args.chunk_size,
         chunk_padding=args.chunk_padding,
+        crossfade_frames=args.crossfade_frames,
+        crossfade_window=args.crossfade_window,
+        first_chunk_size=args.first_chunk_size,
     )
 
     output_buffer = sys.stdout.buffer
@@ -1,15 +1,28 @@
+import os
 from hashlib import sha256
 from pathlib import Path
-from typing import Optional, Tuple, Union
+from typing import List, Optional, Sequence, Tuple, Union
 
 import librosa
+import numpy as np
 import torch
 
 from piper_train.vits.mel_processing import spectrogram_torch
 
-from .trim import trim_silence
+from .cache_index import AudioCacheIndex
+from .trim import trim_silence, trim_silence_batch
 from .vad import SileroVoiceActivityDetector
 
+__all__ = [
+    "AudioCacheIndex",
+    "SileroVoiceActivityDetector",
+    "cache_norm_audio",
+    "cache_norm_audio_batch",
+    "make_silence_detector",
+    "trim_silence",
+    "trim_silence_batch",
+]
+
 _DIR = Path(__file__).parent
 
 
@@ -31,50 +44,142 @@ def cache_norm_audio(
     window_length: int = 1024,
     hop_length: int = 256,
     ignore_cache: bool = False,
+    cache_index: Optional[AudioCacheIndex] = None,
 ) -> Tuple[Path, Path]:
-    audio_path = Path(audio_path).absolute()
-    cache_dir = Path(cache_dir)
-
-    # Cache id is the SHA256 of the full audio path
-    audio_cache_id = sha256(str(audio_path).encode()).hexdigest()
+    return cache_norm_audio_batch(
+        [audio_path],
+        cache_dir,
+        detector,
+        sample_rate,
+        silence_threshold=silence_threshold,
+        silence_samples_per_chunk=silence_samples_per_chunk,
+        silence_keep_chunks_before=silence_keep_chunks_before,
+        silence_keep_chunks_after=silence_keep_chunks_after,
+        filter_length=filter_length,
+        window_length=window_length,
+        hop_length=hop_length,
+        ignore_cache=ignore_cache,
+        cache_index=cache_index,
+    )[0]
+
+
+def cache_norm_audio_batch(
+    audio_paths: Sequence[Union[str, Path]],
+    cache_dir: Union[str, Path],
+    detector: SileroVoiceActivityDetector,
+    sample_rate: int,
+    silence_threshold: float = 0.2,
+    silence_samples_per_chunk: int = 480,
+    silence_keep_chunks_before: int = 2,
+    silence_keep_chunks_after: int = 2,
+    filter_length: int = 1024,
+    window_length: int = 1024,
+    hop_length: int = 256,
+    ignore_cache: bool = False,
+    cache_index: Optional[AudioCacheIndex] = None,
+) -> List[Tuple[Path, Path]]:
+    """Like cache_norm_audio, but silence is detected in all files together.
 
-    audio_norm_path = cache_dir / f"{audio_cache_id}.pt"
-    audio_spec_path = cache_dir / f"{audio_cache_id}.spec.pt"
+    With a cache index, cache ids come from the audio contents and the
+    processing parameters instead of the audio path.
+    """
+    cache_dir = Path(cache_dir)
+    cache_paths: List[Tuple[Path, Path]] = []
+    for audio_path in audio_paths:
+        audio_path = Path(audio_path).absolute()
+
+        if cache_index is None:
+            # Cache id is the SHA256 of the full audio path
+            audio_cache_id = sha256(str(audio_path).encode()).hexdigest()
+        else:
+            # Moved or duplicated files share a cache id
+            audio_cache_id = cache_index.get_cache_id(
+                audio_path,
+                sample_rate=sample_rate,
+                silence_threshold=silence_threshold,
+                silence_samples_per_chunk=silence_samples_per_chunk,
+                silence_keep_chunks_before=silence_keep_chunks_before,
+                silence_keep_chunks_after=silence_keep_chunks_after,
+                filter_length=filter_length,
+                window_length=window_length,
+                hop_length=hop_length,
+            )
+
+        audio_norm_path = cache_dir / f"{audio_cache_id}.pt"
+        audio_spec_path = cache_dir / f"{audio_cache_id}.spec.pt"
+        cache_paths.append((audio_norm_path, audio_spec_path))
 
     # Normalize audio
-    audio_norm_tensor: Optional[torch.FloatTensor] = None
-    if ignore_cache or (not audio_norm_path.exists()):
+    audio_norm_tensors: List[Optional[torch.FloatTensor]] = [None] * len(audio_paths)
+    norm_indexes = [
+        audio_idx
+        for audio_idx, (audio_norm_path, _audio_spec_path) in enumerate(cache_paths)
+        if ignore_cache or (not audio_norm_path.exists())
+    ]
+
+    audio_arrays: List[np.ndarray] = []
+    native_sample_rates: List[int] = []
+    audio_16khz_arrays: List[np.ndarray] = []
+    vad_sample_rate = 16000
+    for audio_idx in norm_indexes:
+        # Decode once at the file's own sample rate.
+        # NOTE: audio is already in [-1, 1] coming from librosa
+        audio_array, native_sample_rate = librosa.load(
+            path=Path(audio_paths[audio_idx]).absolute(), sr=None
+        )
+        audio_arrays.append(audio_array)
+        native_sample_rates.append(native_sample_rate)
+
         # Trim silence first.
         #
         # The VAD model works on 16khz, so we determine the portion of audio
-        # to keep and then just load that with librosa.
-        vad_sample_rate = 16000
-        audio_16khz, _sr = librosa.load(path=audio_path, sr=vad_sample_rate)
-
-        offset_sec, duration_sec = trim_silence(
-            audio_16khz,
-            detector,
-            threshold=silence_threshold,
-            samples_per_chunk=silence_samples_per_chunk,
-            sample_rate=vad_sample_rate,
-            keep_chunks_before=silence_keep_chunks_before,
-            keep_chunks_after=silence_keep_chunks_after,
+        # to keep and then just resample that to the target rate.
+        #
+        # librosa.resample is what librosa.load uses with sr set, so this is
+        # the same as loading the file at each rate.
+        audio_16khz_arrays.append(
+            librosa.resample(
+                audio_array, orig_sr=native_sample_rate, target_sr=vad_sample_rate
+            )
         )
 
-        # NOTE: audio is already in [-1, 1] coming from librosa
-        audio_norm_array, _sr = librosa.load(
-            path=audio_path,
-            sr=sample_rate,
-            offset=offset_sec,
-            duration=duration_sec,
+    trim_results = trim_silence_batch(
+        audio_16khz_arrays,
+        detector,
+        threshold=silence_threshold,
+        samples_per_chunk=silence_samples_per_chunk,
+        sample_rate=vad_sample_rate,
+        keep_chunks_before=silence_keep_chunks_before,
+        keep_chunks_after=silence_keep_chunks_after,
+    )
+
+    for audio_idx, audio_array, native_sample_rate, (offset_sec, duration_sec) in zip(
+        norm_indexes, audio_arrays, native_sample_rates, trim_results
+    ):
+        # Same rounding as librosa.load with offset/duration
+        start_sample = int(offset_sec * native_sample_rate)
+        end_sample: Optional[int] = None
+        if duration_sec is not None:
+            end_sample = start_sample + int(duration_sec * native_sample_rate)
+
+        audio_norm_array = librosa.resample(
+            audio_array[start_sample:end_sample],
+            orig_sr=native_sample_rate,
+            target_sr=sample_rate,
         )
 
         # Save to cache directory
         audio_norm_tensor = torch.FloatTensor(audio_norm_array).unsqueeze(0)
-        torch.save(audio_norm_tensor, audio_norm_path)
+        _save_tensor(audio_norm_tensor, cache_paths[audio_idx][0])
+        audio_norm_tensors[audio_idx] = audio_norm_tensor
 
     # Compute spectrogram
-    if ignore_cache or (not audio_spec_path.exists()):
+    for (audio_norm_path, audio_spec_path), audio_norm_tensor in zip(
+        cache_paths, audio_norm_tensors
+    ):
+        if (not ignore_cache) and audio_spec_path.exists():
+            continue
+
         if audio_norm_tensor is None:
             # Load pre-cached normalized audio
             audio_norm_tensor = torch.load(audio_norm_path)
@@ -87,6 +192,17 @@ def cache_norm_audio(
             win_size=window_length,
             center=False,
         ).squeeze(0)
-        torch.save(audio_spec_tensor, audio_spec_path)
+        _save_tensor(audio_spec_tensor, audio_spec_path)
+
+    return cache_paths
+
 
-    return audio_norm_path, audio_spec_path
+def _save_tensor(tensor: torch.Tensor, path: Path) -> None:
+    """Save tensor so other workers never see a partially written file."""
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        torch.save(tensor, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+_READ_BYTES = 1024 * 1024
+
+
+class AudioCacheIndex:
+    """Maps audio paths to hashes of their contents.
+
+    The index is kept in the cache directory, so a file is only hashed again
+    when its size or modification time changes. Entries are appended one
+    line at a time, which lets several processes share the same index.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path]):
+        self.index_path = Path(cache_dir) / "index.jsonl"
+
+        # path -> (mtime_ns, size, content id)
+        self._content_ids: Dict[str, Tuple[int, int, str]] = {}
+
+        if self.index_path.exists():
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                for line in index_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partially written line
+                        continue
+
+                    self._content_ids[entry["path"]] = (
+                        entry["mtime_ns"],
+                        entry["size"],
+                        entry["content_id"],
+                    )
+
+    def get_content_id(self, audio_path: Union[str, Path]) -> str:
+        """Return hash of the audio file's contents."""
+        audio_path = Path(audio_path).absolute()
+        audio_stat = audio_path.stat()
+        path_str = str(audio_path)
+
+        cached = self._content_ids.get(path_str)
+        if (cached is not None) and (
+            cached[:2] == (audio_stat.st_mtime_ns, audio_stat.st_size)
+        ):
+            return cached[2]
+
+        content_id = hash_file(audio_path)
+        self._content_ids[path_str] = (
+            audio_stat.st_mtime_ns,
+            audio_stat.st_size,
+            content_id,
+        )
+
+        line = json.dumps(
+            {
+                "path": path_str,
+                "mtime_ns": audio_stat.st_mtime_ns,
+                "size": audio_stat.st_size,
+                "content_id": content_id,
+            },
+            ensure_ascii=False,
+        )
+        with open(self.index_path, "a", encoding="utf-8") as index_file:
+            # One write per line
+            index_file.write(line + "\n")
+
+        return content_id
+
+    def get_cache_id(self, audio_path: Union[str, Path], **params: Any) -> str:
+        """Return cache id for audio contents processed with params."""
+        key_json = json.dumps(
+            [self.get_content_id(audio_path), sorted(params.items())],
+            ensure_ascii=False,
+        )
+
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """Fast hash of a file's bytes (xxh3 if xxhash is installed)."""
+    try:
+        import xxhash  # pylint: disable=import-outside-toplevel
+
+        hasher: Any = xxhash.xxh3_128()
+        hash_name = "xxh3_128"
+    except ImportError:
+        hasher = hashlib.blake2b(digest_size=16)
+        hash_name = "blake2b_128"
+
+    with open(path, "rb") as audio_file:
+        while True:
+            chunk = audio_file.read(_READ_BYTES)
+            if not chunk:
+                break
+
+            hasher.update(chunk)
+
+    return f"{hash_name}:{hasher.hexdigest()}"
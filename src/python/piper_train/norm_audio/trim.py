@@ -1,4 +1,4 @@
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
 
@@ -14,41 +14,71 @@ def trim_silence(
     keep_chunks_before: int = 2,
     keep_chunks_after: int = 2,
 ) -> Tuple[float, Optional[float]]:
-    """Returns the offset/duration of trimmed audio in seconds"""
-    offset_sec: float = 0.0
-    duration_sec: Optional[float] = None
-    first_chunk: Optional[int] = None
-    last_chunk: Optional[int] = None
+    """Returns the offset/duration of trimmed audio in seconds.
+
+    The VAD starts fresh for each array, so results don't depend on audio
+    the detector has seen before.
+    """
+    return trim_silence_batch(
+        [audio_array],
+        detector,
+        threshold=threshold,
+        samples_per_chunk=samples_per_chunk,
+        sample_rate=sample_rate,
+        keep_chunks_before=keep_chunks_before,
+        keep_chunks_after=keep_chunks_after,
+    )[0]
+
+
+def trim_silence_batch(
+    audio_arrays: Sequence[np.ndarray],
+    detector: SileroVoiceActivityDetector,
+    threshold: float = 0.2,
+    samples_per_chunk=480,
+    sample_rate=16000,
+    keep_chunks_before: int = 2,
+    keep_chunks_after: int = 2,
+) -> List[Tuple[float, Optional[float]]]:
+    """Returns the offset/duration of trimmed audio in seconds for each array.
+
+    The VAD is run over all arrays together, one chunk of each per call.
+    Each array starts with a fresh VAD state (see get_speech_probs).
+    """
     seconds_per_chunk: float = samples_per_chunk / sample_rate
 
-    chunk = audio_array[:samples_per_chunk]
-    audio_array = audio_array[samples_per_chunk:]
-    chunk_idx: int = 0
-
-    # Determine main block of speech
-    while len(audio_array) > 0:
-        prob = detector(chunk, sample_rate=sample_rate)
-        is_speech = prob >= threshold
-
-        if is_speech:
-            if first_chunk is None:
-                # First speech
-                first_chunk = chunk_idx
-            else:
-                # Last speech so far
-                last_chunk = chunk_idx
-
-        chunk = audio_array[:samples_per_chunk]
-        audio_array = audio_array[samples_per_chunk:]
-        chunk_idx += 1
-
-    if (first_chunk is not None) and (last_chunk is not None):
-        first_chunk = max(0, first_chunk - keep_chunks_before)
-        last_chunk = min(chunk_idx, last_chunk + keep_chunks_after)
-
-        # Compute offset/duration
-        offset_sec = first_chunk * seconds_per_chunk
-        last_sec = (last_chunk + 1) * seconds_per_chunk
-        duration_sec = last_sec - offset_sec
-
-    return offset_sec, duration_sec
+    # Every chunk except the last one is checked
+    lengths = [
+        max(0, (len(audio_array) - 1) // samples_per_chunk)
+        for audio_array in audio_arrays
+    ]
+
+    chunks = np.zeros(
+        (len(audio_arrays), max(lengths, default=0), samples_per_chunk),
+        dtype=np.float32,
+    )
+    for audio_idx, (audio_array, length) in enumerate(zip(audio_arrays, lengths)):
+        chunks[audio_idx, :length] = audio_array[: length * samples_per_chunk].reshape(
+            (length, samples_per_chunk)
+        )
+
+    probs = detector.get_speech_probs(chunks, lengths=lengths, sample_rate=sample_rate)
+
+    results: List[Tuple[float, Optional[float]]] = []
+    for audio_probs, length in zip(probs, lengths):
+        offset_sec: float = 0.0
+        duration_sec: Optional[float] = None
+
+        # Determine main block of speech
+        speech_chunks = np.flatnonzero(audio_probs[:length] >= threshold)
+        if len(speech_chunks) > 1:
+            first_chunk = max(0, int(speech_chunks[0]) - keep_chunks_before)
+            last_chunk = min(length, int(speech_chunks[-1]) + keep_chunks_after)
+
+            # Compute offset/duration
+            offset_sec = first_chunk * seconds_per_chunk
+            last_sec = (last_chunk + 1) * seconds_per_chunk
+            duration_sec = last_sec - offset_sec
+
+        results.append((offset_sec, duration_sec))
+
+    return results
@@ -1,9 +1,12 @@
+import logging
 import typing
 from pathlib import Path
 
 import numpy as np
 import onnxruntime
 
+_LOGGER = logging.getLogger(__name__)
+
 
 class SileroVoiceActivityDetector:
     """Detects speech/silence using Silero VAD.
@@ -14,9 +17,20 @@ class SileroVoiceActivityDetector:
     def __init__(self, onnx_path: typing.Union[str, Path]):
         onnx_path = str(onnx_path)
 
-        self.session = onnxruntime.InferenceSession(onnx_path)
-        self.session.intra_op_num_threads = 1
-        self.session.inter_op_num_threads = 1
+        # The exported model declares a batch size of 1, but works with any
+        self.supports_batching = False
+        model: typing.Union[str, bytes] = onnx_path
+        try:
+            model = _make_batch_dynamic(onnx_path)
+            self.supports_batching = True
+        except ImportError:
+            _LOGGER.info("Install the onnx package to batch VAD across files")
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = 1
+        session_options.inter_op_num_threads = 1
+
+        self.session = onnxruntime.InferenceSession(model, sess_options=session_options)
 
         self._h = np.zeros((2, 1, 64)).astype("float32")
         self._c = np.zeros((2, 1, 64)).astype("float32")
@@ -36,7 +50,7 @@ class SileroVoiceActivityDetector:
             )
 
         if audio_array.shape[0] > 1:
-            raise ValueError("Onnx model does not support batching")
+            raise ValueError("Use get_speech_probs for batches")
 
         if sample_rate != 16000:
             raise ValueError("Only 16Khz audio is supported")
@@ -52,3 +66,94 @@ class SileroVoiceActivityDetector:
         out = out.squeeze(2)[:, 1]  # make output type match JIT analog
 
         return out
+
+    def get_speech_probs(
+        self,
+        chunks: np.ndarray,
+        lengths: typing.Optional[typing.Sequence[int]] = None,
+        sample_rate: int = 16000,
+    ) -> np.ndarray:
+        """Return probability of speech [0-1] for independent streams of chunks.
+
+        chunks is [streams, chunks per stream, samples per chunk], and lengths
+        has the number of real (unpadded) chunks in each stream. Each stream
+        starts with a fresh recurrent state that is carried from chunk to
+        chunk, so results match calling a new detector on each stream. This
+        differs from __call__, which keeps its state from previous calls
+        (and files). Streams are run through Onnx together, dropping out
+        once they end.
+
+        Returns [streams, chunks per stream] with zeros after each length.
+        """
+        if len(chunks.shape) != 3:
+            raise ValueError(f"Expected [streams, chunks, samples], got {chunks.shape}")
+
+        if sample_rate != 16000:
+            raise ValueError("Only 16Khz audio is supported")
+
+        num_streams, num_chunks, _samples_per_chunk = chunks.shape
+        if lengths is None:
+            lengths = [num_chunks] * num_streams
+
+        probs = np.zeros((num_streams, num_chunks), dtype=np.float32)
+        if (num_streams > 1) and (not self.supports_batching):
+            for stream_idx, length in enumerate(lengths):
+                probs[stream_idx, :length] = self.get_speech_probs(
+                    chunks[stream_idx : stream_idx + 1, :length]
+                )[0]
+
+            return probs
+
+        # Longest streams first, so active streams are always at the front
+        order = sorted(
+            range(num_streams), key=lambda stream_idx: lengths[stream_idx], reverse=True
+        )
+        sorted_chunks = chunks[order].astype(np.float32, copy=False)
+        sorted_lengths = [lengths[stream_idx] for stream_idx in order]
+        sorted_probs = np.zeros_like(probs)
+
+        h = np.zeros((2, num_streams, 64), dtype=np.float32)
+        c = np.zeros((2, num_streams, 64), dtype=np.float32)
+        num_active = num_streams
+
+        for chunk_idx in range(max(sorted_lengths, default=0)):
+            while sorted_lengths[num_active - 1] <= chunk_idx:
+                num_active -= 1
+
+            out, h_active, c_active = self.session.run(
+                None,
+                {
+                    "input": np.ascontiguousarray(
+                        sorted_chunks[:num_active, chunk_idx]
+                    ),
+                    "h0": np.ascontiguousarray(h[:, :num_active]),
+                    "c0": np.ascontiguousarray(c[:, :num_active]),
+                },
+            )
+            h[:, :num_active] = h_active
+            c[:, :num_active] = c_active
+            sorted_probs[:num_active, chunk_idx] = out.squeeze(2)[:, 1]
+
+        probs[order] = sorted_probs
+
+        return probs
+
+
+def _make_batch_dynamic(onnx_path: str) -> bytes:
+    """Serialized model with a variable batch dimension."""
+    import onnx  # pylint: disable=import-outside-toplevel
+
+    model = onnx.load(onnx_path)
+    for value in list(model.graph.input) + list(model.graph.output):
+        dims = value.type.tensor_type.shape.dim
+        if value.name in ("input", "output"):
+            # [batch, ...]
+            dims[0].dim_param = "batch"
+        else:
+            # h/c: [layers, batch, hidden]
+            dims[1].dim_param = "batch"
+
+    # Inferred shapes still have the fixed batch size
+    del model.graph.value_info[:]
+
+    return model.SerializeToString()
@@ -6,13 +6,17 @@ import itertools
 import json
 import logging
 import os
+import queue
+import time
 import unicodedata
 from collections import Counter
 from dataclasses import dataclass, field
+from datetime import timedelta
 from enum import Enum
+from hashlib import sha256
 from multiprocessing import JoinableQueue, Process, Queue
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from piper_phonemize import (
     phonemize_espeak,
@@ -25,12 +29,20 @@ from piper_phonemize import (
     tashkeel_run,
 )
 
-from .norm_audio import cache_norm_audio, make_silence_detector
+from .norm_audio import (
+    AudioCacheIndex,
+    SileroVoiceActivityDetector,
+    cache_norm_audio,
+    cache_norm_audio_batch,
+    make_silence_detector,
+)
 
 _DIR = Path(__file__).parent
 _VERSION = (_DIR / "VERSION").read_text(encoding="utf-8").strip()
 _LOGGER = logging.getLogger("preprocess")
 
+_WORKER_CHECK_SECONDS = 5.0
+
 
 class PhonemeType(str, Enum):
     ESPEAK = "espeak"
@@ -61,7 +73,28 @@ def main() -> None:
         "--dataset-format", choices=("ljspeech", "mycroft"), required=True
     )
     parser.add_argument("--cache-dir", help="Directory to cache processed audio files")
+    parser.add_argument(
+        "--cache-by-content",
+        action="store_true",
+        help="Name cached audio files by a hash of their contents instead of their path",
+    )
     parser.add_argument("--max-workers", type=int)
+    parser.add_argument(
+        "--job-size",
+        type=int,
+        default=32,
+        help="Number of utterances given to a worker at a time (default: 32)",
+    )
+    parser.add_argument(
+        "--ignore-manifest",
+        action="store_true",
+        help="Process every utterance again instead of reusing unchanged ones from manifest.jsonl",
+    )
+    parser.add_argument(
+        "--keep-order",
+        action="store_true",
+        help="Write utterances to dataset.jsonl in the same order as the metadata",
+    )
     parser.add_argument(
         "--single-speaker", action="store_true", help="Force single speaker dataset"
     )
@@ -100,6 +133,12 @@ def main() -> None:
     parser.add_argument(
         "--skip-audio", action="store_true", help="Don't preprocess audio"
     )
+    parser.add_argument(
+        "--audio-batch-size",
+        type=int,
+        default=32,
+        help="Number of audio files to detect silence in together (default: 32)",
+    )
     parser.add_argument(
         "--debug", action="store_true", help="Print DEBUG messages to the console"
     )
@@ -119,6 +158,14 @@ def main() -> None:
     # Ensure enum
     args.phoneme_type = PhonemeType(args.phoneme_type)
 
+    if args.job_size < 1:
+        _LOGGER.fatal("--job-size must be at least 1")
+        return
+
+    if args.audio_batch_size < 1:
+        _LOGGER.fatal("--audio-batch-size must be at least 1")
+        return
+
     # Convert to paths and create output directories
     args.input_dir = Path(args.input_dir)
     args.output_dir = Path(args.output_dir)
@@ -136,17 +183,128 @@ def main() -> None:
     else:
         make_dataset = ljspeech_dataset
 
-    # Count speakers
-    _LOGGER.debug("Counting number of speakers/utterances in the dataset")
-    speaker_counts: "Counter[str]" = Counter()
-    num_utterances = 0
-    for utt in make_dataset(args):
-        speaker = utt.speaker or ""
-        speaker_counts[speaker] += 1
-        num_utterances += 1
+    if (args.max_workers is None) or (args.max_workers < 1):
+        args.max_workers = os.cpu_count()
 
-    assert num_utterances > 0, "No utterances found"
+    assert args.max_workers is not None
+
+    queue_in: "Queue[Optional[Tuple[int, List[Utterance]]]]" = JoinableQueue()
+    queue_out: "Queue[Tuple[int, List[Optional[Utterance]]]]" = Queue()
 
+    # Start workers
+    if args.phoneme_type == PhonemeType.TEXT:
+        target = phonemize_batch_text
+    else:
+        target = phonemize_batch_espeak
+
+    processes = [
+        Process(target=target, args=(args, queue_in, queue_out))
+        for _ in range(args.max_workers)
+    ]
+    for proc in processes:
+        proc.start()
+
+    manifest = Manifest(
+        args.output_dir / "manifest.jsonl", args, load=not args.ignore_manifest
+    )
+
+    try:
+        # Jobs are small and workers take the next one when they're free, so
+        # no worker is left with a long tail of utterances at the end.
+        # Speakers are counted while jobs are sent out, and utterances that
+        # haven't changed since the last run are taken from the manifest.
+        speaker_counts: "Counter[str]" = Counter()
+        jobs: Dict[int, PreprocessJob] = {}
+        num_utterances = 0
+        num_reused = 0
+        for job_idx, utt_batch in enumerate(batched(make_dataset(args), args.job_size)):
+            job = PreprocessJob()
+            for utt_idx, utt in enumerate(utt_batch):
+                speaker_counts[utt.speaker or ""] += 1
+
+                utt_key = manifest.get_key(utt)
+                job.keys.append(utt_key)
+                if manifest.reuse(utt_key, utt):
+                    job.results.append(utt)
+                    num_reused += 1
+                else:
+                    job.results.append(None)
+                    job.pending.append(utt_idx)
+
+            if job.pending:
+                queue_in.put((job_idx, [utt_batch[i] for i in job.pending]))
+
+            jobs[job_idx] = job
+            num_utterances += len(utt_batch)
+
+        assert num_utterances > 0, "No utterances found"
+
+        _LOGGER.info(
+            "Processing %s utterance(s) with %s worker(s), reusing %s",
+            num_utterances - num_reused,
+            args.max_workers,
+            num_reused,
+        )
+
+        speaker_ids = get_speaker_ids(speaker_counts)
+        write_config(args, speaker_ids, num_speakers=len(speaker_counts))
+
+        with open(
+            args.output_dir / "dataset.jsonl", "w", encoding="utf-8"
+        ) as dataset_file:
+            missing_phonemes: "Counter[str]" = Counter()
+            for job_idx in get_results(queue_out, processes, jobs, args.keep_order):
+                job = jobs.pop(job_idx)
+                manifest.add(
+                    [job.keys[utt_idx] for utt_idx in job.pending],
+                    [job.results[utt_idx] for utt_idx in job.pending],
+                )
+
+                for utt in job.results:
+                    if utt is None:
+                        continue
+
+                    if utt.speaker is not None:
+                        utt.speaker_id = speaker_ids[utt.speaker]
+
+                    utt_dict = dataclasses.asdict(utt)
+                    utt_dict.pop("missing_phonemes")
+
+                    # JSONL
+                    json.dump(
+                        utt_dict,
+                        dataset_file,
+                        ensure_ascii=False,
+                        cls=PathEncoder,
+                    )
+                    print("", file=dataset_file)
+
+                    missing_phonemes.update(utt.missing_phonemes)
+
+            if missing_phonemes:
+                for phoneme, count in missing_phonemes.most_common():
+                    _LOGGER.warning("Missing %s (%s)", phoneme, count)
+
+                _LOGGER.warning("Missing %s phoneme(s)", len(missing_phonemes))
+
+        # Drop entries for utterances that are gone or have changed
+        manifest.compact()
+    finally:
+        # Signal workers to stop
+        for proc in processes:
+            queue_in.put(None)
+
+        # Wait for workers to stop
+        for proc in processes:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                # Still busy after an error
+                proc.terminate()
+
+        manifest.close()
+
+
+def get_speaker_ids(speaker_counts: "Counter[str]") -> Dict[str, int]:
     is_multispeaker = len(speaker_counts) > 1
     speaker_ids: Dict[str, int] = {}
 
@@ -161,7 +319,12 @@ def main() -> None:
     else:
         _LOGGER.info("Single speaker dataset")
 
-    # Write config
+    return speaker_ids
+
+
+def write_config(
+    args: argparse.Namespace, speaker_ids: Dict[str, int], num_speakers: int
+) -> None:
     audio_quality = args.audio_quality or args.output_dir.name
     dataset_name = args.dataset_name or args.output_dir.parent.name
 
@@ -186,7 +349,7 @@ def main() -> None:
                 if args.phoneme_type == PhonemeType.TEXT
                 else get_espeak_map(),
                 "num_symbols": get_max_phonemes(),
-                "num_speakers": len(speaker_counts),
+                "num_speakers": num_speakers,
                 "speaker_id_map": speaker_ids,
                 "piper_version": _VERSION,
             },
@@ -196,73 +359,93 @@ def main() -> None:
         )
     _LOGGER.info("Wrote dataset config")
 
-    if (args.max_workers is None) or (args.max_workers < 1):
-        args.max_workers = os.cpu_count()
-
-    assert args.max_workers is not None
 
-    batch_size = int(num_utterances / (args.max_workers * 2))
-    queue_in: "Queue[Iterable[Utterance]]" = JoinableQueue()
-    queue_out: "Queue[Optional[Utterance]]" = Queue()
+def get_results(
+    queue_out: "Queue[Tuple[int, List[Optional[Utterance]]]]",
+    processes: List[Process],
+    jobs: Dict[int, "PreprocessJob"],
+    keep_order: bool,
+) -> Iterable[int]:
+    """Yield the index of each job as it finishes (or in job order)."""
+    progress = Progress(sum(len(job.pending) for job in jobs.values()))
+    num_running = sum(1 for job in jobs.values() if job.pending)
+    finished_jobs = [job_idx for job_idx, job in jobs.items() if not job.pending]
+    done_jobs: Set[int] = set()
+    next_job_idx = 0
+
+    while True:
+        if keep_order:
+            # Hold jobs until all of the jobs before them are done
+            done_jobs.update(finished_jobs)
+            while next_job_idx in done_jobs:
+                done_jobs.remove(next_job_idx)
+                yield next_job_idx
+                next_job_idx += 1
+        else:
+            yield from finished_jobs
+
+        if num_running < 1:
+            break
 
-    # Start workers
-    if args.phoneme_type == PhonemeType.TEXT:
-        target = phonemize_batch_text
-    else:
-        target = phonemize_batch_espeak
-
-    processes = [
-        Process(target=target, args=(args, queue_in, queue_out))
-        for _ in range(args.max_workers)
-    ]
-    for proc in processes:
-        proc.start()
-
-    _LOGGER.info(
-        "Processing %s utterance(s) with %s worker(s)", num_utterances, args.max_workers
-    )
-    with open(args.output_dir / "dataset.jsonl", "w", encoding="utf-8") as dataset_file:
-        for utt_batch in batched(
-            make_dataset(args),
-            batch_size,
-        ):
-            queue_in.put(utt_batch)
-
-        _LOGGER.debug("Waiting for jobs to finish")
-        missing_phonemes: "Counter[str]" = Counter()
-        for _ in range(num_utterances):
-            utt = queue_out.get()
-            if utt is not None:
-                if utt.speaker is not None:
-                    utt.speaker_id = speaker_ids[utt.speaker]
-
-                utt_dict = dataclasses.asdict(utt)
-                utt_dict.pop("missing_phonemes")
-
-                # JSONL
-                json.dump(
-                    utt_dict,
-                    dataset_file,
-                    ensure_ascii=False,
-                    cls=PathEncoder,
-                )
-                print("", file=dataset_file)
-
-                missing_phonemes.update(utt.missing_phonemes)
-
-        if missing_phonemes:
-            for phoneme, count in missing_phonemes.most_common():
-                _LOGGER.warning("Missing %s (%s)", phoneme, count)
-
-            _LOGGER.warning("Missing %s phoneme(s)", len(missing_phonemes))
-
-    # Signal workers to stop
-    for proc in processes:
-        queue_in.put(None)
+        while True:
+            try:
+                job_idx, utt_results = queue_out.get(timeout=_WORKER_CHECK_SECONDS)
+                break
+            except queue.Empty:
+                # Workers only stop on their own after an unexpected error,
+                # and the job they were working on is lost.
+                for proc in processes:
+                    if not proc.is_alive():
+                        raise RuntimeError(
+                            f"Worker stopped with {num_running} job(s) left "
+                            f"(exit code: {proc.exitcode})"
+                        ) from None
+
+        job = jobs[job_idx]
+        for utt_idx, utt in zip(job.pending, utt_results):
+            job.results[utt_idx] = utt
+
+        progress.update(len(utt_results))
+        num_running -= 1
+        finished_jobs = [job_idx]
+
+    progress.finish()
+
+
+class Progress:
+    """Logs the number of processed utterances and an ETA."""
+
+    def __init__(self, total: int, interval_seconds: float = 10.0) -> None:
+        self.total = total
+        self.interval_seconds = interval_seconds
+        self.done = 0
+        self.start_time = time.monotonic()
+        self.last_report_time = self.start_time
+
+    def update(self, count: int) -> None:
+        self.done += count
+
+        now = time.monotonic()
+        if (now - self.last_report_time) < self.interval_seconds:
+            return
+
+        self.last_report_time = now
+        rate = self.done / max(1e-6, now - self.start_time)
+        eta_seconds = (self.total - self.done) / max(1e-6, rate)
+        _LOGGER.info(
+            "Processed %s/%s utterance(s) (%.1f/sec, ETA %s)",
+            self.done,
+            self.total,
+            rate,
+            timedelta(seconds=int(eta_seconds)),
+        )
 
-    # Wait for workers to stop
-    for proc in processes:
-        proc.join(timeout=1)
+    def finish(self) -> None:
+        _LOGGER.info(
+            "Processed %s utterance(s) in %s",
+            self.done,
+            timedelta(seconds=int(time.monotonic() - self.start_time)),
+        )
 
 
 # -----------------------------------------------------------------------------
@@ -287,12 +470,15 @@ def phonemize_batch_espeak(
     try:
         casing = get_text_casing(args.text_casing)
         silence_detector = make_silence_detector()
+        cache_index = AudioCacheIndex(args.cache_dir) if args.cache_by_content else None
 
         while True:
-            utt_batch = queue_in.get()
-            if utt_batch is None:
+            job = queue_in.get()
+            if job is None:
                 break
 
+            job_idx, utt_batch = job
+            utt_results: List[Optional[Utterance]] = []
             for utt in utt_batch:
                 try:
                     if args.tashkeel:
@@ -311,20 +497,16 @@ def phonemize_batch_espeak(
                         utt.phonemes,
                         missing_phonemes=utt.missing_phonemes,
                     )
-                    if not args.skip_audio:
-                        utt.audio_norm_path, utt.audio_spec_path = cache_norm_audio(
-                            utt.audio_path,
-                            args.cache_dir,
-                            silence_detector,
-                            args.sample_rate,
-                        )
-                    queue_out.put(utt)
+                    utt_results.append(utt)
                 except TimeoutError:
                     _LOGGER.error("Skipping utterance due to timeout: %s", utt)
+                    utt_results.append(None)
                 except Exception:
                     _LOGGER.exception("Failed to process utterance: %s", utt)
-                    queue_out.put(None)
+                    utt_results.append(None)
 
+            utt_results = cache_audio(args, utt_results, silence_detector, cache_index)
+            queue_out.put((job_idx, utt_results))
             queue_in.task_done()
     except Exception:
         _LOGGER.exception("phonemize_batch_espeak")
@@ -336,12 +518,15 @@ def phonemize_batch_text(
     try:
         casing = get_text_casing(args.text_casing)
         silence_detector = make_silence_detector()
+        cache_index = AudioCacheIndex(args.cache_dir) if args.cache_by_content else None
 
         while True:
-            utt_batch = queue_in.get()
-            if utt_batch is None:
+            job = queue_in.get()
+            if job is None:
                 break
 
+            job_idx, utt_batch = job
+            utt_results: List[Optional[Utterance]] = []
             for utt in utt_batch:
                 try:
                     if args.tashkeel:
@@ -360,25 +545,63 @@ def phonemize_batch_text(
                         utt.phonemes,
                         missing_phonemes=utt.missing_phonemes,
                     )
-                    if not args.skip_audio:
-                        utt.audio_norm_path, utt.audio_spec_path = cache_norm_audio(
-                            utt.audio_path,
-                            args.cache_dir,
-                            silence_detector,
-                            args.sample_rate,
-                        )
-                    queue_out.put(utt)
+                    utt_results.append(utt)
                 except TimeoutError:
                     _LOGGER.error("Skipping utterance due to timeout: %s", utt)
+                    utt_results.append(None)
                 except Exception:
                     _LOGGER.exception("Failed to process utterance: %s", utt)
-                    queue_out.put(None)
+                    utt_results.append(None)
 
+            utt_results = cache_audio(args, utt_results, silence_detector, cache_index)
+            queue_out.put((job_idx, utt_results))
             queue_in.task_done()
     except Exception:
         _LOGGER.exception("phonemize_batch_text")
 
 
+def cache_audio(
+    args: argparse.Namespace,
+    utts: List[Optional["Utterance"]],
+    silence_detector: SileroVoiceActivityDetector,
+    cache_index: Optional[AudioCacheIndex] = None,
+) -> List[Optional["Utterance"]]:
+    """Normalize audio for phonemized utterances (None if it fails)."""
+    if args.skip_audio:
+        return utts
+
+    utt_results = list(utts)
+    utt_indexes = [utt_idx for utt_idx, utt in enumerate(utts) if utt is not None]
+    for batch_indexes in batched(utt_indexes, args.audio_batch_size):
+        batch_utts = [utts[utt_idx] for utt_idx in batch_indexes]
+        try:
+            cache_paths = cache_norm_audio_batch(
+                [utt.audio_path for utt in batch_utts],
+                args.cache_dir,
+                silence_detector,
+                args.sample_rate,
+                cache_index=cache_index,
+            )
+            for utt, utt_cache_paths in zip(batch_utts, cache_paths):
+                utt.audio_norm_path, utt.audio_spec_path = utt_cache_paths
+        except Exception:
+            # Find the bad utterance(s)
+            for utt_idx, utt in zip(batch_indexes, batch_utts):
+                try:
+                    utt.audio_norm_path, utt.audio_spec_path = cache_norm_audio(
+                        utt.audio_path,
+                        args.cache_dir,
+                        silence_detector,
+                        args.sample_rate,
+                        cache_index=cache_index,
+                    )
+                except Exception:
+                    _LOGGER.exception("Failed to process utterance: %s", utt)
+                    utt_results[utt_idx] = None
+
+    return utt_results
+
+
 # -----------------------------------------------------------------------------
 
 
@@ -402,6 +625,151 @@ class PathEncoder(json.JSONEncoder):
         return super().default(o)
 
 
+@dataclass
+class PreprocessJob:
+    keys: List[str] = field(default_factory=list)
+    """Manifest key of each utterance"""
+
+    results: List[Optional[Utterance]] = field(default_factory=list)
+    """Processed utterances (None if failed or not done yet)"""
+
+    pending: List[int] = field(default_factory=list)
+    """Indexes of utterances sent to a worker"""
+
+
+class Manifest:
+    """Processed utterances from earlier runs.
+
+    Keys cover everything that goes into processing an utterance. Utterances
+    are appended as they finish, so an interrupted run picks up where it
+    stopped.
+    """
+
+    def __init__(self, path: Path, args: argparse.Namespace, load: bool = True):
+        self.path = path
+        self.args = args
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._used_keys: Set[str] = set()
+
+        if load and path.exists():
+            # Bytes up to the end of the last complete line
+            complete_size = 0
+            with open(path, "rb") as manifest_file:
+                for line in manifest_file:
+                    if not line.endswith(b"\n"):
+                        # Last line of an interrupted run
+                        break
+
+                    complete_size += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    self.entries[entry["key"]] = entry
+
+            if complete_size < path.stat().st_size:
+                # New entries would be appended to the partial line
+                os.truncate(path, complete_size)
+
+            _LOGGER.debug("Loaded %s entries from %s", len(self.entries), path)
+
+        self._file = open(  # pylint: disable=consider-using-with
+            path, "a" if load else "w", encoding="utf-8"
+        )
+
+    def get_key(self, utt: Utterance) -> str:
+        audio_path = Path(utt.audio_path).absolute()
+        audio_mtime_ns: Optional[int] = None
+        audio_size: Optional[int] = None
+        if audio_path.exists():
+            audio_stat = audio_path.stat()
+            audio_mtime_ns, audio_size = audio_stat.st_mtime_ns, audio_stat.st_size
+
+        key_json = json.dumps(
+            [
+                str(audio_path),
+                audio_mtime_ns,
+                audio_size,
+                utt.text,
+                self.args.language,
+                self.args.text_casing,
+                self.args.phoneme_type.value,
+                self.args.tashkeel,
+                self.args.skip_audio,
+                self.args.sample_rate,
+                str(self.args.cache_dir.absolute()),
+                self.args.cache_by_content,
+            ],
+            ensure_ascii=False,
+        )
+
+        return sha256(key_json.encode()).hexdigest()
+
+    def reuse(self, key: str, utt: Utterance) -> bool:
+        """Fill in utterance from the manifest if it's there."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+
+        if not self.args.skip_audio:
+            # Cached audio may have been deleted
+            for path_key in ("audio_norm_path", "audio_spec_path"):
+                if (not entry[path_key]) or (not Path(entry[path_key]).exists()):
+                    return False
+
+        utt.phonemes = entry["phonemes"]
+        utt.phoneme_ids = entry["phoneme_ids"]
+        if not self.args.skip_audio:
+            utt.audio_norm_path = Path(entry["audio_norm_path"])
+            utt.audio_spec_path = Path(entry["audio_spec_path"])
+
+        utt.missing_phonemes = Counter(entry["missing_phonemes"])
+        self._used_keys.add(key)
+
+        return True
+
+    def add(self, keys: List[str], utts: List[Optional[Utterance]]) -> None:
+        for key, utt in zip(keys, utts):
+            if utt is None:
+                # Try again next time
+                continue
+
+            entry = {
+                "key": key,
+                "phonemes": utt.phonemes,
+                "phoneme_ids": utt.phoneme_ids,
+                "audio_norm_path": _path_str(utt.audio_norm_path),
+                "audio_spec_path": _path_str(utt.audio_spec_path),
+                "missing_phonemes": dict(utt.missing_phonemes),
+            }
+            json.dump(entry, self._file, ensure_ascii=False)
+            print("", file=self._file)
+            self.entries[key] = entry
+            self._used_keys.add(key)
+
+        self._file.flush()
+
+    def compact(self) -> None:
+        """Rewrite manifest with only the entries used in this run."""
+        self._file.close()
+
+        temp_path = self.path.with_suffix(".jsonl.tmp")
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            for key in self._used_keys:
+                json.dump(self.entries[key], manifest_file, ensure_ascii=False)
+                print("", file=manifest_file)
+
+        temp_path.replace(self.path)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _path_str(path: Optional[Path]) -> Optional[str]:
+    return str(path) if path is not None else None
+
+
 def ljspeech_dataset(args: argparse.Namespace) -> Iterable[Utterance]:
     dataset_dir = args.input_dir
     is_single_speaker = args.single_speaker
@@ -345,21 +345,29 @@ class Generator(torch.nn.Module):
         if gin_channels != 0:
             self.cond = nn.Conv1d(gin_channels, upsample_initial_channel, 1)
 
-    def forward(self, x, g=None):
+    def forward(self, x, g=None, x_mask=None):
         x = self.conv_pre(x)
         if g is not None:
             x = x + self.cond(g)
 
+        if x_mask is not None:
+            # Padded frames in a batch are kept at zero, so they don't leak
+            # into the end of shorter utterances through the convolutions.
+            x = x * x_mask
+
         for i, up in enumerate(self.ups):
             x = F.leaky_relu(x, self.LRELU_SLOPE)
             x = up(x)
+            if x_mask is not None:
+                x_mask = F.interpolate(x_mask, size=x.size(2), mode="nearest")
+
             xs = torch.zeros(1)
             for j, resblock in enumerate(self.resblocks):
                 index = j - (i * self.num_kernels)
                 if index == 0:
-                    xs = resblock(x)
+                    xs = resblock(x, x_mask)
                 elif (index > 0) and (index < self.num_kernels):
-                    xs += resblock(x)
+                    xs += resblock(x, x_mask)
             x = xs / self.num_kernels
         x = F.leaky_relu(x)
         x = self.conv_post(x)
@@ -717,7 +725,7 @@ class SynthesizerTrn(nn.Module):
 
         z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
         z = self.flow(z_p, y_mask, g=g, reverse=True)
-        o = self.dec((z * y_mask)[:, :, :max_len], g=g)
+        o = self.dec((z * y_mask)[:, :, :max_len], g=g, x_mask=y_mask[:, :, :max_len])
 
         return o, attn, y_mask, (z, z_p, m_p, logs_p)
 
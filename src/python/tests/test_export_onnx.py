@@ -0,0 +1,85 @@
+"""Tests for batched inference with models from export_onnx"""
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+onnxruntime = pytest.importorskip("onnxruntime")
+
+from piper_train.export_onnx import export_model  # noqa: E402
+from piper_train.vits.models import SynthesizerTrn  # noqa: E402
+
+NUM_SYMBOLS = 20
+PAD_ID = 0
+
+# noise, length, noise_w
+SCALES = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory) -> "onnxruntime.InferenceSession":
+    """Small generator with random weights, exported to Onnx."""
+    torch.manual_seed(1234)
+    model_g = SynthesizerTrn(
+        n_vocab=NUM_SYMBOLS,
+        spec_channels=65,
+        segment_size=32,
+        inter_channels=16,
+        hidden_channels=16,
+        filter_channels=32,
+        n_heads=2,
+        n_layers=2,
+        kernel_size=3,
+        p_dropout=0.0,
+        resblock="2",
+        resblock_kernel_sizes=(3, 5, 7),
+        resblock_dilation_sizes=((1, 2), (2, 6), (3, 12)),
+        upsample_rates=(8, 8, 4),
+        upsample_initial_channel=32,
+        upsample_kernel_sizes=(16, 16, 8),
+    )
+
+    model_path = tmp_path_factory.mktemp("model") / "model.onnx"
+    export_model(model_g, model_path)
+
+    return onnxruntime.InferenceSession(str(model_path))
+
+
+def test_batch_matches_single(session) -> None:
+    """Padded utterances in a batch sound the same as on their own."""
+    rng = np.random.default_rng(1234)
+    phoneme_ids_batch = [
+        rng.integers(1, NUM_SYMBOLS, size=length) for length in (40, 25, 12, 31)
+    ]
+
+    max_length = max(len(phoneme_ids) for phoneme_ids in phoneme_ids_batch)
+    batch_input = np.full((len(phoneme_ids_batch), max_length), PAD_ID, np.int64)
+    for batch_idx, phoneme_ids in enumerate(phoneme_ids_batch):
+        batch_input[batch_idx, : len(phoneme_ids)] = phoneme_ids
+
+    batch_audio, batch_lengths = session.run(
+        None,
+        {
+            "input": batch_input,
+            "input_lengths": np.array(
+                [len(phoneme_ids) for phoneme_ids in phoneme_ids_batch], np.int64
+            ),
+            "scales": SCALES,
+        },
+    )
+    batch_audio = batch_audio.reshape((len(phoneme_ids_batch), -1))
+
+    for batch_idx, phoneme_ids in enumerate(phoneme_ids_batch):
+        audio, lengths = session.run(
+            None,
+            {
+                "input": np.expand_dims(phoneme_ids.astype(np.int64), 0),
+                "input_lengths": np.array([len(phoneme_ids)], np.int64),
+                "scales": SCALES,
+            },
+        )
+        audio = audio.reshape(-1)
+
+        assert batch_lengths[batch_idx] == lengths[0] == len(audio)
+        np.testing.assert_allclose(
+            batch_audio[batch_idx, : len(audio)], audio, rtol=0, atol=1e-4
+        )
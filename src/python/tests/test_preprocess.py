@@ -0,0 +1,38 @@
+"""Tests for the preprocessing manifest"""
+import argparse
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("piper_phonemize")
+
+from piper_train.preprocess import Manifest  # noqa: E402
+
+
+def test_manifest_partial_line(tmp_path) -> None:
+    """A partial last line from an interrupted run is cut off."""
+    manifest_path = tmp_path / "manifest.jsonl"
+    complete_lines = "".join(
+        json.dumps({"key": key}) + "\n" for key in ("first", "second")
+    )
+    manifest_path.write_text(complete_lines + '{"key": "th', encoding="utf-8")
+
+    manifest = Manifest(manifest_path, argparse.Namespace())
+    manifest.close()
+
+    assert set(manifest.entries.keys()) == {"first", "second"}
+    assert manifest_path.read_text(encoding="utf-8") == complete_lines
+
+
+def test_manifest_complete(tmp_path) -> None:
+    """A manifest that ends with a complete line is left as-is."""
+    manifest_path = tmp_path / "manifest.jsonl"
+    complete_lines = json.dumps({"key": "first"}) + "\n"
+    manifest_path.write_text(complete_lines, encoding="utf-8")
+
+    manifest = Manifest(manifest_path, argparse.Namespace())
+    manifest.close()
+
+    assert set(manifest.entries.keys()) == {"first"}
+    assert manifest_path.read_text(encoding="utf-8") == complete_lines
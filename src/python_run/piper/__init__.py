@@ -1,5 +1,11 @@
+from .phoneme_cache import PhonemeCache
+from .pool import PiperVoicePool
+from .registry import VoiceRegistry
 from .voice import PiperVoice
 
 __all__ = [
+    "PhonemeCache",
     "PiperVoice",
+    "PiperVoicePool",
+    "VoiceRegistry",
 ]
@@ -4,10 +4,19 @@ import sys
 import time
 import wave
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Optional, Union
 
 from . import PiperVoice
+from .audio_cache import AudioCache
+from .bulk import synthesize_bulk
 from .download import ensure_voice_exists, find_voice, get_voices
+from .encoders import OutputFormat, make_encoder
+from .gain import GainSettings, add_gain_args
+from .phoneme_cache import PhonemeCache
+from .phrases import add_phrase_args, get_phrase_load_args
+from .resample import add_resample_args, get_resample_load_args
+from .session import SessionProfile, add_session_args
+from .streaming import add_streaming_args, get_streaming_load_args
 
 _FILE = Path(__file__)
 _DIR = _FILE.parent
@@ -30,12 +39,33 @@ def main() -> None:
         "--output_dir",
         help="Path to output directory (default: cwd)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Synthesize lines to --output-dir with this many processes",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Record finished lines here to resume --workers (default: manifest.jsonl in output dir)",
+    )
     parser.add_argument(
         "--output-raw",
         "--output_raw",
         action="store_true",
         help="Stream raw audio to stdout",
     )
+    parser.add_argument(
+        "--output-format",
+        "--output_format",
+        choices=[output_format.value for output_format in OutputFormat],
+        default=OutputFormat.WAV.value,
+        help="Format of output audio (default: wav)",
+    )
+    parser.add_argument(
+        "--ssml",
+        action="store_true",
+        help="Input is SSML (one document per line with --output-raw/--output-dir)",
+    )
     #
     parser.add_argument("-s", "--speaker", type=int, help="Id of speaker (default: 0)")
     parser.add_argument(
@@ -49,6 +79,11 @@ def main() -> None:
     )
     #
     parser.add_argument("--cuda", action="store_true", help="Use GPU")
+    add_session_args(parser)
+    add_streaming_args(parser)
+    add_gain_args(parser)
+    add_resample_args(parser)
+    add_phrase_args(parser)
     #
     parser.add_argument(
         "--sentence-silence",
@@ -57,6 +92,68 @@ def main() -> None:
         default=0.0,
         help="Seconds of silence after each sentence",
     )
+    parser.add_argument(
+        "--max-batch-size",
+        "--max_batch_size",
+        type=int,
+        default=1,
+        help="Synthesize up to this many sentences at once (default: 1)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Phonemize the next sentence while the current one is synthesized",
+    )
+    #
+    parser.add_argument(
+        "--phoneme-cache",
+        "--phoneme_cache",
+        action="store_true",
+        help="Cache phonemes for repeated text",
+    )
+    parser.add_argument(
+        "--phoneme-cache-file",
+        "--phoneme_cache_file",
+        help="Load/save phoneme cache from JSON file (implies --phoneme-cache)",
+    )
+    parser.add_argument(
+        "--phoneme-cache-max-mb",
+        "--phoneme_cache_max_mb",
+        type=float,
+        default=16,
+        help="Maximum size of phoneme cache in megabytes (default: 16)",
+    )
+    parser.add_argument(
+        "--audio-cache",
+        "--audio_cache",
+        action="store_true",
+        help="Cache synthesized audio in memory (only with --noise-scale 0 --noise-w 0, see --audio-cache-allow-noise)",
+    )
+    parser.add_argument(
+        "--audio-cache-allow-noise",
+        "--audio_cache_allow_noise",
+        action="store_true",
+        help="Also cache audio synthesized with noise, so repeated text always sounds like its first synthesis",
+    )
+    parser.add_argument(
+        "--audio-cache-dir",
+        "--audio_cache_dir",
+        help="Also cache synthesized audio in a directory (implies --audio-cache)",
+    )
+    parser.add_argument(
+        "--audio-cache-max-mb",
+        "--audio_cache_max_mb",
+        type=float,
+        default=64,
+        help="Maximum size of in-memory audio cache in megabytes (default: 64)",
+    )
+    parser.add_argument(
+        "--audio-cache-dir-max-mb",
+        "--audio_cache_dir_max_mb",
+        type=float,
+        default=1024,
+        help="Maximum size of audio cache directory in megabytes (default: 1024)",
+    )
     #
     parser.add_argument(
         "--data-dir",
@@ -84,6 +181,16 @@ def main() -> None:
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
     _LOGGER.debug(args)
 
+    if args.workers and not args.output_dir:
+        parser.error("--workers requires --output-dir")
+
+    output_format = OutputFormat(args.output_format)
+    if (output_format != OutputFormat.WAV) and (args.output_raw or args.workers):
+        parser.error("--output-format can't be used with --output-raw or --workers")
+
+    if args.ssml and args.workers:
+        parser.error("--ssml can't be used with --workers")
+
     if not args.download_dir:
         # Download to first data directory by default
         args.download_dir = args.data_dir[0]
@@ -104,17 +211,89 @@ def main() -> None:
         ensure_voice_exists(args.model, args.data_dir, args.download_dir, voices_info)
         args.model, args.config = find_voice(args.model, args.data_dir)
 
+    if args.workers:
+        if args.phoneme_cache_file or args.audio_cache or args.audio_cache_dir:
+            _LOGGER.warning("Caches are not used with --workers")
+
+        # Each worker process loads its own voice
+        synthesize_bulk(
+            sys.stdin,
+            args.output_dir,
+            args.model,
+            config_path=args.config,
+            num_workers=args.workers,
+            session_profile=SessionProfile.from_args(args),
+            manifest_path=args.manifest,
+            synthesize_args={
+                "speaker_id": args.speaker,
+                "length_scale": args.length_scale,
+                "noise_scale": args.noise_scale,
+                "noise_w": args.noise_w,
+                "sentence_silence": args.sentence_silence,
+                "max_batch_size": args.max_batch_size,
+                "pipeline": args.pipeline,
+            },
+            use_cuda=args.cuda,
+            model_cache_dir=args.model_cache_dir,
+            gain=GainSettings.from_args(args),
+            **get_streaming_load_args(args),
+            **get_resample_load_args(args),
+            **get_phrase_load_args(args),
+        )
+        return
+
+    phoneme_cache: Optional[PhonemeCache] = None
+    if args.phoneme_cache or args.phoneme_cache_file:
+        phoneme_cache = PhonemeCache(
+            max_bytes=int(args.phoneme_cache_max_mb * 1024 * 1024)
+        )
+        if args.phoneme_cache_file and Path(args.phoneme_cache_file).exists():
+            phoneme_cache.load(args.phoneme_cache_file)
+
+    audio_cache: Optional[AudioCache] = None
+    if args.audio_cache or args.audio_cache_dir:
+        audio_cache = AudioCache(
+            max_memory_bytes=int(args.audio_cache_max_mb * 1024 * 1024),
+            cache_dir=args.audio_cache_dir,
+            max_disk_bytes=int(args.audio_cache_dir_max_mb * 1024 * 1024),
+            allow_noise=args.audio_cache_allow_noise,
+        )
+
     # Load voice
-    voice = PiperVoice.load(args.model, config_path=args.config, use_cuda=args.cuda)
+    voice = PiperVoice.load(
+        args.model,
+        config_path=args.config,
+        use_cuda=args.cuda,
+        phoneme_cache=phoneme_cache,
+        audio_cache=audio_cache,
+        session_profile=SessionProfile.from_args(args),
+        model_cache_dir=args.model_cache_dir,
+        gain=GainSettings.from_args(args),
+        **get_streaming_load_args(args),
+        **get_resample_load_args(args),
+        **get_phrase_load_args(args),
+    )
     synthesize_args = {
         "speaker_id": args.speaker,
         "length_scale": args.length_scale,
         "noise_scale": args.noise_scale,
         "noise_w": args.noise_w,
         "sentence_silence": args.sentence_silence,
+        "pipeline": args.pipeline,
     }
 
+    synthesize_wav = voice.synthesize
+    if args.ssml:
+        if args.pipeline:
+            _LOGGER.warning("--pipeline is not used with --ssml")
+
+        synthesize_args.pop("pipeline")
+        synthesize_wav = voice.synthesize_ssml
+
     if args.output_raw:
+        # Keep loudness consistent across lines of one stream
+        gain_stage = voice.make_gain_stage()
+
         # Read line-by-line
         for line in sys.stdin:
             line = line.strip()
@@ -122,9 +301,18 @@ def main() -> None:
                 continue
 
             # Write raw audio to stdout as its produced
-            audio_stream = voice.synthesize_stream_raw(line, **synthesize_args)
-            for audio_bytes in audio_stream:
-                sys.stdout.buffer.write(audio_bytes)
+            audio_stream: Iterable[bytes]
+            if args.ssml:
+                audio_stream = voice.synthesize_ssml_stream_raw(
+                    line, max_batch_size=args.max_batch_size, **synthesize_args
+                )
+            else:
+                audio_stream = voice.synthesize_stream_raw(
+                    line, gain_stage=gain_stage, **synthesize_args
+                )
+
+            for audio in audio_stream:
+                sys.stdout.buffer.write(audio)
                 sys.stdout.buffer.flush()
     elif args.output_dir:
         output_dir = Path(args.output_dir)
@@ -136,23 +324,123 @@ def main() -> None:
             if not line:
                 continue
 
-            wav_path = output_dir / f"{time.monotonic_ns()}.wav"
-            with wave.open(str(wav_path), "wb") as wav_file:
-                voice.synthesize(line, wav_file, **synthesize_args)
+            wav_path = output_dir / f"{time.monotonic_ns()}.{output_format.value}"
+            if output_format == OutputFormat.WAV:
+                with wave.open(str(wav_path), "wb") as wav_file:
+                    synthesize_wav(
+                        line,
+                        wav_file,
+                        max_batch_size=args.max_batch_size,
+                        **synthesize_args,
+                    )
+            else:
+                write_encoded(
+                    voice,
+                    line,
+                    wav_path,
+                    output_format,
+                    synthesize_args,
+                    ssml=args.ssml,
+                    max_batch_size=args.max_batch_size,
+                )
 
             _LOGGER.info("Wrote %s", wav_path)
     else:
         # Read entire input
         text = sys.stdin.read()
 
-        if (not args.output_file) or (args.output_file == "-"):
+        if output_format != OutputFormat.WAV:
+            if (not args.output_file) or (args.output_file == "-"):
+                write_encoded(
+                    voice,
+                    text,
+                    None,
+                    output_format,
+                    synthesize_args,
+                    ssml=args.ssml,
+                    max_batch_size=args.max_batch_size,
+                )
+            else:
+                write_encoded(
+                    voice,
+                    text,
+                    args.output_file,
+                    output_format,
+                    synthesize_args,
+                    ssml=args.ssml,
+                    max_batch_size=args.max_batch_size,
+                )
+        elif (not args.output_file) or (args.output_file == "-"):
             # Write to stdout
             with wave.open(sys.stdout.buffer, "wb") as wav_file:
-                voice.synthesize(text, wav_file, **synthesize_args)
+                synthesize_wav(
+                    text,
+                    wav_file,
+                    max_batch_size=args.max_batch_size,
+                    **synthesize_args,
+                )
         else:
             # Write to file
             with wave.open(args.output_file, "wb") as wav_file:
-                voice.synthesize(text, wav_file, **synthesize_args)
+                synthesize_wav(
+                    text,
+                    wav_file,
+                    max_batch_size=args.max_batch_size,
+                    **synthesize_args,
+                )
+
+    if phoneme_cache is not None:
+        _LOGGER.debug(
+            "Phoneme cache hit ratio: %0.2f (hits=%s, misses=%s)",
+            phoneme_cache.hit_ratio,
+            phoneme_cache.hits,
+            phoneme_cache.misses,
+        )
+        if args.phoneme_cache_file:
+            phoneme_cache.save(args.phoneme_cache_file)
+
+    if audio_cache is not None:
+        _LOGGER.debug(
+            "Audio cache hit ratio: %0.2f (hits=%s, misses=%s, bytes saved=%s)",
+            audio_cache.hit_ratio,
+            audio_cache.hits,
+            audio_cache.misses,
+            audio_cache.bytes_saved,
+        )
+
+
+def write_encoded(
+    voice: PiperVoice,
+    text: str,
+    output_path: Optional[Union[str, Path]],
+    output_format: OutputFormat,
+    synthesize_args: Dict[str, Any],
+    ssml: bool = False,
+    max_batch_size: int = 1,
+) -> None:
+    """Synthesize text and write it in output_format as it's encoded.
+
+    Audio is streamed to stdout if output_path is None.
+    """
+    encoder = make_encoder(output_format, voice.sample_rate, output_path=output_path)
+    audio_stream: Iterable[bytes]
+    if ssml:
+        audio_stream = voice.synthesize_ssml_stream_raw(
+            text, max_batch_size=max_batch_size, **synthesize_args
+        )
+    else:
+        audio_stream = voice.synthesize_stream_raw(text, **synthesize_args)
+
+    for audio in audio_stream:
+        encoded_bytes = encoder.encode(audio)
+        if encoded_bytes:
+            sys.stdout.buffer.write(encoded_bytes)
+            sys.stdout.buffer.flush()
+
+    encoded_bytes = encoder.finish()
+    if encoded_bytes:
+        sys.stdout.buffer.write(encoded_bytes)
+        sys.stdout.buffer.flush()
 
 
 if __name__ == "__main__":
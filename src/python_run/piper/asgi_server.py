@@ -0,0 +1,778 @@
+#!/usr/bin/env python3
+"""Asynchronous (ASGI) server that streams audio as it's synthesized"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import parse_qs
+
+from .audio_cache import AudioCache
+from .download import ensure_voice_exists, find_voice, get_voices
+from .encoders import (
+    CONTENT_TYPES,
+    get_available_formats,
+    get_output_format,
+    make_encoder,
+)
+from .gain import GainSettings, GainStage, add_gain_args
+from .phoneme_cache import PhonemeCache
+from .phrases import add_phrase_args, get_phrase_load_args
+from .pool import PiperVoicePool
+from .registry import UnknownVoiceError, VoiceRegistry
+from .resample import add_resample_args, get_resample_load_args
+from .sentences import SentenceSplitter
+from .session import SessionProfile, add_session_args
+from .streaming import add_streaming_args, get_streaming_load_args
+from .voice import PiperVoice
+
+_LOGGER = logging.getLogger()
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+# Audio and seconds of silence after each phrase of a sentence
+_PhraseFutures = List[Tuple["asyncio.Future[bytes]", float]]
+
+
+class PiperAsgiApp:
+    """ASGI app that streams audio sentence by sentence.
+
+    Text can also be sent in pieces over a WebSocket at /ws, with audio for
+    each sentence sent back as soon as the sentence is complete.
+
+    The WAV header is sent right away with an unknown data size, followed by
+    each sentence's audio as soon as it's synthesized. Since the length isn't
+    known, responses use chunked transfer encoding. Other formats (FLAC,
+    Ogg, MP3) can be requested with the Accept header, and are encoded as
+    audio is synthesized.
+
+    Sentences for the default voice are synthesized by pool. Other voices
+    (voice parameter) are loaded from registry, if set.
+    """
+
+    def __init__(
+        self,
+        pool: PiperVoicePool,
+        registry: Optional[VoiceRegistry] = None,
+        default_voice_name: Optional[str] = None,
+        synthesize_args: Optional[Dict[str, Any]] = None,
+        sentence_silence: float = 0.0,
+        max_sentences_ahead: Optional[int] = None,
+        max_queued_sentences: int = 4,
+    ) -> None:
+        self.pool = pool
+        self.registry = registry
+        self.default_voice_name = default_voice_name
+        self.synthesize_args = synthesize_args or {}
+        """Keyword arguments for synthesize_ids_to_raw"""
+
+        self.sentence_silence = sentence_silence
+        self.max_sentences_ahead = max_sentences_ahead or pool.num_workers
+        """Sentences of a request that may be queued for synthesis at once"""
+
+        self.max_queued_sentences = max_queued_sentences
+        """WebSocket sentences waiting for synthesis before input stops being read"""
+
+        self.available_formats = get_available_formats()
+
+        # Blocking work outside of the pool (phonemizing, loading voices, encoding)
+        self._executor = ThreadPoolExecutor(thread_name_prefix="piper-asgi")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._handle_http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._handle_websocket(scope, receive, send)
+
+    async def synthesize_stream_raw(
+        self, text: str, voice: Optional[PiperVoice] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """Synthesize raw audio per sentence from text.
+
+        Uses the pool if voice is None. Up to max_sentences_ahead sentences
+        are synthesized in parallel, and audio is yielded in sentence order.
+        """
+        # 16-bit mono
+        sample_rate = (voice or self.pool).sample_rate
+        num_silence_samples = int(self.sentence_silence * sample_rate)
+        silence_bytes = bytes(num_silence_samples * 2)
+
+        sentence_stream = self._synthesize_sentences(
+            text, voice, gain_stage=self._make_gain_stage(voice)
+        )
+        try:
+            async for _phonemes, audio_bytes in sentence_stream:
+                yield audio_bytes
+                if silence_bytes:
+                    yield silence_bytes
+        finally:
+            await sentence_stream.aclose()
+
+    async def _synthesize_sentences(
+        self,
+        text: str,
+        voice: Optional[PiperVoice] = None,
+        gain_stage: Optional[GainStage] = None,
+    ) -> AsyncGenerator[Tuple[List[str], bytes], None]:
+        """Yield (phonemes, raw audio) for each sentence in text.
+
+        Phrases of a sentence (see PiperVoice.split_phrase_ids) are
+        synthesized in parallel and joined with their silence. With a
+        gain_stage, they're synthesized one at a time to carry gain state.
+        """
+        loop = asyncio.get_running_loop()
+        phonemizer = voice or self.pool.voices[0]
+        sentences = await loop.run_in_executor(
+            self._executor, phonemizer.phonemize_ids, text
+        )
+
+        # 16-bit mono
+        sample_rate = (voice or self.pool).sample_rate
+
+        futures: "Deque[Tuple[List[str], _PhraseFutures]]" = deque()
+        try:
+            for phonemes, phoneme_ids in sentences:
+                phrase_futures: _PhraseFutures = []
+                for phrase_ids, silence_seconds in phonemizer.split_phrase_ids(
+                    phonemes, phoneme_ids
+                ):
+                    future: "asyncio.Future[bytes]"
+                    if voice is None:
+                        future = asyncio.wrap_future(
+                            self.pool.submit_ids(
+                                phrase_ids,
+                                gain_stage=gain_stage,
+                                **self.synthesize_args,
+                            )
+                        )
+                    else:
+                        future = loop.run_in_executor(
+                            self._executor,
+                            functools.partial(
+                                voice.synthesize_ids_to_raw,
+                                phrase_ids,
+                                gain_stage=gain_stage,
+                                **self.synthesize_args,
+                            ),
+                        )
+
+                    phrase_futures.append((future, silence_seconds))
+                    if gain_stage is not None:
+                        # Next phrase depends on this one's gain state
+                        await future
+
+                futures.append((phonemes, phrase_futures))
+                if len(futures) >= self.max_sentences_ahead:
+                    phonemes, phrase_futures = futures.popleft()
+                    yield (phonemes, await _join_phrases(phrase_futures, sample_rate))
+
+            while futures:
+                phonemes, phrase_futures = futures.popleft()
+                yield (phonemes, await _join_phrases(phrase_futures, sample_rate))
+        finally:
+            # Client went away or synthesis failed
+            for _phonemes, phrase_futures in futures:
+                for future, _silence_seconds in phrase_futures:
+                    future.cancel()
+
+    def _make_gain_stage(self, voice: Optional[PiperVoice]) -> Optional[GainStage]:
+        """Gain stage for one request, or None if gain isn't carried across sentences."""
+        voice = voice or self.pool.voices[0]
+        if not voice.gain.is_stateful:
+            return None
+
+        return voice.make_gain_stage()
+
+    async def get_voice(self, voice_name: Optional[str]) -> Optional[PiperVoice]:
+        """Load a voice by name, or None for the default voice (pool)."""
+        if (not voice_name) or (voice_name == self.default_voice_name):
+            return None
+
+        if self.registry is None:
+            raise ValueError("Only the default voice is available")
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.registry.get, voice_name)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    # -------------------------------------------------------------------------
+
+    async def _handle_http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["path"] != "/":
+            await _send_text(send, 404, "Not found")
+            return
+
+        if scope["method"] not in ("GET", "POST"):
+            await _send_text(send, 405, "Method not allowed")
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+        if scope["method"] == "POST":
+            text = (await _read_body(receive)).decode("utf-8")
+        else:
+            text = query.get("text", [""])[0]
+
+        text = text.strip()
+        if not text:
+            await _send_text(send, 400, "No text provided")
+            return
+
+        headers = dict(scope.get("headers", []))
+        output_format = get_output_format(
+            headers.get(b"accept", b"").decode("latin-1"), self.available_formats
+        )
+        if output_format is None:
+            await _send_text(
+                send,
+                406,
+                "Accepted formats: "
+                + ", ".join(CONTENT_TYPES[f] for f in self.available_formats),
+            )
+            return
+
+        try:
+            voice = await self.get_voice(query.get("voice", [""])[0])
+        except UnknownVoiceError as err:
+            await _send_text(send, 404, str(err))
+            return
+        except ValueError as err:
+            await _send_text(send, 400, str(err))
+            return
+
+        _LOGGER.debug("Synthesizing text: %s", text)
+        sample_rate = (voice or self.pool).sample_rate
+        encoder = make_encoder(output_format, sample_rate)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", encoder.content_type.encode())],
+            }
+        )
+
+        # Header is sent right away
+        await send(
+            {
+                "type": "http.response.body",
+                "body": encoder.encode(b""),
+                "more_body": True,
+            }
+        )
+
+        # Stop synthesizing if the client disconnects
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        audio_stream = self.synthesize_stream_raw(text, voice)
+        try:
+            async for audio_bytes in audio_stream:
+                if disconnected.done():
+                    _LOGGER.debug("Client disconnected")
+                    return
+
+                encoded_bytes = await loop.run_in_executor(
+                    self._executor, encoder.encode, audio_bytes
+                )
+                if not encoded_bytes:
+                    continue
+
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": encoded_bytes,
+                        "more_body": True,
+                    }
+                )
+
+            await send({"type": "http.response.body", "body": encoder.finish()})
+        finally:
+            await audio_stream.aclose()
+            disconnected.cancel()
+
+    async def _handle_websocket(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+
+        if scope["path"] != "/ws":
+            # Rejected before accepting (HTTP 403)
+            await send({"type": "websocket.close", "code": 1008})
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+        try:
+            voice = await self.get_voice(query.get("voice", [""])[0])
+        except ValueError as err:
+            await send({"type": "websocket.close", "code": 1008, "reason": str(err)})
+            return
+
+        await send({"type": "websocket.accept"})
+        await _send_json(
+            send,
+            {
+                "type": "start",
+                "sample_rate": (voice or self.pool).sample_rate,
+                "sample_width": 2,
+                "channels": 1,
+            },
+        )
+
+        # Complete sentences waiting to be synthesized. When full, input stops
+        # being read so clients can't send text faster than it's synthesized.
+        sentence_queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(
+            maxsize=self.max_queued_sentences
+        )
+        reader = asyncio.ensure_future(
+            _read_websocket_text(receive, send, sentence_queue)
+        )
+        writer = asyncio.ensure_future(
+            self._write_websocket_audio(send, sentence_queue, voice)
+        )
+
+        try:
+            done, _pending = await asyncio.wait(
+                {reader, writer}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if writer in done:
+                # Only finishes early on error
+                writer.result()
+            elif reader.result():
+                # Client sent end; finish remaining sentences
+                await writer
+                await send({"type": "websocket.close", "code": 1000})
+            else:
+                _LOGGER.debug("Client disconnected")
+        except Exception as err:
+            _LOGGER.exception("Unexpected error in WebSocket")
+            await _send_json(send, {"type": "error", "message": str(err)})
+            await send({"type": "websocket.close", "code": 1011})
+        finally:
+            reader.cancel()
+            writer.cancel()
+
+    async def _write_websocket_audio(
+        self,
+        send: Send,
+        sentence_queue: "asyncio.Queue[Optional[str]]",
+        voice: Optional[PiperVoice],
+    ) -> None:
+        """Synthesize queued sentences, sending metadata then audio for each."""
+        sample_rate = (voice or self.pool).sample_rate
+        num_silence_samples = int(self.sentence_silence * sample_rate)
+        silence_bytes = bytes(num_silence_samples * 2)
+
+        # Gain is carried across all sentences of the connection
+        gain_stage = self._make_gain_stage(voice)
+
+        sentence_index = 0
+        num_samples = 0
+        while True:
+            text = await sentence_queue.get()
+            if text is None:
+                break
+
+            start_time = time.monotonic()
+            sentence_stream = self._synthesize_sentences(
+                text, voice, gain_stage=gain_stage
+            )
+            try:
+                async for phonemes, audio_bytes in sentence_stream:
+                    await _send_json(
+                        send,
+                        {
+                            "type": "sentence",
+                            "index": sentence_index,
+                            "text": text,
+                            "phonemes": "".join(phonemes),
+                            "start_seconds": num_samples / sample_rate,
+                            "duration_seconds": len(audio_bytes) / 2 / sample_rate,
+                            "synthesis_seconds": time.monotonic() - start_time,
+                        },
+                    )
+
+                    audio_bytes += silence_bytes
+                    await send({"type": "websocket.send", "bytes": audio_bytes})
+
+                    sentence_index += 1
+                    num_samples += len(audio_bytes) // 2
+                    start_time = time.monotonic()
+            finally:
+                await sentence_stream.aclose()
+
+        await _send_json(
+            send,
+            {
+                "type": "end",
+                "num_sentences": sentence_index,
+                "duration_seconds": num_samples / sample_rate,
+            },
+        )
+
+    async def _handle_lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            break
+
+    return body
+
+
+async def _join_phrases(phrase_futures: _PhraseFutures, sample_rate: int) -> bytes:
+    """Raw audio of a sentence from its phrases and the silence after them."""
+    if len(phrase_futures) == 1:
+        future, silence_seconds = phrase_futures[0]
+        if silence_seconds <= 0:
+            return await future
+
+    audio_parts: List[bytes] = []
+    for future, silence_seconds in phrase_futures:
+        audio_parts.append(await future)
+
+        # 16-bit mono
+        num_silence_samples = int(silence_seconds * sample_rate)
+        if num_silence_samples > 0:
+            audio_parts.append(bytes(num_silence_samples * 2))
+
+    return b"".join(audio_parts)
+
+
+async def _wait_for_disconnect(receive: Receive) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _read_websocket_text(
+    receive: Receive, send: Send, sentence_queue: "asyncio.Queue[Optional[str]]"
+) -> bool:
+    """Split incoming text into sentences and queue them.
+
+    Returns True if the client sent end, or False if it disconnected.
+    """
+    splitter = SentenceSplitter()
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return False
+
+        if message["type"] != "websocket.receive":
+            continue
+
+        try:
+            request = json.loads(message.get("text") or "")
+            request_type = request["type"]
+        except (ValueError, TypeError, KeyError):
+            await _send_json(
+                send, {"type": "error", "message": "Expected JSON with a type"}
+            )
+            continue
+
+        if request_type == "text":
+            for sentence in splitter.add(str(request.get("text", ""))):
+                await sentence_queue.put(sentence)
+        elif request_type in ("flush", "end"):
+            sentence = splitter.flush()
+            if sentence:
+                await sentence_queue.put(sentence)
+
+            if request_type == "end":
+                await sentence_queue.put(None)
+                return True
+        else:
+            await _send_json(
+                send,
+                {"type": "error", "message": f"Unexpected type: {request_type}"},
+            )
+
+
+async def _send_json(send: Send, message: Dict[str, Any]) -> None:
+    await send({"type": "websocket.send", "text": json.dumps(message)})
+
+
+async def _send_text(send: Send, status: int, text: str) -> None:
+    body = text.encode("utf-8")
+    headers: List[Tuple[bytes, bytes]] = [
+        (b"content-type", b"text/plain; charset=utf-8"),
+        (b"content-length", str(len(body)).encode("ascii")),
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# -----------------------------------------------------------------------------
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0", help="HTTP server host")
+    parser.add_argument("--port", type=int, default=5000, help="HTTP server port")
+    parser.add_argument(
+        "--keep-alive-timeout",
+        "--keep_alive_timeout",
+        type=float,
+        default=5,
+        help="Seconds to keep idle connections open (default: 5)",
+    )
+    #
+    parser.add_argument("-m", "--model", required=True, help="Path to Onnx model file")
+    parser.add_argument("-c", "--config", help="Path to model config file")
+    #
+    parser.add_argument("-s", "--speaker", type=int, help="Id of speaker (default: 0)")
+    parser.add_argument(
+        "--length-scale", "--length_scale", type=float, help="Phoneme length"
+    )
+    parser.add_argument(
+        "--noise-scale", "--noise_scale", type=float, help="Generator noise"
+    )
+    parser.add_argument(
+        "--noise-w", "--noise_w", type=float, help="Phoneme width noise"
+    )
+    #
+    parser.add_argument("--cuda", action="store_true", help="Use GPU")
+    add_session_args(parser)
+    add_streaming_args(parser)
+    add_gain_args(parser)
+    add_resample_args(parser)
+    add_phrase_args(parser)
+    #
+    parser.add_argument(
+        "--sentence-silence",
+        "--sentence_silence",
+        type=float,
+        default=0.0,
+        help="Seconds of silence after each sentence",
+    )
+    parser.add_argument(
+        "--max-voice-memory-mb",
+        "--max_voice_memory_mb",
+        type=float,
+        help="Unload least recently used voices above this size in megabytes",
+    )
+    parser.add_argument(
+        "--num-sessions",
+        "--num_sessions",
+        type=int,
+        default=1,
+        help="Onnx sessions for the default voice, synthesizing in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--threads-per-session",
+        "--threads_per_session",
+        type=int,
+        help="Intra-op threads for each session (default: cores / sessions)",
+    )
+    #
+    parser.add_argument(
+        "--phoneme-cache",
+        "--phoneme_cache",
+        action="store_true",
+        help="Cache phonemes for repeated text",
+    )
+    parser.add_argument(
+        "--phoneme-cache-max-mb",
+        "--phoneme_cache_max_mb",
+        type=float,
+        default=16,
+        help="Maximum size of phoneme cache in megabytes (default: 16)",
+    )
+    parser.add_argument(
+        "--audio-cache",
+        "--audio_cache",
+        action="store_true",
+        help="Cache synthesized audio in memory (only with --noise-scale 0 --noise-w 0, see --audio-cache-allow-noise)",
+    )
+    parser.add_argument(
+        "--audio-cache-allow-noise",
+        "--audio_cache_allow_noise",
+        action="store_true",
+        help="Also cache audio synthesized with noise, so repeated text always sounds like its first synthesis",
+    )
+    parser.add_argument(
+        "--audio-cache-dir",
+        "--audio_cache_dir",
+        help="Also cache synthesized audio in a directory (implies --audio-cache)",
+    )
+    parser.add_argument(
+        "--audio-cache-max-mb",
+        "--audio_cache_max_mb",
+        type=float,
+        default=64,
+        help="Maximum size of in-memory audio cache in megabytes (default: 64)",
+    )
+    parser.add_argument(
+        "--audio-cache-dir-max-mb",
+        "--audio_cache_dir_max_mb",
+        type=float,
+        default=1024,
+        help="Maximum size of audio cache directory in megabytes (default: 1024)",
+    )
+    #
+    parser.add_argument(
+        "--data-dir",
+        "--data_dir",
+        action="append",
+        default=[str(Path.cwd())],
+        help="Data directory to check for downloaded models (default: current directory)",
+    )
+    parser.add_argument(
+        "--download-dir",
+        "--download_dir",
+        help="Directory to download voices into (default: first data dir)",
+    )
+    #
+    parser.add_argument(
+        "--update-voices",
+        action="store_true",
+        help="Download latest voices.json during startup",
+    )
+    #
+    parser.add_argument(
+        "--debug", action="store_true", help="Print DEBUG messages to console"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    _LOGGER.debug(args)
+
+    try:
+        import uvicorn
+    except ImportError as err:
+        raise SystemExit(
+            "uvicorn is required: pip install -r requirements_asgi.txt"
+        ) from err
+
+    if not args.download_dir:
+        # Download to first data directory by default
+        args.download_dir = args.data_dir[0]
+
+    # Load voice info
+    voices_info = get_voices(args.download_dir, update_voices=args.update_voices)
+
+    # Resolve aliases for backwards compatibility with old voice names
+    aliases_info: Dict[str, Any] = {}
+    for voice_info in voices_info.values():
+        for voice_alias in voice_info.get("aliases", []):
+            aliases_info[voice_alias] = {"_is_alias": True, **voice_info}
+
+    voices_info.update(aliases_info)
+
+    # Download voice if file doesn't exist
+    model_path = Path(args.model)
+    if not model_path.exists():
+        ensure_voice_exists(args.model, args.data_dir, args.download_dir, voices_info)
+        args.model, args.config = find_voice(args.model, args.data_dir)
+
+    phoneme_cache: Optional[PhonemeCache] = None
+    if args.phoneme_cache:
+        phoneme_cache = PhonemeCache(
+            max_bytes=int(args.phoneme_cache_max_mb * 1024 * 1024)
+        )
+
+    audio_cache: Optional[AudioCache] = None
+    if args.audio_cache or args.audio_cache_dir:
+        audio_cache = AudioCache(
+            max_memory_bytes=int(args.audio_cache_max_mb * 1024 * 1024),
+            cache_dir=args.audio_cache_dir,
+            max_disk_bytes=int(args.audio_cache_dir_max_mb * 1024 * 1024),
+            allow_noise=args.audio_cache_allow_noise,
+        )
+
+    load_args: Dict[str, Any] = {
+        "use_cuda": args.cuda,
+        "phoneme_cache": phoneme_cache,
+        "audio_cache": audio_cache,
+        "session_profile": SessionProfile.from_args(args),
+        "model_cache_dir": args.model_cache_dir,
+        "gain": GainSettings.from_args(args),
+        **get_streaming_load_args(args),
+        **get_resample_load_args(args),
+        **get_phrase_load_args(args),
+    }
+
+    # Default voice
+    pool = PiperVoicePool.load(
+        args.model,
+        config_path=args.config,
+        num_workers=args.num_sessions,
+        threads_per_worker=args.threads_per_session,
+        **load_args,
+    )
+
+    # Other voices are loaded on first use
+    registry = VoiceRegistry(
+        args.data_dir,
+        download_dir=args.download_dir,
+        voices_info=voices_info,
+        max_memory_bytes=(
+            int(args.max_voice_memory_mb * 1024 * 1024)
+            if args.max_voice_memory_mb
+            else None
+        ),
+        **load_args,
+    )
+
+    app = PiperAsgiApp(
+        pool,
+        registry=registry,
+        default_voice_name=str(args.model),
+        synthesize_args={
+            "speaker_id": args.speaker,
+            "length_scale": args.length_scale,
+            "noise_scale": args.noise_scale,
+            "noise_w": args.noise_w,
+        },
+        sentence_silence=args.sentence_silence,
+    )
+
+    try:
+        uvicorn.run(
+            app,
+            host=args.host,
+            port=args.port,
+            timeout_keep_alive=args.keep_alive_timeout,
+        )
+    finally:
+        app.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
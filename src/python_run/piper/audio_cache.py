@@ -0,0 +1,187 @@
+"""Cache of synthesized audio"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+_PCM_SUFFIX = ".pcm"
+
+
+def make_audio_cache_key(
+    model_hash: str,
+    phoneme_ids: Iterable[int],
+    speaker_id: Optional[int],
+    length_scale: float,
+    noise_scale: float,
+    noise_w: float,
+) -> str:
+    """Hash of everything that determines the synthesized audio."""
+    key_hash = hashlib.sha256()
+    key_hash.update(
+        f"{model_hash}|{speaker_id}|{length_scale}|{noise_scale}|{noise_w}|".encode()
+    )
+    key_hash.update(np.array(list(phoneme_ids), dtype=np.int64).tobytes())
+
+    return key_hash.hexdigest()
+
+
+class AudioCache:
+    """Two-tier LRU cache of raw 16-bit mono audio.
+
+    Recently used audio is kept in memory up to max_memory_bytes. If cache_dir
+    is set, audio is also written there as raw PCM files, which are read
+    back into memory on a hit. The least recently modified files are
+    deleted when the directory goes over max_disk_bytes.
+
+    Audio synthesized with noise is random, so it's only cached if
+    allow_noise is True. It will then always sound like the first time it
+    was synthesized.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Optional[Union[str, Path]] = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+        allow_noise: bool = False,
+    ) -> None:
+        self.max_memory_bytes = max_memory_bytes
+        self.allow_noise = allow_noise
+        """Cache audio even if noise_scale or noise_w isn't 0"""
+
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        """Bytes of audio returned from the cache instead of synthesized"""
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+
+        # file name -> size, least recently used first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            pcm_paths = sorted(
+                self.cache_dir.glob(f"*{_PCM_SUFFIX}"),
+                key=lambda p: p.stat().st_mtime,
+            )
+            for pcm_path in pcm_paths:
+                pcm_size = pcm_path.stat().st_size
+                self._disk[pcm_path.name] = pcm_size
+                self._disk_bytes += pcm_size
+
+            _LOGGER.debug(
+                "Found %s cached audio file(s) in %s", len(self._disk), self.cache_dir
+            )
+            self._evict_disk()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Look up audio by key from make_audio_cache_key."""
+        with self._lock:
+            audio_bytes = self._memory.get(key)
+            if audio_bytes is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += len(audio_bytes)
+                return audio_bytes
+
+            pcm_name = f"{key}{_PCM_SUFFIX}"
+            if (self.cache_dir is None) or (pcm_name not in self._disk):
+                self.misses += 1
+                return None
+
+            pcm_path = self.cache_dir / pcm_name
+            try:
+                audio_bytes = _read_pcm(pcm_path)
+                os.utime(pcm_path)
+            except OSError:
+                _LOGGER.exception("Failed to read cached audio: %s", pcm_path)
+                self._disk_bytes -= self._disk.pop(pcm_name)
+                self.misses += 1
+                return None
+
+            self._disk.move_to_end(pcm_name)
+            self.disk_hits += 1
+            self.bytes_saved += len(audio_bytes)
+            self._put_memory(key, audio_bytes)
+
+            return audio_bytes
+
+    def put(self, key: str, audio_bytes: bytes) -> None:
+        """Add audio to both cache tiers."""
+        with self._lock:
+            self._put_memory(key, audio_bytes)
+
+            if self.cache_dir is None:
+                return
+
+            pcm_name = f"{key}{_PCM_SUFFIX}"
+            if (pcm_name in self._disk) or (len(audio_bytes) > self.max_disk_bytes):
+                return
+
+            # Write atomically so readers never see a partial file
+            with tempfile.NamedTemporaryFile(
+                dir=self.cache_dir, suffix=".tmp", delete=False
+            ) as temp_file:
+                temp_file.write(audio_bytes)
+
+            os.replace(temp_file.name, self.cache_dir / pcm_name)
+            self._disk[pcm_name] = len(audio_bytes)
+            self._disk_bytes += len(audio_bytes)
+            self._evict_disk()
+
+    def _put_memory(self, key: str, audio_bytes: bytes) -> None:
+        if len(audio_bytes) > self.max_memory_bytes:
+            return
+
+        old_bytes = self._memory.pop(key, None)
+        if old_bytes is not None:
+            self._memory_bytes -= len(old_bytes)
+
+        self._memory[key] = audio_bytes
+        self._memory_bytes += len(audio_bytes)
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _old_key, old_bytes = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_bytes)
+
+    def _evict_disk(self) -> None:
+        assert self.cache_dir is not None
+
+        while self._disk_bytes > self.max_disk_bytes:
+            pcm_name, pcm_size = self._disk.popitem(last=False)
+            self._disk_bytes -= pcm_size
+
+            try:
+                (self.cache_dir / pcm_name).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _read_pcm(pcm_path: Path) -> bytes:
+    # Hits are kept in memory as bytes, so mapping the file wouldn't save a copy
+    return pcm_path.read_bytes()
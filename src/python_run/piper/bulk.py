@@ -0,0 +1,221 @@
+"""Bulk synthesis of many lines with a pool of worker processes"""
+import dataclasses
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import wave
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+from .session import SessionProfile
+from .voice import PiperVoice
+
+_LOGGER = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# Voice loaded once in each worker process
+_WORKER_VOICE: Optional[PiperVoice] = None
+_WORKER_SYNTHESIZE_ARGS: Dict[str, Any] = {}
+
+
+@dataclass
+class BulkResult:
+    num_lines: int = 0
+    """Non-empty input lines"""
+
+    num_skipped: int = 0
+    """Lines already synthesized in a previous run"""
+
+    num_synthesized: int = 0
+
+    seconds: float = 0.0
+
+    wav_paths: Dict[int, Path] = field(default_factory=dict)
+    """Line index -> WAV file for lines synthesized in this run"""
+
+
+def get_wav_name(line_index: int) -> str:
+    """Deterministic WAV file name for a (zero-based) input line."""
+    return f"{line_index:08d}.wav"
+
+
+def get_text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_manifest(manifest_path: Union[str, Path]) -> Set[Tuple[int, str]]:
+    """Read (line index, text hash) of finished lines from a manifest.
+
+    A partial last line from a crash is cut off, so entries appended after
+    it start on a new line.
+    """
+    finished: Set[Tuple[int, str]] = set()
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return finished
+
+    # Bytes up to the end of the last complete line
+    complete_size = 0
+    with open(manifest_path, "rb") as manifest_file:
+        for line in manifest_file:
+            if not line.endswith(b"\n"):
+                break
+
+            complete_size += len(line)
+            try:
+                entry = json.loads(line)
+                finished.add((entry["index"], entry["text_hash"]))
+            except (ValueError, KeyError):
+                _LOGGER.warning(
+                    "Skipping bad manifest line: %s",
+                    line.decode("utf-8", errors="replace").strip(),
+                )
+
+    if complete_size < manifest_path.stat().st_size:
+        _LOGGER.debug("Removing partial last line from %s", manifest_path)
+        os.truncate(manifest_path, complete_size)
+
+    return finished
+
+
+def synthesize_bulk(
+    lines: Iterable[str],
+    output_dir: Union[str, Path],
+    model_path: Union[str, Path],
+    config_path: Optional[Union[str, Path]] = None,
+    num_workers: int = 1,
+    session_profile: Optional[SessionProfile] = None,
+    manifest_path: Optional[Union[str, Path]] = None,
+    lines_per_task: int = 8,
+    synthesize_args: Optional[Dict[str, Any]] = None,
+    **load_args: Any,
+) -> BulkResult:
+    """Synthesize each non-empty line to its own WAV file in output_dir.
+
+    Lines are sharded across num_workers processes, which each load the
+    model once. WAV files are named by line index (see get_wav_name), so
+    output doesn't depend on which worker finished first.
+
+    Finished lines are appended to a manifest (default: output_dir/
+    manifest.jsonl). Lines already in the manifest with the same text are
+    skipped, so an interrupted run can be resumed with the same input.
+
+    Other keyword arguments are passed to PiperVoice.load in each worker.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if manifest_path is None:
+        manifest_path = output_dir / MANIFEST_NAME
+
+    if session_profile is None:
+        session_profile = SessionProfile()
+
+    if session_profile.intra_op_num_threads <= 0:
+        # Divide cores between workers instead of each using all of them
+        session_profile = dataclasses.replace(
+            session_profile,
+            intra_op_num_threads=max(1, (os.cpu_count() or 1) // num_workers),
+        )
+
+    finished = read_manifest(manifest_path)
+    result = BulkResult()
+
+    def pending_lines() -> Iterator[Tuple[int, str]]:
+        for line_index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+
+            result.num_lines += 1
+            if (line_index, get_text_hash(line)) in finished:
+                result.num_skipped += 1
+                continue
+
+            yield (line_index, line)
+
+    # Workers are spawned rather than forked, since onnxruntime's thread
+    # pools are not safe to use across fork.
+    mp_context = multiprocessing.get_context("spawn")
+    start_time = time.monotonic()
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest_file, mp_context.Pool(
+        processes=num_workers,
+        initializer=_init_worker,
+        initargs=(
+            model_path,
+            config_path,
+            session_profile,
+            synthesize_args or {},
+            load_args,
+        ),
+    ) as pool:
+        for line_index, text_hash, wav_name in pool.imap_unordered(
+            _synthesize_line,
+            ((output_dir, line_index, line) for line_index, line in pending_lines()),
+            chunksize=lines_per_task,
+        ):
+            # WAV file is complete before it's recorded
+            print(
+                json.dumps(
+                    {"index": line_index, "text_hash": text_hash, "file": wav_name}
+                ),
+                file=manifest_file,
+                flush=True,
+            )
+
+            wav_path = output_dir / wav_name
+            result.wav_paths[line_index] = wav_path
+            result.num_synthesized += 1
+            _LOGGER.info("Wrote %s", wav_path)
+
+    result.seconds = time.monotonic() - start_time
+    _LOGGER.debug(
+        "Synthesized %s line(s) in %0.2f second(s) with %s worker(s), skipped %s",
+        result.num_synthesized,
+        result.seconds,
+        num_workers,
+        result.num_skipped,
+    )
+
+    return result
+
+
+def _init_worker(
+    model_path: Union[str, Path],
+    config_path: Optional[Union[str, Path]],
+    session_profile: SessionProfile,
+    synthesize_args: Dict[str, Any],
+    load_args: Dict[str, Any],
+) -> None:
+    global _WORKER_VOICE, _WORKER_SYNTHESIZE_ARGS
+
+    _WORKER_VOICE = PiperVoice.load(
+        model_path,
+        config_path=config_path,
+        session_profile=session_profile,
+        **load_args,
+    )
+    _WORKER_SYNTHESIZE_ARGS = synthesize_args
+
+
+def _synthesize_line(task: Tuple[Path, int, str]) -> Tuple[int, str, str]:
+    output_dir, line_index, line = task
+    assert _WORKER_VOICE is not None
+
+    wav_name = get_wav_name(line_index)
+    wav_path = output_dir / wav_name
+
+    # Written to a temporary file first so a crash never leaves a partial WAV
+    temp_path = wav_path.with_name(f".{wav_name}.{os.getpid()}.tmp")
+    with wave.open(str(temp_path), "wb") as wav_file:
+        _WORKER_VOICE.synthesize(line, wav_file, **_WORKER_SYNTHESIZE_ARGS)
+
+    os.replace(temp_path, wav_path)
+
+    return (line_index, get_text_hash(line), wav_name)
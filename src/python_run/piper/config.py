@@ -1,7 +1,19 @@
 """Piper configuration"""
-from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, Dict, Mapping, Sequence
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Union
+
+_LOGGER = logging.getLogger(__name__)
+
+# Changed when PiperConfig changes, so old cached configs aren't used
+_CONFIG_CACHE_VERSION = 4
 
 
 class PhonemeType(str, Enum):
@@ -35,6 +47,12 @@ class PiperConfig:
     phoneme_type: PhonemeType
     """espeak or text"""
 
+    speaker_id_map: Mapping[str, int] = field(default_factory=dict)
+    """Speaker name -> id"""
+
+    phoneme_silence: Mapping[str, float] = field(default_factory=dict)
+    """Phoneme -> seconds of silence after it (splits sentences into phrases)"""
+
     @staticmethod
     def from_dict(config: Dict[str, Any]) -> "PiperConfig":
         inference = config.get("inference", {})
@@ -50,4 +68,49 @@ class PiperConfig:
             espeak_voice=config["espeak"]["voice"],
             phoneme_id_map=config["phoneme_id_map"],
             phoneme_type=PhonemeType(config.get("phoneme_type", PhonemeType.ESPEAK)),
+            speaker_id_map=config.get("speaker_id_map", {}),
+            phoneme_silence={
+                phoneme: float(seconds)
+                for phoneme, seconds in inference.get("phoneme_silence", {}).items()
+            },
         )
+
+
+def load_config(
+    config_path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None
+) -> PiperConfig:
+    """Load config from a JSON file.
+
+    If cache_dir is set, the parsed config is cached there and reused until
+    the JSON file changes.
+    """
+    config_path = Path(config_path)
+    cached_path: Optional[Path] = None
+
+    if cache_dir:
+        config_stat = config_path.stat()
+        cache_key = hashlib.sha256(
+            f"{_CONFIG_CACHE_VERSION}|{config_path.absolute()}|{config_stat.st_size}|{config_stat.st_mtime_ns}".encode()
+        ).hexdigest()
+        cached_path = Path(cache_dir) / f"{cache_key}.config.pickle"
+
+        if cached_path.exists():
+            try:
+                with open(cached_path, "rb") as cached_file:
+                    return pickle.load(cached_file)
+            except Exception:
+                _LOGGER.exception("Failed to load cached config: %s", cached_path)
+
+    with open(config_path, "r", encoding="utf-8") as config_file:
+        config = PiperConfig.from_dict(json.load(config_file))
+
+    if cached_path is not None:
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=cached_path.parent, suffix=".tmp", delete=False
+        ) as temp_file:
+            pickle.dump(config, temp_file)
+
+        os.replace(temp_file.name, cached_path)
+
+    return config
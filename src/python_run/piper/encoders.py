@@ -0,0 +1,378 @@
+"""Encoding of synthesized audio as it's produced"""
+import io
+import logging
+import wave
+from abc import ABC, abstractmethod
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .resample import Resampler
+from .util import wav_header
+
+_LOGGER = logging.getLogger(__name__)
+
+# Sample rates supported by the Opus codec
+_OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Other sample rates are resampled to this for Opus
+_OPUS_SAMPLE_RATE = 48000
+
+# Default MP3 quality (libsndfile compression level)
+_MP3_COMPRESSION_LEVEL = 0.5
+
+
+class OutputFormat(str, Enum):
+    WAV = "wav"
+    FLAC = "flac"
+    OGG = "ogg"
+    """Opus in Ogg"""
+
+    MP3 = "mp3"
+
+
+CONTENT_TYPES: Dict[OutputFormat, str] = {
+    OutputFormat.WAV: "audio/wav",
+    OutputFormat.FLAC: "audio/flac",
+    OutputFormat.OGG: "audio/ogg",
+    OutputFormat.MP3: "audio/mpeg",
+}
+
+# Other names clients use in Accept headers
+_CONTENT_TYPE_ALIASES: Dict[str, OutputFormat] = {
+    "audio/wav": OutputFormat.WAV,
+    "audio/wave": OutputFormat.WAV,
+    "audio/x-wav": OutputFormat.WAV,
+    "audio/flac": OutputFormat.FLAC,
+    "audio/x-flac": OutputFormat.FLAC,
+    "audio/ogg": OutputFormat.OGG,
+    "audio/opus": OutputFormat.OGG,
+    "audio/mpeg": OutputFormat.MP3,
+    "audio/mp3": OutputFormat.MP3,
+}
+
+# libsndfile (format, subtype)
+_SOUNDFILE_FORMATS: Dict[OutputFormat, Tuple[str, str]] = {
+    OutputFormat.FLAC: ("FLAC", "PCM_16"),
+    OutputFormat.OGG: ("OGG", "OPUS"),
+    OutputFormat.MP3: ("MP3", "MPEG_LAYER_III"),
+}
+
+# Decoders can't read these without the header that's written at the end,
+# so streams aren't sent until encoding finishes
+_BUFFERED_FORMATS = (OutputFormat.FLAC,)
+
+
+class AudioEncoder(ABC):
+    """Encodes chunks of 16-bit mono audio as they're synthesized."""
+
+    def __init__(self, output_format: OutputFormat, sample_rate: int) -> None:
+        self.output_format = output_format
+        self.sample_rate = sample_rate
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.output_format]
+
+    @abstractmethod
+    def encode(self, audio: Any) -> bytes:
+        """Encode a chunk of raw audio (bytes-like), returning what's ready."""
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        """Return the rest of the encoded audio."""
+
+
+class WavEncoder(AudioEncoder):
+    """WAV with a streaming header (length unknown).
+
+    If output_path is set, a regular WAV file is written there instead.
+    """
+
+    def __init__(
+        self, sample_rate: int, output_path: Optional[Union[str, Path]] = None
+    ) -> None:
+        super().__init__(OutputFormat.WAV, sample_rate)
+        self._header_sent = False
+        self._wav_file: Optional[wave.Wave_write] = None
+
+        if output_path is not None:
+            self._wav_file = wave.open(str(output_path), "wb")
+            self._wav_file.setframerate(sample_rate)
+            self._wav_file.setsampwidth(2)  # 16-bit
+            self._wav_file.setnchannels(1)  # mono
+
+    def encode(self, audio: Any) -> bytes:
+        if self._wav_file is not None:
+            self._wav_file.writeframes(audio)
+            return b""
+
+        audio_bytes = bytes(audio)
+        if self._header_sent:
+            return audio_bytes
+
+        self._header_sent = True
+        return wav_header(self.sample_rate) + audio_bytes
+
+    def finish(self) -> bytes:
+        if self._wav_file is not None:
+            self._wav_file.close()
+            return b""
+
+        if self._header_sent:
+            return b""
+
+        self._header_sent = True
+        return wav_header(self.sample_rate, num_frames=0)
+
+
+class SoundFileEncoder(AudioEncoder):
+    """FLAC, Ogg, or MP3 using libsndfile (through the soundfile package).
+
+    If output_path is set, libsndfile writes the file directly and fills in
+    its headers when encoding finishes.
+
+    Otherwise, encoded data is returned as soon as libsndfile writes it, and
+    headers that are rewritten at the end can't be changed:
+
+    * Ogg (Opus) streams don't need them
+    * FLAC with an unknown length can't be decoded, so FLAC is held in
+      memory and returned all at once by finish
+    * MP3 is encoded at a constant bitrate, since the length of variable
+      bitrate MP3 is only known from a header; the empty header frame
+      decodes as a few milliseconds of silence
+
+    Audio is resampled to 48 kHz for Opus if it's not at a rate Opus supports.
+    """
+
+    def __init__(
+        self,
+        output_format: OutputFormat,
+        sample_rate: int,
+        output_path: Optional[Union[str, Path]] = None,
+    ) -> None:
+        super().__init__(output_format, sample_rate)
+
+        try:
+            import soundfile  # pylint: disable=import-outside-toplevel
+        except ImportError as err:
+            raise ValueError(
+                f"{output_format.value} output requires soundfile (pip install piper-tts[encoders])"
+            ) from err
+
+        if output_format not in _SOUNDFILE_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        sf_format, sf_subtype = _SOUNDFILE_FORMATS[output_format]
+        self._resampler: Optional[Resampler] = None
+        encoder_sample_rate = sample_rate
+        if (output_format == OutputFormat.OGG) and (
+            sample_rate not in _OPUS_SAMPLE_RATES
+        ):
+            _LOGGER.debug(
+                "Opus doesn't support %s Hz, resampling to %s Hz",
+                sample_rate,
+                _OPUS_SAMPLE_RATE,
+            )
+            encoder_sample_rate = _OPUS_SAMPLE_RATE
+            self._resampler = Resampler(sample_rate, encoder_sample_rate)
+
+        self._sink: Optional[_StreamSink] = None
+        self._buffer: Optional[io.BytesIO] = None
+        sf_file: Any = str(output_path)
+        sf_args: Dict[str, Any] = {}
+        if output_path is None:
+            if output_format in _BUFFERED_FORMATS:
+                self._buffer = io.BytesIO()
+                sf_file = self._buffer
+            else:
+                self._sink = _StreamSink()
+                sf_file = self._sink
+
+            if output_format == OutputFormat.MP3:
+                sf_args["compression_level"] = _MP3_COMPRESSION_LEVEL
+                sf_args["bitrate_mode"] = "CONSTANT"
+
+        self._file = soundfile.SoundFile(
+            sf_file,
+            "w",
+            samplerate=encoder_sample_rate,
+            channels=1,
+            format=sf_format,
+            subtype=sf_subtype,
+            **sf_args,
+        )
+
+    def encode(self, audio: Any) -> bytes:
+        samples = np.frombuffer(audio, dtype=np.int16)
+        if self._resampler is not None:
+            samples = self._resampler.process(samples)
+
+        if samples.size > 0:
+            self._file.write(samples)
+            self._file.flush()
+
+        if self._sink is None:
+            return b""
+
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        if self._resampler is not None:
+            self._file.write(self._resampler.flush())
+
+        self._file.close()
+        if self._buffer is not None:
+            return self._buffer.getvalue()
+
+        if self._sink is None:
+            return b""
+
+        return self._sink.take()
+
+
+class _StreamSink:
+    """File-like object for libsndfile that hands out bytes as they're written.
+
+    Writes to bytes that were already taken are ignored.
+    """
+
+    def __init__(self) -> None:
+        self._pending = bytearray()
+        self._taken = 0
+        """Number of bytes already taken"""
+
+        self._position = 0
+        self._size = 0
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        num_bytes = len(data)
+        start = self._position
+        self._position += num_bytes
+        self._size = max(self._size, self._position)
+
+        if start < self._taken:
+            skip = min(num_bytes, self._taken - start)
+            data = data[skip:]
+            start += skip
+
+        if data:
+            offset = start - self._taken
+            end = offset + len(data)
+            if end > len(self._pending):
+                self._pending.extend(bytes(end - len(self._pending)))
+
+            self._pending[offset:end] = data
+
+        return num_bytes
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 0:
+            self._position = offset
+        elif whence == 1:
+            self._position += offset
+        else:
+            self._position = self._size + offset
+
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        # Nothing is kept to read back
+        return b""
+
+    def take(self) -> bytes:
+        """Return bytes written since the last call."""
+        data = bytes(self._pending)
+        self._taken += len(data)
+        self._pending = bytearray()
+
+        return data
+
+
+def make_encoder(
+    output_format: OutputFormat,
+    sample_rate: int,
+    output_path: Optional[Union[str, Path]] = None,
+) -> AudioEncoder:
+    """Create an encoder for 16-bit mono audio.
+
+    If output_path is set, the encoder writes to that file (with complete
+    headers) and returns no data.
+    """
+    output_format = OutputFormat(output_format)
+    if output_format == OutputFormat.WAV:
+        return WavEncoder(sample_rate, output_path=output_path)
+
+    return SoundFileEncoder(output_format, sample_rate, output_path=output_path)
+
+
+def get_available_formats() -> List[OutputFormat]:
+    """Output formats that can be encoded with installed packages."""
+    try:
+        import soundfile  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return [OutputFormat.WAV]
+
+    sf_formats = soundfile.available_formats()
+    return [OutputFormat.WAV] + [
+        output_format
+        for output_format, (sf_format, _sf_subtype) in _SOUNDFILE_FORMATS.items()
+        if sf_format in sf_formats
+    ]
+
+
+def get_output_format(
+    accept: Optional[str], available_formats: Optional[List[OutputFormat]] = None
+) -> Optional[OutputFormat]:
+    """Choose an output format from an HTTP Accept header.
+
+    Returns WAV if accept is empty or allows anything, and None if none of
+    the accepted formats are available.
+    """
+    if available_formats is None:
+        available_formats = get_available_formats()
+
+    if not accept:
+        return OutputFormat.WAV
+
+    best_format: Optional[OutputFormat] = None
+    best_rank: Tuple[float, bool] = (0.0, False)
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        media_type = media_type.lower()
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        is_wildcard = media_type in ("*/*", "audio/*")
+        if is_wildcard:
+            output_format: Optional[OutputFormat] = OutputFormat.WAV
+        else:
+            output_format = _CONTENT_TYPE_ALIASES.get(media_type)
+
+        # Specific types win over wildcards with the same quality
+        rank = (quality, not is_wildcard)
+        if (
+            (output_format is None)
+            or (output_format not in available_formats)
+            or (quality <= 0)
+            or (rank <= best_rank)
+        ):
+            continue
+
+        best_format = output_format
+        best_rank = rank
+
+    return best_format
@@ -0,0 +1,335 @@
+"""Gain and limiting of synthesized audio as it's produced"""
+import argparse
+import math
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+import numpy as np
+
+_MAX_WAV_VALUE = 32767.0
+
+# Lowest peak used to scale audio (avoids amplifying silence)
+_MIN_PEAK = 0.01
+
+# Chunks quieter than this don't update the running RMS
+_RMS_GATE = 10 ** (-60 / 20)
+
+
+class GainMode(str, Enum):
+    SENTENCE = "sentence"
+    """Scale each sentence to its own peak (loudness may jump between sentences)"""
+
+    FIXED = "fixed"
+    """Constant gain_db"""
+
+    PEAK = "peak"
+    """Scale by the highest peak so far, so gain only ever goes down"""
+
+    RMS = "rms"
+    """Follow a running RMS towards target_rms_db"""
+
+
+@dataclass
+class GainSettings:
+    mode: GainMode = GainMode.SENTENCE
+
+    gain_db: float = 0.0
+    """Gain for fixed mode (0 = model output as-is)"""
+
+    target_rms_db: float = -20.0
+    """Loudness for rms mode in dB relative to full scale"""
+
+    rms_window_seconds: float = 3.0
+    """Time constant of the running RMS"""
+
+    max_gain_db: float = 40.0
+    """Upper limit on gain in peak/rms mode"""
+
+    limiter: bool = True
+    """Keep fixed/rms gain from clipping by turning down peaks"""
+
+    lookahead_seconds: float = 0.005
+    """How far ahead the limiter starts turning down a peak"""
+
+    release_seconds: float = 0.05
+    """How long the limiter takes to recover after a peak"""
+
+    ceiling: float = 0.99
+    """Highest output level as a fraction of full scale"""
+
+    @property
+    def is_stateful(self) -> bool:
+        """True if gain depends on audio from previous sentences."""
+        return self.mode in (GainMode.PEAK, GainMode.RMS)
+
+    @staticmethod
+    def from_args(args: argparse.Namespace) -> "GainSettings":
+        """Create from arguments added by add_gain_args."""
+        return GainSettings(
+            mode=GainMode(args.gain_mode),
+            gain_db=args.gain_db,
+            target_rms_db=args.target_rms_db,
+            limiter=not args.disable_limiter,
+            lookahead_seconds=args.limiter_lookahead_ms / 1000,
+            release_seconds=args.limiter_release_ms / 1000,
+        )
+
+
+def add_gain_args(parser: argparse.ArgumentParser) -> None:
+    """Add command-line arguments for GainSettings."""
+    parser.add_argument(
+        "--gain-mode",
+        "--gain_mode",
+        choices=[mode.value for mode in GainMode],
+        default=GainMode.SENTENCE.value,
+        help="How audio is scaled: per sentence, fixed, running peak, or running RMS (default: sentence)",
+    )
+    parser.add_argument(
+        "--gain-db",
+        "--gain_db",
+        type=float,
+        default=0.0,
+        help="Gain in dB for --gain-mode fixed (default: 0)",
+    )
+    parser.add_argument(
+        "--target-rms-db",
+        "--target_rms_db",
+        type=float,
+        default=-20.0,
+        help="Loudness in dB relative to full scale for --gain-mode rms (default: -20)",
+    )
+    parser.add_argument(
+        "--disable-limiter",
+        "--disable_limiter",
+        action="store_true",
+        help="Clip instead of limiting peaks in fixed/rms gain modes",
+    )
+    parser.add_argument(
+        "--limiter-lookahead-ms",
+        "--limiter_lookahead_ms",
+        type=float,
+        default=5,
+        help="Milliseconds the limiter looks ahead (default: 5)",
+    )
+    parser.add_argument(
+        "--limiter-release-ms",
+        "--limiter_release_ms",
+        type=float,
+        default=50,
+        help="Milliseconds for the limiter to recover after a peak (default: 50)",
+    )
+
+
+class GainStage:
+    """Converts float audio chunks to int16, carrying gain state between them.
+
+    With the limiter on (fixed/rms modes), output is delayed by the lookahead.
+    Call flush() at the end of a sentence to get the remaining samples.
+    """
+
+    def __init__(self, settings: GainSettings, sample_rate: int) -> None:
+        self.settings = settings
+        self.mode = GainMode(settings.mode)
+        self.sample_rate = sample_rate
+
+        self._max_gain = 10 ** (settings.max_gain_db / 20)
+        self._peak = 0.0
+        self._mean_square: Optional[float] = None
+        self._gain: Optional[float] = None
+        """Gain applied to the end of the previous chunk"""
+
+        self._use_limiter = settings.limiter and (
+            self.mode in (GainMode.FIXED, GainMode.RMS)
+        )
+        self._lookahead = max(1, int(settings.lookahead_seconds * sample_rate))
+        self._attack_step = 1.0 / self._lookahead
+        self._release_step = 1.0 / max(1, int(settings.release_seconds * sample_rate))
+        self._limiter_gain = 1.0
+
+        # Scaled audio held back for the limiter's lookahead
+        self._pending = np.zeros((0,), dtype=np.float32)
+
+        # Reused between chunks
+        self._scratch = np.zeros((0,), dtype=np.float32)
+        self._limit_scratch = np.zeros((0,), dtype=np.float32)
+
+    def process(
+        self, audio: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Apply gain to a chunk of float audio, returning int16 samples.
+
+        If out is given, samples are written to the start of it and a view is
+        returned. It must hold at least as many samples as audio.
+        """
+        audio = audio.reshape(-1)
+        if audio.size == 0:
+            return _empty_int16(out)
+
+        scaled = self._scale(audio)
+        if not self._use_limiter:
+            return self._to_int16(scaled, out)
+
+        return self._to_int16(self._limit(scaled, final=False), out)
+
+    def flush(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return samples held back by the limiter (see process for out)."""
+        if self._pending.size == 0:
+            return _empty_int16(out)
+
+        return self._to_int16(self._limit(np.zeros((0,), np.float32), final=True), out)
+
+    def process_sentence(
+        self, audio: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Apply gain to a whole sentence of float audio, returning int16 samples.
+
+        If out is given, it must hold at least as many samples as audio.
+        """
+        if out is None:
+            out = np.empty((audio.size,), dtype=np.int16)
+
+        num_samples = self.process(audio, out=out).size
+        num_samples += self.flush(out=out[num_samples:]).size
+        self.end_sentence()
+
+        return out[:num_samples]
+
+    def end_sentence(self) -> None:
+        """Forget the sentence peak in sentence mode."""
+        if self.mode == GainMode.SENTENCE:
+            self._peak = 0.0
+
+    # -------------------------------------------------------------------------
+
+    def _scale(self, audio: np.ndarray) -> np.ndarray:
+        if self.mode == GainMode.FIXED:
+            gain = 10 ** (self.settings.gain_db / 20)
+            return self._multiply(audio, gain)
+
+        if self.mode in (GainMode.SENTENCE, GainMode.PEAK):
+            # Two passes without allocating |audio|
+            chunk_peak = max(float(audio.max()), -float(audio.min()))
+            self._peak = max(self._peak, chunk_peak, _MIN_PEAK)
+            if self.mode == GainMode.SENTENCE:
+                # Same as audio_float_to_int16
+                return self._multiply(audio, 1.0 / self._peak)
+
+            gain = min(self._max_gain, self.settings.ceiling / self._peak)
+            return self._multiply(audio, gain)
+
+        # RMS
+        chunk_mean_square = float(np.dot(audio, audio)) / audio.size
+        if chunk_mean_square > (_RMS_GATE**2):
+            if self._mean_square is None:
+                self._mean_square = chunk_mean_square
+            else:
+                alpha = math.exp(
+                    -(audio.size / self.sample_rate) / self.settings.rms_window_seconds
+                )
+                self._mean_square = (alpha * self._mean_square) + (
+                    (1 - alpha) * chunk_mean_square
+                )
+
+        if self._mean_square is None:
+            gain = 1.0
+        else:
+            target_rms = 10 ** (self.settings.target_rms_db / 20)
+            gain = min(self._max_gain, target_rms / math.sqrt(self._mean_square))
+
+        if (self._gain is None) or (self._gain == gain):
+            self._gain = gain
+            return self._multiply(audio, gain)
+
+        # Ramp from the previous gain to avoid a step
+        ramp = np.linspace(
+            self._gain * _MAX_WAV_VALUE,
+            gain * _MAX_WAV_VALUE,
+            num=audio.size,
+            dtype=np.float32,
+        )
+        self._gain = gain
+        scaled = self._get_scratch(audio.size)
+        np.multiply(audio, ramp, out=scaled)
+        return scaled
+
+    def _multiply(self, audio: np.ndarray, gain: float) -> np.ndarray:
+        scaled = self._get_scratch(audio.size)
+        np.multiply(audio, gain * _MAX_WAV_VALUE, out=scaled)
+        return scaled
+
+    def _limit(self, scaled: np.ndarray, final: bool) -> np.ndarray:
+        """Turn down peaks above the ceiling, delaying output by the lookahead."""
+        # Pending samples followed by new ones, without allocating
+        buffer_size = self._pending.size + scaled.size
+        if self._limit_scratch.size < buffer_size:
+            self._limit_scratch = np.empty((buffer_size,), dtype=np.float32)
+
+        buffer = self._limit_scratch[:buffer_size]
+        buffer[: self._pending.size] = self._pending
+        buffer[self._pending.size :] = scaled
+        num_output = buffer.size if final else max(0, buffer.size - self._lookahead)
+
+        ceiling = self.settings.ceiling * _MAX_WAV_VALUE
+        buffer_peak = max(float(buffer.max()), -float(buffer.min()))
+        if (buffer_peak <= ceiling) and (self._limiter_gain >= 1.0):
+            # Nothing to do (the usual case)
+            output = buffer[:num_output]
+        else:
+            # Gain needed at each sample to stay under the ceiling
+            required = np.abs(buffer)
+            np.maximum(required, 1e-9, out=required)
+            np.divide(ceiling, required, out=required)
+            np.minimum(required, 1.0, out=required)
+
+            # Attack: ramp down ahead of each peak, at most lookahead samples
+            index = np.arange(buffer.size, dtype=np.float32)
+            attack = required + (index * self._attack_step)
+            attack = np.minimum.accumulate(attack[::-1])[::-1]
+            attack -= index * self._attack_step
+
+            # Release: recover gradually after each peak
+            gains = attack - (index * self._release_step)
+            gains = np.minimum.accumulate(gains)
+            gains += index * self._release_step
+            np.minimum(
+                gains,
+                self._limiter_gain + ((index + 1) * self._release_step),
+                out=gains,
+            )
+            np.minimum(gains, 1.0, out=gains)
+
+            output = buffer[:num_output] * gains[:num_output]
+            if num_output > 0:
+                self._limiter_gain = float(gains[num_output - 1])
+
+        self._pending = buffer[num_output:].copy()
+        if final:
+            self._limiter_gain = 1.0
+
+        return output
+
+    def _to_int16(
+        self, audio: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        # Audio is already scaled to int16 range
+        np.clip(audio, -_MAX_WAV_VALUE, _MAX_WAV_VALUE, out=audio)
+        if out is None:
+            return audio.astype(np.int16)
+
+        out = out[: audio.size]
+        np.copyto(out, audio, casting="unsafe")
+        return out
+
+    def _get_scratch(self, size: int) -> np.ndarray:
+        if self._scratch.size < size:
+            self._scratch = np.empty((size,), dtype=np.float32)
+
+        return self._scratch[:size]
+
+
+def _empty_int16(out: Optional[np.ndarray]) -> np.ndarray:
+    if out is not None:
+        return out[:0]
+
+    return np.zeros((0,), dtype=np.int16)
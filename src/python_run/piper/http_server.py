@@ -3,13 +3,34 @@ import argparse
 import io
 import logging
 import wave
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
-from flask import Flask, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 
-from . import PiperVoice
+from .audio_cache import AudioCache
 from .download import ensure_voice_exists, find_voice, get_voices
+from .encoders import (
+    CONTENT_TYPES,
+    AudioEncoder,
+    OutputFormat,
+    get_available_formats,
+    get_output_format,
+    make_encoder,
+)
+from .gain import GainSettings, add_gain_args
+from .phoneme_cache import PhonemeCache
+from .phrases import add_phrase_args, get_phrase_load_args
+from .pool import PiperVoicePool
+from .registry import UnknownVoiceError, VoiceRegistry
+from .resample import add_resample_args, get_resample_load_args
+from .scheduler import BatchScheduler
+from .session import SessionProfile, add_session_args
+from .ssml import SSML_CONTENT_TYPE
+from .streaming import add_streaming_args, get_streaming_load_args
+from .util import wav_header
+from .voice import PiperVoice
 
 _LOGGER = logging.getLogger()
 
@@ -34,6 +55,11 @@ def main() -> None:
     )
     #
     parser.add_argument("--cuda", action="store_true", help="Use GPU")
+    add_session_args(parser)
+    add_streaming_args(parser)
+    add_gain_args(parser)
+    add_resample_args(parser)
+    add_phrase_args(parser)
     #
     parser.add_argument(
         "--sentence-silence",
@@ -42,6 +68,90 @@ def main() -> None:
         default=0.0,
         help="Seconds of silence after each sentence",
     )
+    parser.add_argument(
+        "--max-voice-memory-mb",
+        "--max_voice_memory_mb",
+        type=float,
+        help="Unload least recently used voices above this size in megabytes",
+    )
+    parser.add_argument(
+        "--num-sessions",
+        "--num_sessions",
+        type=int,
+        default=1,
+        help="Onnx sessions for the default voice, synthesizing in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--threads-per-session",
+        "--threads_per_session",
+        type=int,
+        help="Intra-op threads for each session (default: cores / sessions)",
+    )
+    #
+    parser.add_argument(
+        "--max-batch-size",
+        "--max_batch_size",
+        type=int,
+        default=1,
+        help="Batch sentences from concurrent requests up to this size (default: 1)",
+    )
+    parser.add_argument(
+        "--max-batch-wait",
+        "--max_batch_wait",
+        type=float,
+        default=0.02,
+        help="Seconds to wait for a batch to fill before synthesizing (default: 0.02)",
+    )
+    #
+    parser.add_argument(
+        "--phoneme-cache",
+        "--phoneme_cache",
+        action="store_true",
+        help="Cache phonemes for repeated text",
+    )
+    parser.add_argument(
+        "--phoneme-cache-file",
+        "--phoneme_cache_file",
+        help="Load/save phoneme cache from JSON file (implies --phoneme-cache)",
+    )
+    parser.add_argument(
+        "--phoneme-cache-max-mb",
+        "--phoneme_cache_max_mb",
+        type=float,
+        default=16,
+        help="Maximum size of phoneme cache in megabytes (default: 16)",
+    )
+    parser.add_argument(
+        "--audio-cache",
+        "--audio_cache",
+        action="store_true",
+        help="Cache synthesized audio in memory (only with --noise-scale 0 --noise-w 0, see --audio-cache-allow-noise)",
+    )
+    parser.add_argument(
+        "--audio-cache-allow-noise",
+        "--audio_cache_allow_noise",
+        action="store_true",
+        help="Also cache audio synthesized with noise, so repeated text always sounds like its first synthesis",
+    )
+    parser.add_argument(
+        "--audio-cache-dir",
+        "--audio_cache_dir",
+        help="Also cache synthesized audio in a directory (implies --audio-cache)",
+    )
+    parser.add_argument(
+        "--audio-cache-max-mb",
+        "--audio_cache_max_mb",
+        type=float,
+        default=64,
+        help="Maximum size of in-memory audio cache in megabytes (default: 64)",
+    )
+    parser.add_argument(
+        "--audio-cache-dir-max-mb",
+        "--audio_cache_dir_max_mb",
+        type=float,
+        default=1024,
+        help="Maximum size of audio cache directory in megabytes (default: 1024)",
+    )
     #
     parser.add_argument(
         "--data-dir",
@@ -73,24 +183,81 @@ def main() -> None:
         # Download to first data directory by default
         args.download_dir = args.data_dir[0]
 
+    # Load voice info
+    voices_info = get_voices(args.download_dir, update_voices=args.update_voices)
+
+    # Resolve aliases for backwards compatibility with old voice names
+    aliases_info: Dict[str, Any] = {}
+    for voice_info in voices_info.values():
+        for voice_alias in voice_info.get("aliases", []):
+            aliases_info[voice_alias] = {"_is_alias": True, **voice_info}
+
+    voices_info.update(aliases_info)
+
     # Download voice if file doesn't exist
     model_path = Path(args.model)
     if not model_path.exists():
-        # Load voice info
-        voices_info = get_voices(args.download_dir, update_voices=args.update_voices)
-
-        # Resolve aliases for backwards compatibility with old voice names
-        aliases_info: Dict[str, Any] = {}
-        for voice_info in voices_info.values():
-            for voice_alias in voice_info.get("aliases", []):
-                aliases_info[voice_alias] = {"_is_alias": True, **voice_info}
-
-        voices_info.update(aliases_info)
         ensure_voice_exists(args.model, args.data_dir, args.download_dir, voices_info)
         args.model, args.config = find_voice(args.model, args.data_dir)
 
-    # Load voice
-    voice = PiperVoice.load(args.model, config_path=args.config, use_cuda=args.cuda)
+    phoneme_cache: Optional[PhonemeCache] = None
+    if args.phoneme_cache or args.phoneme_cache_file:
+        phoneme_cache = PhonemeCache(
+            max_bytes=int(args.phoneme_cache_max_mb * 1024 * 1024)
+        )
+        if args.phoneme_cache_file and Path(args.phoneme_cache_file).exists():
+            phoneme_cache.load(args.phoneme_cache_file)
+
+    audio_cache: Optional[AudioCache] = None
+    if args.audio_cache or args.audio_cache_dir:
+        audio_cache = AudioCache(
+            max_memory_bytes=int(args.audio_cache_max_mb * 1024 * 1024),
+            cache_dir=args.audio_cache_dir,
+            max_disk_bytes=int(args.audio_cache_dir_max_mb * 1024 * 1024),
+            allow_noise=args.audio_cache_allow_noise,
+        )
+
+    load_args: Dict[str, Any] = {
+        "use_cuda": args.cuda,
+        "phoneme_cache": phoneme_cache,
+        "audio_cache": audio_cache,
+        "session_profile": SessionProfile.from_args(args),
+        "model_cache_dir": args.model_cache_dir,
+        "gain": GainSettings.from_args(args),
+        **get_streaming_load_args(args),
+        **get_resample_load_args(args),
+        **get_phrase_load_args(args),
+    }
+
+    # Voices are loaded on first use
+    registry = VoiceRegistry(
+        args.data_dir,
+        download_dir=args.download_dir,
+        voices_info=voices_info,
+        max_memory_bytes=(
+            int(args.max_voice_memory_mb * 1024 * 1024)
+            if args.max_voice_memory_mb
+            else None
+        ),
+        **load_args,
+    )
+
+    # Load default voice
+    default_voice_name = str(args.model)
+    registry.add_model(default_voice_name, args.model, args.config, pinned=True)
+    pool: Optional[PiperVoicePool] = None
+    if args.num_sessions > 1:
+        pool = PiperVoicePool.load(
+            args.model,
+            config_path=args.config,
+            num_workers=args.num_sessions,
+            threads_per_worker=args.threads_per_session,
+            **load_args,
+        )
+        default_voice = pool.voices[0]
+    else:
+        default_voice = registry.get(default_voice_name)
+
     synthesize_args = {
         "speaker_id": args.speaker,
         "length_scale": args.length_scale,
@@ -99,11 +266,28 @@ def main() -> None:
         "sentence_silence": args.sentence_silence,
     }
 
+    scheduler: Optional[BatchScheduler] = None
+    if (args.max_batch_size > 1) and load_args["gain"].is_stateful:
+        # Each batch would start with fresh gain state
+        _LOGGER.debug("Not batching with gain mode: %s", load_args["gain"].mode)
+    elif args.max_batch_size > 1:
+        # Batching only applies to the default voice.
+        # Batches are spread across sessions with --num-sessions.
+        scheduler = BatchScheduler(
+            pool if pool is not None else default_voice,
+            max_batch_size=args.max_batch_size,
+            max_wait_seconds=args.max_batch_wait,
+        )
+        scheduler.start()
+
+    available_formats = get_available_formats()
+    _LOGGER.debug("Available output formats: %s", available_formats)
+
     # Create web server
     app = Flask(__name__)
 
     @app.route("/", methods=["GET", "POST"])
-    def app_synthesize() -> bytes:
+    def app_synthesize() -> Union[bytes, Response]:
         if request.method == "POST":
             text = request.data.decode("utf-8")
         else:
@@ -113,14 +297,163 @@ def main() -> None:
         if not text:
             raise ValueError("No text provided")
 
-        _LOGGER.debug("Synthesizing text: %s", text)
+        voice_name = request.args.get("voice") or default_voice_name
+        is_ssml = request.mimetype == SSML_CONTENT_TYPE
+
+        output_format = get_output_format(
+            request.headers.get("Accept"), available_formats
+        )
+        if output_format is None:
+            return Response(
+                "Accepted formats: "
+                + ", ".join(CONTENT_TYPES[f] for f in available_formats),
+                status=406,
+                mimetype="text/plain",
+            )
+
+        _LOGGER.debug("Synthesizing text with %s: %s", voice_name, text)
+        if (pool is not None) and (voice_name == default_voice_name):
+            voice = default_voice
+        else:
+            try:
+                voice = registry.get(voice_name)
+            except UnknownVoiceError as err:
+                return Response(str(err), status=404, mimetype="text/plain")
+
+        if output_format != OutputFormat.WAV:
+            # Encode audio as it's synthesized
+            encoder = make_encoder(output_format, voice.sample_rate)
+            return Response(
+                stream_with_context(
+                    stream_encoded(
+                        encoder, synthesize_raw(voice_name, voice, text, is_ssml)
+                    )
+                ),
+                mimetype=encoder.content_type,
+            )
+
+        if voice.is_streaming:
+            # Send audio as soon as each chunk is decoded
+            return Response(
+                stream_with_context(
+                    stream_wav(voice, synthesize_raw(voice_name, voice, text, is_ssml))
+                ),
+                mimetype="audio/wav",
+            )
+
         with io.BytesIO() as wav_io:
             with wave.open(wav_io, "wb") as wav_file:
-                voice.synthesize(text, wav_file, **synthesize_args)
+                wav_file.setframerate(voice.sample_rate)
+                wav_file.setsampwidth(2)  # 16-bit
+                wav_file.setnchannels(1)  # mono
+
+                for audio_bytes in synthesize_raw(voice_name, voice, text, is_ssml):
+                    wav_file.writeframes(audio_bytes)
+
+            return Response(wav_io.getvalue(), mimetype="audio/wav")
+
+    def synthesize_raw(
+        voice_name: str, voice: PiperVoice, text: str, is_ssml: bool = False
+    ) -> Iterable[bytes]:
+        if is_ssml:
+            # Sentences are batched by speaker and rate within the document
+            return voice.synthesize_ssml_stream_raw(
+                text, max_batch_size=args.max_batch_size, **synthesize_args
+            )
+
+        if voice.is_streaming:
+            return voice.synthesize_stream_raw(text, **synthesize_args)
+
+        if (scheduler is not None) and (voice_name == default_voice_name):
+            return synthesize_batched(scheduler, text)
+
+        if (pool is not None) and (voice_name == default_voice_name):
+            return pool.synthesize_stream_raw(text, **synthesize_args)
+
+        return voice.synthesize_stream_raw(text, **synthesize_args)
+
+    def stream_wav(voice: PiperVoice, audio_stream: Iterable[bytes]) -> Iterable[bytes]:
+        # Length is unknown until synthesis is done
+        yield wav_header(voice.sample_rate)
+        yield from audio_stream
+
+    def stream_encoded(
+        encoder: AudioEncoder, audio_stream: Iterable[bytes]
+    ) -> Iterable[bytes]:
+        for audio_bytes in audio_stream:
+            encoded_bytes = encoder.encode(audio_bytes)
+            if encoded_bytes:
+                yield encoded_bytes
+
+        yield encoder.finish()
+
+    def synthesize_batched(scheduler: BatchScheduler, text: str) -> Iterable[bytes]:
+        voice = scheduler.voice
+
+        # Queue all sentences (and phrases) first so they can share batches
+        futures: List[Tuple["Future[bytes]", float]] = []
+        for phonemes, phoneme_ids in voice.phonemize_ids(text):
+            phrases = voice.split_phrase_ids(phonemes, phoneme_ids)
+            for phrase_idx, (phrase_ids, silence_seconds) in enumerate(phrases):
+                if phrase_idx == (len(phrases) - 1):
+                    silence_seconds += args.sentence_silence
+
+                future = scheduler.submit(
+                    phrase_ids,
+                    speaker_id=args.speaker,
+                    length_scale=args.length_scale,
+                    noise_scale=args.noise_scale,
+                    noise_w=args.noise_w,
+                )
+                futures.append((future, silence_seconds))
+
+        for future, silence_seconds in futures:
+            yield future.result()
+
+            # 16-bit mono
+            num_silence_samples = int(silence_seconds * voice.sample_rate)
+            if num_silence_samples > 0:
+                yield bytes(num_silence_samples * 2)
+
+    @app.route("/metrics", methods=["GET"])
+    def app_metrics():
+        metrics: Dict[str, Any] = {}
+        if scheduler is not None:
+            metrics["scheduler"] = scheduler.metrics.to_dict()
+
+        if phoneme_cache is not None:
+            metrics["phoneme_cache"] = {
+                "entries": len(phoneme_cache),
+                "bytes": phoneme_cache.num_bytes,
+                "hits": phoneme_cache.hits,
+                "misses": phoneme_cache.misses,
+                "hit_ratio": phoneme_cache.hit_ratio,
+            }
+
+        if audio_cache is not None:
+            metrics["audio_cache"] = {
+                "memory_hits": audio_cache.memory_hits,
+                "disk_hits": audio_cache.disk_hits,
+                "misses": audio_cache.misses,
+                "hit_ratio": audio_cache.hit_ratio,
+                "bytes_saved": audio_cache.bytes_saved,
+            }
+
+        metrics["loaded_voices"] = registry.loaded_voices
+
+        return jsonify(metrics)
+
+    try:
+        app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
 
-            return wav_io.getvalue()
+        if pool is not None:
+            pool.close()
 
-    app.run(host=args.host, port=args.port)
+        if (phoneme_cache is not None) and args.phoneme_cache_file:
+            phoneme_cache.save(args.phoneme_cache_file)
 
 
 if __name__ == "__main__":
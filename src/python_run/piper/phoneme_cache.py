@@ -0,0 +1,132 @@
+"""Cache of phonemes for repeated text"""
+import json
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+_LOGGER = logging.getLogger(__name__)
+
+# (phonemes, phoneme ids) for each sentence
+SentencePhonemeIds = List[Tuple[List[str], List[int]]]
+
+# Phonemes for each sentence.
+# Ids aren't cached, since they depend on each voice's phoneme_id_map.
+SentencePhonemes = List[List[str]]
+
+# espeak_voice, phoneme_type, normalized text
+PhonemeCacheKey = Tuple[str, str, str]
+
+# sentences, estimated size in bytes
+_CacheEntry = Tuple[SentencePhonemes, int]
+
+# Approximate size of a list slot or small int reference
+_POINTER_BYTES = 8
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace within lines. Blank lines are kept as sentence breaks."""
+    return "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+
+
+class PhonemeCache:
+    """Thread-safe LRU cache of phonemized text.
+
+    Least recently used entries are evicted when the estimated size of the
+    cache goes over max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[PhonemeCacheKey, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: PhonemeCacheKey) -> Optional[SentencePhonemes]:
+        """Look up cached sentences, marking them as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+            return entry[0]
+
+    def put(self, key: PhonemeCacheKey, sentences: SentencePhonemes) -> None:
+        """Add sentences to the cache, evicting old entries if necessary."""
+        entry_bytes = _estimate_bytes(key, sentences)
+        if entry_bytes > self.max_bytes:
+            # Would evict everything else
+            return
+
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.num_bytes -= old_entry[1]
+
+            self._entries[key] = (sentences, entry_bytes)
+            self.num_bytes += entry_bytes
+
+            while self.num_bytes > self.max_bytes:
+                _old_key, (_old_sentences, old_bytes) = self._entries.popitem(
+                    last=False
+                )
+                self.num_bytes -= old_bytes
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write cache entries to a JSON file, oldest first."""
+        with self._lock:
+            entries = [
+                {
+                    "espeak_voice": key[0],
+                    "phoneme_type": key[1],
+                    "text": key[2],
+                    "sentences": [{"phonemes": phonemes} for phonemes in sentences],
+                }
+                for key, (sentences, _entry_bytes) in self._entries.items()
+            ]
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as cache_file:
+            json.dump(entries, cache_file, ensure_ascii=False)
+
+        _LOGGER.debug("Saved %s phoneme cache entries to %s", len(entries), path)
+
+    def load(self, path: Union[str, Path]) -> None:
+        """Add cache entries from a JSON file written by save()."""
+        with open(path, "r", encoding="utf-8") as cache_file:
+            entries = json.load(cache_file)
+
+        for entry in entries:
+            self.put(
+                (entry["espeak_voice"], entry["phoneme_type"], entry["text"]),
+                [sentence["phonemes"] for sentence in entry["sentences"]],
+            )
+
+        _LOGGER.debug("Loaded %s phoneme cache entries from %s", len(entries), path)
+
+
+def _estimate_bytes(key: PhonemeCacheKey, sentences: SentencePhonemes) -> int:
+    num_bytes = sum(sys.getsizeof(part) for part in key)
+    for phonemes in sentences:
+        num_bytes += sys.getsizeof(phonemes) + (len(phonemes) * _POINTER_BYTES)
+        num_bytes += sum(sys.getsizeof(phoneme) for phoneme in phonemes)
+
+    return num_bytes
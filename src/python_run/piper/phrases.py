@@ -0,0 +1,57 @@
+"""Splitting sentences into phrases with silence after them"""
+import argparse
+from typing import Any, Dict, List, Mapping, Tuple
+
+
+def split_phrases(
+    phonemes: List[str], phoneme_silence: Mapping[str, float]
+) -> List[Tuple[List[str], float]]:
+    """Split a sentence after each phoneme in phoneme_silence.
+
+    Returns the phonemes of each phrase and the seconds of silence after it,
+    like phonemeSilenceSeconds in the C++ runtime. Punctuation (e.g., ",")
+    is a phoneme too.
+    """
+    if not phoneme_silence:
+        return [(phonemes, 0.0)]
+
+    phrases: List[Tuple[List[str], float]] = []
+    phrase_phonemes: List[str] = []
+    for phoneme in phonemes:
+        phrase_phonemes.append(phoneme)
+        silence_seconds = phoneme_silence.get(phoneme)
+        if silence_seconds is not None:
+            phrases.append((phrase_phonemes, silence_seconds))
+            phrase_phonemes = []
+
+    if phrase_phonemes:
+        phrases.append((phrase_phonemes, 0.0))
+
+    return phrases
+
+
+def add_phrase_args(parser: argparse.ArgumentParser) -> None:
+    """Add command-line arguments for splitting sentences into phrases."""
+    parser.add_argument(
+        "--phoneme-silence",
+        "--phoneme_silence",
+        nargs=2,
+        action="append",
+        metavar=("PHONEME", "SECONDS"),
+        help="Split sentences after PHONEME (or punctuation) and add SECONDS of silence (may be repeated)",
+    )
+
+
+def get_phrase_load_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """PiperVoice.load arguments from add_phrase_args."""
+    if not args.phoneme_silence:
+        return {"phoneme_silence": None}
+
+    phoneme_silence: Dict[str, float] = {}
+    for phoneme, seconds in args.phoneme_silence:
+        if len(phoneme) != 1:
+            raise ValueError(f"Phoneme is not a single codepoint: {phoneme}")
+
+        phoneme_silence[phoneme] = float(seconds)
+
+    return {"phoneme_silence": phoneme_silence}
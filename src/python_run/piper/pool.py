@@ -0,0 +1,247 @@
+"""Multiple sessions of one voice for parallel synthesis"""
+import dataclasses
+import logging
+import os
+import queue
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .config import PiperConfig
+from .gain import GainStage
+from .session import SessionProfile
+from .voice import PiperVoice
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PiperVoicePool:
+    """Pool of voices loaded from the same model, one Onnx session each.
+
+    Each session gets its own intra-op thread budget, so several sentences or
+    requests can be synthesized in parallel without oversubscribing the CPU.
+    For example, 8 workers with 4 threads each on a 32 core machine.
+
+    Every worker holds its own copy of the model in memory.
+    """
+
+    def __init__(self, voices: List[PiperVoice]) -> None:
+        if not voices:
+            raise ValueError("At least one voice is required")
+
+        self.voices = voices
+        self._idle_voices: "queue.Queue[PiperVoice]" = queue.Queue()
+        for voice in voices:
+            self._idle_voices.put(voice)
+
+        # One thread per voice, so a task never waits for an idle voice
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(voices), thread_name_prefix="piper-voice"
+        )
+
+    @staticmethod
+    def load(
+        model_path: Union[str, Path],
+        config_path: Optional[Union[str, Path]] = None,
+        num_workers: int = 2,
+        threads_per_worker: Optional[int] = None,
+        session_profile: Optional[SessionProfile] = None,
+        **load_args: Any,
+    ) -> "PiperVoicePool":
+        """Load num_workers sessions of a model.
+
+        If threads_per_worker is not set, the available cores are divided
+        evenly between workers. Other arguments are passed to PiperVoice.load.
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+        if session_profile is None:
+            session_profile = SessionProfile()
+
+        session_profile = dataclasses.replace(
+            session_profile,
+            intra_op_num_threads=threads_per_worker,
+            inter_op_num_threads=1,
+        )
+
+        _LOGGER.debug(
+            "Loading %s worker(s) with %s thread(s) each",
+            num_workers,
+            threads_per_worker,
+        )
+
+        return PiperVoicePool(
+            [
+                PiperVoice.load(
+                    model_path,
+                    config_path=config_path,
+                    session_profile=session_profile,
+                    **load_args,
+                )
+                for _ in range(num_workers)
+            ]
+        )
+
+    @property
+    def config(self) -> PiperConfig:
+        return self.voices[0].config
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of output audio."""
+        return self.voices[0].sample_rate
+
+    @property
+    def num_workers(self) -> int:
+        return len(self.voices)
+
+    @contextmanager
+    def acquire(self) -> Iterator[PiperVoice]:
+        """Borrow an idle voice, waiting for one if necessary."""
+        voice = self._idle_voices.get()
+        try:
+            yield voice
+        finally:
+            self._idle_voices.put(voice)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def synthesize(
+        self,
+        text: str,
+        wav_file: wave.Wave_write,
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        sentence_silence: float = 0.0,
+    ):
+        """Synthesize WAV audio from text, with sentences spread across workers."""
+        wav_file.setframerate(self.sample_rate)
+        wav_file.setsampwidth(2)  # 16-bit
+        wav_file.setnchannels(1)  # mono
+
+        for audio_bytes in self.synthesize_stream_raw(
+            text,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            sentence_silence=sentence_silence,
+        ):
+            wav_file.writeframes(audio_bytes)
+
+    def synthesize_stream_raw(
+        self,
+        text: str,
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        sentence_silence: float = 0.0,
+    ) -> Iterable[bytes]:
+        """Synthesize raw audio per sentence from text.
+
+        All sentences are queued up front and synthesized by whichever
+        workers are free. Audio is yielded in sentence order.
+
+        If gain is carried across sentences, one worker synthesizes them all
+        in order instead.
+        """
+        # Phonemizing doesn't use the session, so any voice will do
+        voice = self.voices[0]
+        if voice.gain.is_stateful:
+            with self.acquire() as idle_voice:
+                yield from idle_voice.synthesize_stream_raw(
+                    text,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    sentence_silence=sentence_silence,
+                )
+
+            return
+
+        sentences = voice.phonemize_ids(text)
+
+        # Phrases are synthesized in parallel too
+        futures: List[Tuple["Future[bytes]", float]] = []
+        for phonemes, phoneme_ids in sentences:
+            phrases = voice.split_phrase_ids(phonemes, phoneme_ids)
+            for phrase_idx, (phrase_ids, silence_seconds) in enumerate(phrases):
+                if phrase_idx == (len(phrases) - 1):
+                    silence_seconds += sentence_silence
+
+                future = self.submit_ids(
+                    phrase_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                )
+                futures.append((future, silence_seconds))
+
+        try:
+            for future, silence_seconds in futures:
+                yield future.result()
+
+                # 16-bit mono
+                num_silence_samples = int(silence_seconds * self.sample_rate)
+                if num_silence_samples > 0:
+                    yield bytes(num_silence_samples * 2)
+        finally:
+            # Don't synthesize sentences nobody will read
+            for future, _silence_seconds in futures:
+                future.cancel()
+
+    def submit_ids(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+    ) -> "Future[bytes]":
+        """Queue phoneme ids to be synthesized to raw audio by the next free worker.
+
+        A gain_stage shared between calls must only be used by one at a time.
+        """
+        return self._executor.submit(
+            self._synthesize_ids_to_raw,
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            gain_stage=gain_stage,
+        )
+
+    def submit_batch(
+        self, phoneme_ids_batch: List[List[int]], **kwargs: Any
+    ) -> "Future[List[bytes]]":
+        """Queue a batch to be synthesized by the next free worker.
+
+        Arguments are passed to PiperVoice.synthesize_batch.
+        """
+        return self._executor.submit(
+            self._synthesize_batch, phoneme_ids_batch, **kwargs
+        )
+
+    def _synthesize_batch(
+        self, phoneme_ids_batch: List[List[int]], **kwargs: Any
+    ) -> List[bytes]:
+        with self.acquire() as voice:
+            return voice.synthesize_batch(phoneme_ids_batch, **kwargs)
+
+    def _synthesize_ids_to_raw(self, phoneme_ids: List[int], **kwargs: Any) -> bytes:
+        with self.acquire() as voice:
+            return voice.synthesize_ids_to_raw(phoneme_ids, **kwargs)
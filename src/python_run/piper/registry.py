@@ -0,0 +1,192 @@
+"""Lazily loaded voices shared between threads"""
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from .download import VoiceNotFoundError, ensure_voice_exists, find_voice
+from .voice import PiperVoice
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class UnknownVoiceError(ValueError):
+    """Voice name isn't a registered model or a voice in the data dirs."""
+
+
+@dataclass
+class _LoadedVoice:
+    voice: PiperVoice
+    num_bytes: int
+    """Estimated memory usage (size of model file)"""
+
+
+class VoiceRegistry:
+    """Loads voices on first use and unloads the least recently used ones.
+
+    Voices are looked up by name in data_dirs, or by a name given to
+    add_model. Other paths are never loaded, since names may come from
+    clients. If voices_info is given, missing voices are downloaded into
+    download_dir.
+
+    When the estimated memory of loaded voices goes over max_memory_bytes,
+    least recently used voices are unloaded, except for pinned ones. Callers
+    still holding an unloaded voice can keep using it until they let go of it.
+    """
+
+    def __init__(
+        self,
+        data_dirs: Iterable[Union[str, Path]],
+        download_dir: Optional[Union[str, Path]] = None,
+        voices_info: Optional[Dict[str, Any]] = None,
+        max_memory_bytes: Optional[int] = None,
+        **load_args: Any,
+    ) -> None:
+        self.data_dirs: List[Union[str, Path]] = list(data_dirs)
+        self.download_dir = download_dir
+        self.voices_info = voices_info
+        self.max_memory_bytes = max_memory_bytes
+        self.load_args = load_args
+        """Keyword arguments passed to PiperVoice.load"""
+
+        self._voices: "OrderedDict[str, _LoadedVoice]" = OrderedDict()
+        self._voices_lock = threading.Lock()
+
+        # name -> (model path, config path)
+        self._models: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._pinned: Set[str] = set()
+
+        # Only one thread loads a given voice.
+        # Locks are removed once loading is done.
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def add_model(
+        self,
+        name: str,
+        model_path: Union[str, Path],
+        config_path: Optional[Union[str, Path]] = None,
+        pinned: bool = False,
+    ) -> None:
+        """Make a model file available by name.
+
+        Pinned voices are never unloaded.
+        """
+        with self._voices_lock:
+            self._models[name] = (
+                str(model_path),
+                str(config_path) if config_path else None,
+            )
+            if pinned:
+                self._pinned.add(name)
+
+    @property
+    def loaded_voices(self) -> List[str]:
+        """Names of loaded voices, least recently used first."""
+        with self._voices_lock:
+            return list(self._voices.keys())
+
+    def get(self, name: str) -> PiperVoice:
+        """Get a voice by name, loading it if necessary.
+
+        Raises UnknownVoiceError if there is no voice with this name.
+        """
+        with self._voices_lock:
+            loaded_voice = self._voices.get(name)
+            if loaded_voice is not None:
+                self._voices.move_to_end(name)
+                return loaded_voice.voice
+
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        try:
+            with load_lock:
+                with self._voices_lock:
+                    # May have been loaded while we were waiting
+                    loaded_voice = self._voices.get(name)
+                    if loaded_voice is not None:
+                        self._voices.move_to_end(name)
+                        return loaded_voice.voice
+
+                model_path, config_path = self._find_voice(name)
+                _LOGGER.debug("Loading voice %s from %s", name, model_path)
+                voice = PiperVoice.load(
+                    model_path, config_path=config_path, **self.load_args
+                )
+                loaded_voice = _LoadedVoice(
+                    voice=voice, num_bytes=_get_model_bytes(model_path)
+                )
+
+                with self._voices_lock:
+                    self._voices[name] = loaded_voice
+                    self._unload_voices()
+        finally:
+            with self._voices_lock:
+                # Threads arriving later will find the loaded voice
+                if self._load_locks.get(name) is load_lock:
+                    del self._load_locks[name]
+
+        return voice
+
+    def unload(self, name: str) -> None:
+        """Unload a voice if it's loaded."""
+        with self._voices_lock:
+            if self._voices.pop(name, None) is not None:
+                _LOGGER.debug("Unloaded voice %s", name)
+
+    def _find_voice(self, name: str) -> Tuple[Any, Any]:
+        model_paths = self._models.get(name)
+        if model_paths is not None:
+            return model_paths
+
+        if (name in ("", ".", "..")) or ("/" in name) or ("\\" in name):
+            # Only plain voice names are looked up in the data dirs
+            raise UnknownVoiceError(f"Unknown voice: {name}")
+
+        try:
+            return find_voice(name, self.data_dirs)
+        except ValueError as err:
+            if (
+                (self.voices_info is None)
+                or (self.download_dir is None)
+                or (name not in self.voices_info)
+            ):
+                raise UnknownVoiceError(f"Unknown voice: {name}") from err
+
+        # Download voice
+        try:
+            ensure_voice_exists(
+                name, self.data_dirs, self.download_dir, self.voices_info
+            )
+        except VoiceNotFoundError as err:
+            raise UnknownVoiceError(f"Unknown voice: {name}") from err
+
+        return find_voice(name, self.data_dirs)
+
+    def _unload_voices(self) -> None:
+        if self.max_memory_bytes is None:
+            return
+
+        total_bytes = sum(loaded.num_bytes for loaded in self._voices.values())
+
+        # Always keep pinned voices and the most recently used voice
+        for name in list(self._voices.keys())[:-1]:
+            if total_bytes <= self.max_memory_bytes:
+                break
+
+            if name in self._pinned:
+                continue
+
+            loaded_voice = self._voices.pop(name)
+            total_bytes -= loaded_voice.num_bytes
+            _LOGGER.debug("Unloaded voice %s", name)
+
+
+def _get_model_bytes(model_path: Union[str, Path]) -> int:
+    model_path = Path(model_path)
+    if model_path.is_dir():
+        # Streaming model (encoder/decoder)
+        return sum(onnx_path.stat().st_size for onnx_path in model_path.glob("*.onnx"))
+
+    return model_path.stat().st_size
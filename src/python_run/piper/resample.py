@@ -0,0 +1,201 @@
+"""Sample rate conversion of synthesized audio as it's produced"""
+import argparse
+import math
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict
+
+import numpy as np
+
+# Outputs computed at once (limits memory used by the gathered windows)
+_BLOCK_SIZE = 4096
+
+_MAX_WAV_VALUE = 32767.0
+
+
+class ResampleQuality(str, Enum):
+    FAST = "fast"
+    MEDIUM = "medium"
+    HIGH = "high"
+
+
+@dataclass
+class _FilterSettings:
+    taps: int
+    """Input samples per output sample (when not downsampling)"""
+
+    beta: float
+    """Kaiser window shape"""
+
+    rolloff: float
+    """Cutoff as a fraction of the lower Nyquist frequency"""
+
+
+_FILTER_SETTINGS: Dict[ResampleQuality, _FilterSettings] = {
+    ResampleQuality.FAST: _FilterSettings(taps=8, beta=5.0, rolloff=0.8),
+    ResampleQuality.MEDIUM: _FilterSettings(taps=16, beta=7.0, rolloff=0.88),
+    ResampleQuality.HIGH: _FilterSettings(taps=48, beta=10.0, rolloff=0.94),
+}
+
+
+class Resampler:
+    """Polyphase windowed-sinc resampler for a stream of mono audio.
+
+    Chunks can be any size; state is carried between them, so the output is
+    the same as resampling all of the audio at once. Output is aligned with
+    the input (the filter delay is compensated), and flush() returns the rest
+    of the audio so the total length is input_length * output_rate /
+    input_rate (rounded up).
+    """
+
+    def __init__(
+        self,
+        input_rate: int,
+        output_rate: int,
+        quality: ResampleQuality = ResampleQuality.MEDIUM,
+    ) -> None:
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.quality = ResampleQuality(quality)
+
+        divisor = math.gcd(input_rate, output_rate)
+        self._up = output_rate // divisor
+        self._down = input_rate // divisor
+
+        settings = _FILTER_SETTINGS[self.quality]
+
+        # Lower cutoff needs a longer filter
+        self._taps = int(math.ceil(settings.taps * max(1.0, self._down / self._up)))
+
+        # Prototype filter at the upsampled rate
+        num_coefs = self._taps * self._up
+        cutoff = (settings.rolloff * 0.5 * min(input_rate, output_rate)) / (
+            input_rate * self._up
+        )
+        # Centered on a whole sample, so the delay can be compensated exactly
+        self._delay = num_coefs // 2
+        coefs = (
+            (2 * cutoff)
+            * np.sinc((2 * cutoff) * (np.arange(num_coefs) - self._delay))
+            * np.kaiser((2 * self._delay) + 1, settings.beta)[:num_coefs]
+            * self._up
+        )
+
+        # phases[p, k] = coefs[p + (k * up)]
+        self._phases = coefs.reshape(self._taps, self._up).T.astype(np.float32)
+
+        # Input before the current chunk that's still needed
+        self._history = np.zeros((self._taps - 1,), dtype=np.float32)
+        self._history_start = -len(self._history)
+        self._num_input = 0
+        self._num_output = 0
+
+    @property
+    def is_passthrough(self) -> bool:
+        return self._up == self._down
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Resample a chunk of audio, returning what's ready.
+
+        Int16 audio is returned as int16, anything else as float32.
+        """
+        audio = audio.reshape(-1)
+        if self.is_passthrough:
+            return audio
+
+        is_int16 = audio.dtype == np.int16
+        self._num_input += audio.size
+
+        return self._resample(audio, is_int16=is_int16)
+
+    def flush(self, dtype: Any = np.int16) -> np.ndarray:
+        """Return the rest of the audio, and start over."""
+        if self.is_passthrough:
+            return np.zeros((0,), dtype=dtype)
+
+        num_expected = -((-self._num_input * self._up) // self._down)
+
+        # Pad with enough silence for the last output sample
+        last_input = (((num_expected - 1) * self._down) + self._delay) // self._up
+        num_padding = max(0, last_input - self._num_input + 1)
+        audio = self._resample(
+            np.zeros((num_padding,), dtype=np.float32),
+            is_int16=(np.dtype(dtype) == np.int16),
+            max_output=num_expected,
+        )
+
+        self._history[:] = 0
+        self._history_start = -len(self._history)
+        self._num_input = 0
+        self._num_output = 0
+
+        return audio
+
+    def _resample(
+        self, audio: np.ndarray, is_int16: bool, max_output: int = -1
+    ) -> np.ndarray:
+        buffer = np.concatenate([self._history, audio.astype(np.float32)])
+        buffer_end = self._history_start + buffer.size
+
+        # Outputs whose newest input sample is available
+        num_ready = ((buffer_end * self._up) - 1 - self._delay) // self._down + 1
+        if max_output >= 0:
+            num_ready = min(num_ready, max_output)
+
+        output = np.zeros((max(0, num_ready - self._num_output),), dtype=np.float32)
+        tap_offsets = np.arange(self._taps)
+        for block_start in range(0, output.size, _BLOCK_SIZE):
+            block_end = min(output.size, block_start + _BLOCK_SIZE)
+            times = (
+                np.arange(
+                    self._num_output + block_start,
+                    self._num_output + block_end,
+                    dtype=np.int64,
+                )
+                * self._down
+            ) + self._delay
+            newest = (times // self._up) - self._history_start
+
+            # [outputs, taps]
+            windows = buffer[newest[:, None] - tap_offsets[None, :]]
+            output[block_start:block_end] = np.einsum(
+                "ij,ij->i", windows, self._phases[times % self._up]
+            )
+
+        self._num_output += output.size
+
+        # Keep what the next outputs need
+        num_history = self._taps - 1
+        self._history = buffer[buffer.size - num_history :].copy()
+        self._history_start = buffer_end - num_history
+
+        if is_int16:
+            np.clip(output, -_MAX_WAV_VALUE, _MAX_WAV_VALUE, out=output)
+            return np.round(output).astype(np.int16)
+
+        return output
+
+
+def add_resample_args(parser: argparse.ArgumentParser) -> None:
+    """Add command-line arguments for resampling output audio."""
+    parser.add_argument(
+        "--output-sample-rate",
+        "--output_sample_rate",
+        type=int,
+        help="Resample audio to this rate in Hz (default: voice's sample rate)",
+    )
+    parser.add_argument(
+        "--resample-quality",
+        "--resample_quality",
+        choices=[quality.value for quality in ResampleQuality],
+        default=ResampleQuality.MEDIUM.value,
+        help="Quality/speed of resampling (default: medium)",
+    )
+
+
+def get_resample_load_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """PiperVoice.load arguments from add_resample_args."""
+    return {
+        "output_sample_rate": args.output_sample_rate,
+        "resample_quality": ResampleQuality(args.resample_quality),
+    }
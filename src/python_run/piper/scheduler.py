@@ -0,0 +1,279 @@
+"""Dynamic batching of sentences from concurrent requests"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .pool import PiperVoicePool
+from .voice import PiperVoice
+
+_LOGGER = logging.getLogger(__name__)
+
+# speaker_id, length_scale, noise_scale, noise_w
+SynthesisParams = Tuple[
+    Optional[int], Optional[float], Optional[float], Optional[float]
+]
+
+# Sentences are only batched together if they share parameters and length bucket
+BucketKey = Tuple[SynthesisParams, int]
+
+
+@dataclass
+class _PendingSentence:
+    phoneme_ids: List[int]
+    future: "Future[bytes]"
+    enqueue_time: float
+
+
+@dataclass
+class SchedulerMetrics:
+    """Counters reported by the batch scheduler"""
+
+    queue_depth: int = 0
+    """Number of sentences waiting to be synthesized"""
+
+    num_batches: int = 0
+    """Number of batches dispatched"""
+
+    num_sentences: int = 0
+    """Number of sentences dispatched"""
+
+    largest_batch: int = 0
+    """Largest batch dispatched so far"""
+
+    total_wait_seconds: float = 0.0
+    """Total time sentences spent waiting in the queue"""
+
+    max_wait_seconds: float = 0.0
+    """Longest time a sentence spent waiting in the queue"""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "num_batches": self.num_batches,
+            "num_sentences": self.num_sentences,
+            "largest_batch": self.largest_batch,
+            "average_batch_size": (
+                self.num_sentences / self.num_batches if self.num_batches > 0 else 0.0
+            ),
+            "average_wait_seconds": (
+                self.total_wait_seconds / self.num_sentences
+                if self.num_sentences > 0
+                else 0.0
+            ),
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class BatchScheduler:
+    """Collects sentences from all in-flight requests into length buckets.
+
+    A bucket is synthesized as one padded batch when it fills up or when its
+    oldest sentence has waited max_wait_seconds. With a pool, batches are
+    spread across its sessions, and sentences keep collecting while every
+    session is busy.
+
+    Each batch starts with fresh gain state, so don't use the scheduler when
+    gain is carried across sentences (GainSettings.is_stateful).
+    """
+
+    def __init__(
+        self,
+        voice: Union[PiperVoice, PiperVoicePool],
+        max_batch_size: int = 8,
+        max_wait_seconds: float = 0.02,
+        bucket_size: int = 16,
+    ) -> None:
+        self.pool: Optional[PiperVoicePool] = None
+        if isinstance(voice, PiperVoicePool):
+            self.pool = voice
+            self.voice = voice.voices[0]
+        else:
+            self.voice = voice
+
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.bucket_size = bucket_size
+        self.metrics = SchedulerMetrics()
+
+        self._buckets: Dict[BucketKey, List[_PendingSentence]] = {}
+        self._condition = threading.Condition()
+        self._is_running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # One batch at a time per session
+        self._idle_sessions = threading.Semaphore(
+            self.pool.num_workers if self.pool is not None else 1
+        )
+
+    def start(self) -> None:
+        """Start dispatching batches on a background thread."""
+        with self._condition:
+            if self._is_running:
+                return
+
+            self._is_running = True
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread, failing any pending sentences."""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self._condition:
+            for bucket in self._buckets.values():
+                for pending in bucket:
+                    pending.future.set_exception(RuntimeError("Scheduler stopped"))
+
+            self._buckets.clear()
+            self.metrics.queue_depth = 0
+
+    def submit(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+    ) -> "Future[bytes]":
+        """Queue a sentence for synthesis. Result is raw 16-bit mono audio."""
+        future: "Future[bytes]" = Future()
+        params: SynthesisParams = (speaker_id, length_scale, noise_scale, noise_w)
+        key: BucketKey = (params, len(phoneme_ids) // self.bucket_size)
+
+        with self._condition:
+            if not self._is_running:
+                raise RuntimeError("Scheduler is not running")
+
+            self._buckets.setdefault(key, []).append(
+                _PendingSentence(
+                    phoneme_ids=phoneme_ids,
+                    future=future,
+                    enqueue_time=time.monotonic(),
+                )
+            )
+            self.metrics.queue_depth += 1
+            self._condition.notify()
+
+        return future
+
+    def _run(self) -> None:
+        try:
+            while True:
+                self._idle_sessions.acquire()
+                with self._condition:
+                    batch_key: Optional[BucketKey] = None
+                    while self._is_running:
+                        batch_key, timeout = self._next_ready_bucket()
+                        if batch_key is not None:
+                            break
+
+                        self._condition.wait(timeout=timeout)
+
+                    if batch_key is None:
+                        # Stopped
+                        self._idle_sessions.release()
+                        break
+
+                    bucket = self._buckets[batch_key]
+                    batch = bucket[: self.max_batch_size]
+                    del bucket[: self.max_batch_size]
+                    if not bucket:
+                        del self._buckets[batch_key]
+
+                    self.metrics.queue_depth -= len(batch)
+
+                self._dispatch(batch_key[0], batch)
+        except Exception:
+            _LOGGER.exception("Unexpected error in batch scheduler")
+
+    def _next_ready_bucket(self) -> Tuple[Optional[BucketKey], Optional[float]]:
+        """Return a bucket that is ready to go, or how long to wait for one."""
+        now = time.monotonic()
+        ready_key: Optional[BucketKey] = None
+        ready_time: Optional[float] = None
+        timeout: Optional[float] = None
+
+        for key, bucket in self._buckets.items():
+            oldest_time = bucket[0].enqueue_time
+            if len(bucket) >= self.max_batch_size:
+                # Full
+                deadline = oldest_time
+            else:
+                deadline = oldest_time + self.max_wait_seconds
+
+            if deadline <= now:
+                # Dispatch the bucket that has waited longest
+                if (ready_time is None) or (oldest_time < ready_time):
+                    ready_key = key
+                    ready_time = oldest_time
+            elif (timeout is None) or ((deadline - now) < timeout):
+                timeout = deadline - now
+
+        return ready_key, timeout
+
+    def _dispatch(self, params: SynthesisParams, batch: List[_PendingSentence]):
+        dispatch_time = time.monotonic()
+        for pending in batch:
+            wait_seconds = dispatch_time - pending.enqueue_time
+            self.metrics.total_wait_seconds += wait_seconds
+            self.metrics.max_wait_seconds = max(
+                self.metrics.max_wait_seconds, wait_seconds
+            )
+
+        self.metrics.num_batches += 1
+        self.metrics.num_sentences += len(batch)
+        self.metrics.largest_batch = max(self.metrics.largest_batch, len(batch))
+
+        _LOGGER.debug("Dispatching batch of %s sentence(s)", len(batch))
+        speaker_id, length_scale, noise_scale, noise_w = params
+        phoneme_ids_batch = [pending.phoneme_ids for pending in batch]
+        synthesize_args: Dict[str, Any] = {
+            "speaker_id": speaker_id,
+            "length_scale": length_scale,
+            "noise_scale": noise_scale,
+            "noise_w": noise_w,
+            "max_batch_size": len(batch),
+            # Bucketing already bounds the amount of padding
+            "max_padding_ratio": float("inf"),
+        }
+
+        batch_future: "Future[List[bytes]]" = Future()
+        try:
+            if self.pool is not None:
+                batch_future = self.pool.submit_batch(
+                    phoneme_ids_batch, **synthesize_args
+                )
+            else:
+                batch_future.set_result(
+                    self.voice.synthesize_batch(phoneme_ids_batch, **synthesize_args)
+                )
+        except Exception as err:
+            batch_future.set_exception(err)
+
+        batch_future.add_done_callback(partial(self._finish_batch, batch))
+
+    def _finish_batch(
+        self, batch: List[_PendingSentence], batch_future: "Future[List[bytes]]"
+    ) -> None:
+        self._idle_sessions.release()
+
+        err = batch_future.exception()
+        if err is not None:
+            for pending in batch:
+                pending.future.set_exception(err)
+
+            return
+
+        for pending, audio_bytes in zip(batch, batch_future.result()):
+            pending.future.set_result(audio_bytes)
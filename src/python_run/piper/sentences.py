@@ -0,0 +1,30 @@
+"""Sentence boundaries in text that arrives in pieces"""
+import re
+from typing import List, Optional
+
+# Split text after sentence-ending punctuation followed by whitespace, or at
+# line breaks. Punctuation at the very end of the text is not a boundary yet,
+# since more text (e.g., "3.5") may follow.
+SENTENCE_END = re.compile(r"(?<=[.!?。！？؟])\s+|\n+")
+
+
+class SentenceSplitter:
+    """Buffers text fragments and returns sentences once they are complete."""
+
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def add(self, text: str) -> List[str]:
+        """Add a text fragment, returning any sentences it completes."""
+        self._buffer += text
+        parts = SENTENCE_END.split(self._buffer)
+        self._buffer = parts[-1]
+
+        return [part.strip() for part in parts[:-1] if part.strip()]
+
+    def flush(self) -> Optional[str]:
+        """Return remaining text as the last sentence, if any."""
+        text = self._buffer.strip()
+        self._buffer = ""
+
+        return text or None
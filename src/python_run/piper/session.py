@@ -0,0 +1,281 @@
+"""Onnx runtime session settings"""
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import platform
+import time
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import onnxruntime
+
+_LOGGER = logging.getLogger(__name__)
+
+Providers = List[Union[str, Tuple[str, Dict[str, Any]]]]
+
+
+class GraphOptimization(str, Enum):
+    DISABLE = "disable"
+    BASIC = "basic"
+    EXTENDED = "extended"
+    ALL = "all"
+
+
+class ExecutionMode(str, Enum):
+    SEQUENTIAL = "sequential"
+    PARALLEL = "parallel"
+
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    GraphOptimization.DISABLE: onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    GraphOptimization.BASIC: onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    GraphOptimization.EXTENDED: onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    GraphOptimization.ALL: onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    ExecutionMode.SEQUENTIAL: onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    ExecutionMode.PARALLEL: onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+
+@dataclass
+class SessionProfile:
+    """Onnx runtime session settings. Defaults match onnxruntime's."""
+
+    intra_op_num_threads: int = 0
+    """Threads used within an operator (0 = one per physical core)"""
+
+    inter_op_num_threads: int = 0
+    """Threads used between operators in parallel mode (0 = default)"""
+
+    execution_mode: ExecutionMode = ExecutionMode.SEQUENTIAL
+    graph_optimization: GraphOptimization = GraphOptimization.ALL
+
+    enable_cpu_mem_arena: bool = True
+    enable_mem_pattern: bool = True
+
+    allow_spinning: bool = True
+    """Idle threads busy-wait for work instead of sleeping"""
+
+    intra_op_thread_affinities: Optional[str] = None
+    """Logical processors for intra-op threads, e.g. "1,2;3,4" """
+
+    optimized_model_path: Optional[str] = None
+    """Optimized model is saved here on first load and loaded directly after"""
+
+    def make_session_options(self) -> onnxruntime.SessionOptions:
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.intra_op_num_threads = self.intra_op_num_threads
+        sess_options.inter_op_num_threads = self.inter_op_num_threads
+        sess_options.execution_mode = _EXECUTION_MODES[
+            ExecutionMode(self.execution_mode)
+        ]
+        sess_options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[
+            GraphOptimization(self.graph_optimization)
+        ]
+        sess_options.enable_cpu_mem_arena = self.enable_cpu_mem_arena
+        sess_options.enable_mem_pattern = self.enable_mem_pattern
+
+        if not self.allow_spinning:
+            sess_options.add_session_config_entry(
+                "session.intra_op.allow_spinning", "0"
+            )
+            sess_options.add_session_config_entry(
+                "session.inter_op.allow_spinning", "0"
+            )
+
+        if self.intra_op_thread_affinities:
+            sess_options.add_session_config_entry(
+                "session.intra_op_thread_affinities", self.intra_op_thread_affinities
+            )
+
+        return sess_options
+
+    @staticmethod
+    def from_args(args: argparse.Namespace) -> "SessionProfile":
+        """Create from arguments added by add_session_args."""
+        return SessionProfile(
+            intra_op_num_threads=args.intra_op_threads,
+            inter_op_num_threads=args.inter_op_threads,
+            execution_mode=ExecutionMode(args.execution_mode),
+            graph_optimization=GraphOptimization(args.graph_optimization),
+            enable_cpu_mem_arena=not args.disable_cpu_mem_arena,
+            enable_mem_pattern=not args.disable_mem_pattern,
+            allow_spinning=not args.disable_spinning,
+            intra_op_thread_affinities=args.intra_op_thread_affinities,
+            optimized_model_path=args.save_optimized_model,
+        )
+
+
+def add_session_args(parser: argparse.ArgumentParser) -> None:
+    """Add command-line arguments for SessionProfile."""
+    parser.add_argument(
+        "--intra-op-threads",
+        "--intra_op_threads",
+        type=int,
+        default=0,
+        help="Threads used within an operator (default: one per core)",
+    )
+    parser.add_argument(
+        "--inter-op-threads",
+        "--inter_op_threads",
+        type=int,
+        default=0,
+        help="Threads used between operators in parallel execution mode",
+    )
+    parser.add_argument(
+        "--execution-mode",
+        "--execution_mode",
+        choices=[mode.value for mode in ExecutionMode],
+        default=ExecutionMode.SEQUENTIAL.value,
+        help="Run operators sequentially or in parallel (default: sequential)",
+    )
+    parser.add_argument(
+        "--graph-optimization",
+        "--graph_optimization",
+        choices=[level.value for level in GraphOptimization],
+        default=GraphOptimization.ALL.value,
+        help="Graph optimization level (default: all)",
+    )
+    parser.add_argument(
+        "--disable-cpu-mem-arena",
+        "--disable_cpu_mem_arena",
+        action="store_true",
+        help="Don't pre-allocate a CPU memory arena",
+    )
+    parser.add_argument(
+        "--disable-mem-pattern",
+        "--disable_mem_pattern",
+        action="store_true",
+        help="Don't pre-plan memory allocations from input shapes",
+    )
+    parser.add_argument(
+        "--disable-spinning",
+        "--disable_spinning",
+        action="store_true",
+        help="Let idle threads sleep instead of busy-waiting",
+    )
+    parser.add_argument(
+        "--intra-op-thread-affinities",
+        "--intra_op_thread_affinities",
+        help='Logical processors for intra-op threads (e.g., "1,2;3,4")',
+    )
+    parser.add_argument(
+        "--save-optimized-model",
+        "--save_optimized_model",
+        help="Save optimized model to this path, or load it if it already exists",
+    )
+    parser.add_argument(
+        "--model-cache-dir",
+        "--model_cache_dir",
+        help="Directory to cache optimized models in for faster loading",
+    )
+
+
+def make_session(
+    model_path: Union[str, Path],
+    session_profile: Optional[SessionProfile] = None,
+    providers: Optional[Providers] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+    model_hash: Optional[str] = None,
+) -> onnxruntime.InferenceSession:
+    """Create an Onnx session for a model using the given profile.
+
+    If cache_dir is set (and the profile has no optimized_model_path), the
+    optimized model is cached there in ORT format. The cache key includes
+    model_hash, the onnxruntime version, and the session settings.
+    """
+    if session_profile is None:
+        session_profile = SessionProfile()
+
+    sess_options = session_profile.make_session_options()
+    optimized_model_path: Optional[Path] = None
+    temp_model_path: Optional[Path] = None
+    load_type = "uncached"
+
+    if session_profile.optimized_model_path:
+        optimized_model_path = Path(session_profile.optimized_model_path)
+    elif cache_dir and model_hash:
+        cache_key = get_session_cache_key(model_hash, session_profile, providers)
+        optimized_model_path = Path(cache_dir) / f"{cache_key}.ort"
+
+    if optimized_model_path is not None:
+        if optimized_model_path.exists():
+            # Already optimized
+            _LOGGER.debug("Loading optimized model from %s", optimized_model_path)
+            model_path = optimized_model_path
+            sess_options.graph_optimization_level = (
+                onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+            )
+            load_type = "warm"
+        else:
+            _LOGGER.debug("Saving optimized model to %s", optimized_model_path)
+            optimized_model_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Written to a temporary file first so other processes never load
+            # a partial model.
+            temp_model_path = optimized_model_path.with_name(
+                f".{optimized_model_path.name}.{os.getpid()}.tmp"
+            )
+            sess_options.optimized_model_filepath = str(temp_model_path)
+            load_type = "cold"
+
+        if optimized_model_path.suffix == ".ort":
+            # Compact format that loads without re-parsing the Onnx graph
+            model_format = "ORT"
+            if load_type == "warm":
+                sess_options.add_session_config_entry(
+                    "session.load_model_format", model_format
+                )
+            else:
+                sess_options.add_session_config_entry(
+                    "session.save_model_format", model_format
+                )
+
+    start_time = time.monotonic()
+    session = onnxruntime.InferenceSession(
+        str(model_path),
+        sess_options=sess_options,
+        providers=providers,
+    )
+
+    if temp_model_path is not None:
+        assert optimized_model_path is not None
+        os.replace(temp_model_path, optimized_model_path)
+
+    _LOGGER.debug(
+        "Loaded %s in %0.2f second(s) (%s)",
+        model_path,
+        time.monotonic() - start_time,
+        load_type,
+    )
+
+    return session
+
+
+def get_session_cache_key(
+    model_hash: str,
+    session_profile: SessionProfile,
+    providers: Optional[Providers] = None,
+) -> str:
+    """Hash of everything that affects the optimized model."""
+    profile_dict = dataclasses.asdict(session_profile)
+    profile_dict.pop("optimized_model_path", None)
+
+    key_dict = {
+        "model": model_hash,
+        "onnxruntime": onnxruntime.__version__,
+        "machine": platform.machine(),
+        "providers": providers,
+        "profile": profile_dict,
+    }
+
+    return hashlib.sha256(
+        json.dumps(key_dict, sort_keys=True).encode("utf-8")
+    ).hexdigest()
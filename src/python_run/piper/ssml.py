@@ -0,0 +1,225 @@
+"""Subset of SSML compiled to a plan of speech and silence segments"""
+import logging
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, replace
+from typing import List, Mapping, Optional, Union
+
+_LOGGER = logging.getLogger(__name__)
+
+SSML_CONTENT_TYPE = "application/ssml+xml"
+
+_BREAK_STRENGTHS = {
+    "none": 0.0,
+    "x-weak": 0.1,
+    "weak": 0.25,
+    "medium": 0.4,
+    "strong": 0.75,
+    "x-strong": 1.2,
+}
+
+_RATES = {
+    "x-slow": 0.5,
+    "slow": 0.75,
+    "medium": 1.0,
+    "default": 1.0,
+    "fast": 1.5,
+    "x-fast": 2.0,
+}
+
+_TIME = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*(ms|s)\s*$", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class SpeechSegment:
+    text: str
+    speaker_id: Optional[int] = None
+    """Speaker from <voice> (None = default)"""
+
+    rate: float = 1.0
+    """Speaking rate from <prosody> (length scale is divided by this)"""
+
+
+@dataclass
+class BreakSegment:
+    seconds: float
+
+
+Segment = Union[SpeechSegment, BreakSegment]
+
+
+def parse_ssml(
+    ssml: str, speaker_id_map: Optional[Mapping[str, int]] = None
+) -> List[Segment]:
+    """Compile SSML into speech and silence segments.
+
+    Supported elements are speak, break, prosody (rate), voice (name is a
+    speaker name or id), sub, say-as, p, and s. Other elements are read as
+    plain text. Adjacent text with the same parameters is merged.
+    """
+    try:
+        root = ET.fromstring(ssml)
+    except ET.ParseError as err:
+        raise ValueError(f"Invalid SSML: {err}") from err
+
+    if _get_tag(root) != "speak":
+        raise ValueError("SSML must start with <speak>")
+
+    compiler = _SsmlCompiler(speaker_id_map or {})
+    compiler.visit(root, SpeechSegment(text=""))
+
+    for segment in compiler.segments:
+        if isinstance(segment, SpeechSegment):
+            segment.text = segment.text.strip()
+
+    return compiler.segments
+
+
+# -----------------------------------------------------------------------------
+
+
+class _SsmlCompiler:
+    def __init__(self, speaker_id_map: Mapping[str, int]) -> None:
+        self.speaker_id_map = speaker_id_map
+        self.segments: List[Segment] = []
+        self._is_boundary = True
+        """Next text starts a new segment"""
+
+    def visit(self, element: ET.Element, context: SpeechSegment) -> None:
+        tag = _get_tag(element)
+
+        if tag == "break":
+            self.segments.append(BreakSegment(seconds=_get_break_seconds(element)))
+            self._is_boundary = True
+            return
+
+        if tag == "sub":
+            self.add_text(element.get("alias", ""), context)
+            return
+
+        if tag == "say-as":
+            self.add_text(
+                _say_as("".join(element.itertext()), element.get("interpret-as", "")),
+                context,
+            )
+            return
+
+        if tag == "prosody":
+            rate = element.get("rate")
+            if rate:
+                context = replace(context, rate=context.rate * _get_rate(rate))
+        elif tag == "voice":
+            name = element.get("name")
+            if name:
+                context = replace(context, speaker_id=self._get_speaker_id(name))
+        elif tag in ("p", "s"):
+            self._is_boundary = True
+        elif tag != "speak":
+            _LOGGER.debug("Unsupported SSML element: %s", tag)
+
+        self.add_text(element.text, context)
+        for child in element:
+            self.visit(child, context)
+            self.add_text(child.tail, context)
+
+        if tag in ("p", "s"):
+            self._is_boundary = True
+
+    def add_text(self, text: Optional[str], context: SpeechSegment) -> None:
+        if not text:
+            return
+
+        text = _WHITESPACE.sub(" ", text)
+        last_segment = self.segments[-1] if self.segments else None
+        if (
+            (not self._is_boundary)
+            and isinstance(last_segment, SpeechSegment)
+            and (last_segment.speaker_id == context.speaker_id)
+            and (last_segment.rate == context.rate)
+        ):
+            # Whitespace is kept to separate words
+            last_segment.text += text
+            return
+
+        if not text.strip():
+            return
+
+        self.segments.append(replace(context, text=text))
+        self._is_boundary = False
+
+    def _get_speaker_id(self, name: str) -> int:
+        speaker_id = self.speaker_id_map.get(name)
+        if speaker_id is not None:
+            return speaker_id
+
+        if name.isdigit():
+            return int(name)
+
+        raise ValueError(f"Unknown speaker: {name}")
+
+
+def _get_tag(element: ET.Element) -> str:
+    # Drop namespace
+    return element.tag.rsplit("}", maxsplit=1)[-1]
+
+
+def _get_break_seconds(element: ET.Element) -> float:
+    time_str = element.get("time")
+    if time_str:
+        match = _TIME.match(time_str)
+        if match is None:
+            raise ValueError(f"Invalid break time: {time_str}")
+
+        seconds = float(match.group(1))
+        if match.group(2).lower() == "ms":
+            seconds /= 1000
+
+        return seconds
+
+    strength = element.get("strength", "medium")
+    if strength not in _BREAK_STRENGTHS:
+        raise ValueError(f"Invalid break strength: {strength}")
+
+    return _BREAK_STRENGTHS[strength]
+
+
+def _get_rate(rate_str: str) -> float:
+    """Relative speaking rate from a prosody rate attribute."""
+    rate_str = rate_str.strip()
+    if rate_str in _RATES:
+        return _RATES[rate_str]
+
+    try:
+        if rate_str.endswith("%"):
+            percent = float(rate_str[:-1])
+            if rate_str[0] in "+-":
+                # Relative change
+                rate = 1 + (percent / 100)
+            else:
+                rate = percent / 100
+        else:
+            rate = float(rate_str)
+    except ValueError as err:
+        raise ValueError(f"Invalid prosody rate: {rate_str}") from err
+
+    if rate <= 0:
+        raise ValueError(f"Invalid prosody rate: {rate_str}")
+
+    return rate
+
+
+def _say_as(text: str, interpret_as: str) -> str:
+    text = text.strip()
+    if interpret_as in ("characters", "spell-out", "verbatim"):
+        return " ".join(c for c in text if not c.isspace())
+
+    if interpret_as == "digits":
+        return " ".join(c for c in text if c.isdigit())
+
+    if interpret_as == "telephone":
+        groups = [group for group in re.split(r"[^0-9]+", text) if group]
+        return ", ".join(" ".join(group) for group in groups)
+
+    # Let the phonemizer read it
+    return text
@@ -0,0 +1,161 @@
+"""Stitching of audio decoded in chunks"""
+import argparse
+import math
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class CrossfadeWindow(str, Enum):
+    LINEAR = "linear"
+    HANN = "hann"
+    """Raised cosine, smoother than linear at the ends"""
+
+    EQUAL_POWER = "equal_power"
+    """Constant power (sine/cosine), for overlaps that aren't well correlated"""
+
+
+def make_crossfade(
+    num_samples: int, window: CrossfadeWindow = CrossfadeWindow.HANN
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Fade in and fade out curves over num_samples."""
+    # Sample centers, so neither curve is exactly 0 or 1
+    t = (np.arange(num_samples, dtype=np.float32) + 0.5) / max(1, num_samples)
+    window = CrossfadeWindow(window)
+
+    if window == CrossfadeWindow.LINEAR:
+        fade_in = t
+    elif window == CrossfadeWindow.HANN:
+        fade_in = 0.5 - (0.5 * np.cos(np.pi * t))
+    else:
+        fade_in = np.sin(0.5 * np.pi * t)
+        return fade_in, np.cos(0.5 * np.pi * t)
+
+    return fade_in, 1.0 - fade_in
+
+
+class AudioStitcher:
+    """Overlap-adds decoded chunks that share samples at their edges.
+
+    Each chunk's last overlap samples are held back until the next chunk
+    arrives, and then crossfaded with the first overlap samples of that chunk.
+    """
+
+    def __init__(self, window: CrossfadeWindow = CrossfadeWindow.HANN) -> None:
+        self.window = window
+        self._tail: Optional[np.ndarray] = None
+
+    def add(self, audio: np.ndarray, tail_samples: int = 0) -> np.ndarray:
+        """Add a chunk, returning the audio that is now final.
+
+        The start of audio overlaps the tail held back from the previous
+        chunk. The last tail_samples are held back for the next chunk.
+        """
+        if (self._tail is not None) and (len(self._tail) > 0):
+            num_overlap = min(len(self._tail), len(audio))
+            fade_in, fade_out = make_crossfade(num_overlap, self.window)
+            audio = np.concatenate(
+                [
+                    (self._tail[:num_overlap] * fade_out)
+                    + (audio[:num_overlap] * fade_in),
+                    audio[num_overlap:],
+                ]
+            )
+
+        tail_samples = min(tail_samples, len(audio))
+        self._tail = audio[len(audio) - tail_samples :]
+
+        return audio[: len(audio) - tail_samples]
+
+    def flush(self) -> np.ndarray:
+        """Return any audio still held back."""
+        tail = self._tail if self._tail is not None else np.zeros((0,), np.float32)
+        self._tail = None
+
+        return tail
+
+
+class ChunkScheduler:
+    """Chooses how many frames to decode next.
+
+    Starts with first_chunk_size frames for a low time to first audio. Chunks
+    grow by growth (up to max_chunk_size) once enough audio is buffered ahead
+    of playback to cover decoding the bigger chunk.
+    """
+
+    def __init__(
+        self,
+        first_chunk_size: int,
+        max_chunk_size: int,
+        growth: float = 2.0,
+        safety: float = 1.5,
+    ) -> None:
+        self.max_chunk_size = max(1, max_chunk_size)
+        self.chunk_size = max(1, min(first_chunk_size, self.max_chunk_size))
+        self.growth = growth
+        self.safety = safety
+        """Buffered audio must cover this many times the expected decode time"""
+
+    def update(
+        self, num_frames: int, decode_seconds: float, buffered_seconds: float
+    ) -> None:
+        """Record how long the last chunk took and how far ahead playback is."""
+        if (self.chunk_size >= self.max_chunk_size) or (num_frames <= 0):
+            return
+
+        next_size = min(
+            self.max_chunk_size, int(math.ceil(self.chunk_size * self.growth))
+        )
+        seconds_per_frame = decode_seconds / num_frames
+        if buffered_seconds > (next_size * seconds_per_frame * self.safety):
+            self.chunk_size = next_size
+
+
+def add_streaming_args(parser: argparse.ArgumentParser) -> None:
+    """Add command-line arguments for streaming (encoder/decoder) models."""
+    parser.add_argument(
+        "--chunk-size",
+        "--chunk_size",
+        type=int,
+        default=45,
+        help="Frames decoded at a time by streaming (encoder/decoder) models",
+    )
+    parser.add_argument(
+        "--chunk-padding",
+        "--chunk_padding",
+        type=int,
+        default=5,
+        help="Frames of context on each side of a streaming chunk",
+    )
+    parser.add_argument(
+        "--first-chunk-size",
+        "--first_chunk_size",
+        type=int,
+        help="Frames in the first streaming chunk, growing up to --chunk-size",
+    )
+    parser.add_argument(
+        "--crossfade-frames",
+        "--crossfade_frames",
+        type=int,
+        default=2,
+        help="Frames crossfaded between streaming chunks (default: 2)",
+    )
+    parser.add_argument(
+        "--crossfade-window",
+        "--crossfade_window",
+        choices=[window.value for window in CrossfadeWindow],
+        default=CrossfadeWindow.HANN.value,
+        help="Shape of crossfade between streaming chunks (default: hann)",
+    )
+
+
+def get_streaming_load_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """PiperVoice.load arguments from add_streaming_args."""
+    return {
+        "chunk_size": args.chunk_size,
+        "chunk_padding": args.chunk_padding,
+        "first_chunk_size": args.first_chunk_size,
+        "crossfade_frames": args.crossfade_frames,
+        "crossfade_window": CrossfadeWindow(args.crossfade_window),
+    }
@@ -1,6 +1,12 @@
 """Utilities"""
+import struct
+from typing import Optional
+
 import numpy as np
 
+# Data size for WAV streams whose length isn't known up front
+_WAV_UNKNOWN_SIZE = 0xFFFFFFFF
+
 
 def audio_float_to_int16(
     audio: np.ndarray, max_wav_value: float = 32767.0
@@ -10,3 +16,39 @@ def audio_float_to_int16(
     audio_norm = np.clip(audio_norm, -max_wav_value, max_wav_value)
     audio_norm = audio_norm.astype("int16")
     return audio_norm
+
+
+def wav_header(
+    sample_rate: int,
+    sample_width: int = 2,
+    num_channels: int = 1,
+    num_frames: Optional[int] = None,
+) -> bytes:
+    """WAV header for PCM audio.
+
+    If num_frames is None, the sizes are set to the maximum so the header can
+    be sent before the audio is synthesized (streaming).
+    """
+    if num_frames is None:
+        data_size = _WAV_UNKNOWN_SIZE
+        riff_size = _WAV_UNKNOWN_SIZE
+    else:
+        data_size = num_frames * sample_width * num_channels
+        riff_size = 36 + data_size
+
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        riff_size,
+        b"WAVE",
+        b"fmt ",
+        16,  # fmt chunk size
+        1,  # PCM
+        num_channels,
+        sample_rate,
+        sample_rate * sample_width * num_channels,  # byte rate
+        sample_width * num_channels,  # block align
+        sample_width * 8,  # bits per sample
+        b"data",
+        data_size,
+    )
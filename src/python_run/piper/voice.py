@@ -1,40 +1,149 @@
-import json
+import dataclasses
 import logging
+import queue
+import threading
+import time
 import wave
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import onnxruntime
 from piper_phonemize import phonemize_codepoints, phonemize_espeak, tashkeel_run
 
-from .config import PhonemeType, PiperConfig
+from .audio_cache import AudioCache, make_audio_cache_key
+from .config import PhonemeType, PiperConfig, load_config
 from .const import BOS, EOS, PAD
-from .util import audio_float_to_int16
+from .file_hash import get_file_hash
+from .gain import GainMode, GainSettings, GainStage
+from .phoneme_cache import PhonemeCache, SentencePhonemeIds, normalize_text
+from .phrases import split_phrases
+from .resample import ResampleQuality, Resampler
+from .sentences import SENTENCE_END
+from .session import Providers, SessionProfile, make_session
+from .ssml import BreakSegment, parse_ssml
+from .streaming import AudioStitcher, ChunkScheduler, CrossfadeWindow
 
 _LOGGER = logging.getLogger(__name__)
 
+# Optional model output with the real number of samples for each utterance.
+# Required for batched synthesis (see export_onnx.py).
+_OUTPUT_LENGTHS = "output_lengths"
+
+# Model files in a directory from export_onnx_streaming.py
+_ENCODER_NAME = "encoder.onnx"
+_DECODER_NAME = "decoder.onnx"
+_STREAMING_CONFIG_NAME = "config.json"
+
+
+@dataclass
+class _SsmlPhrase:
+    """Phrase of an SSML plan with its segment's parameters"""
+
+    speaker_id: Optional[int]
+    length_scale: float
+    phoneme_ids: List[int]
+
 
 @dataclass
 class PiperVoice:
     session: onnxruntime.InferenceSession
     config: PiperConfig
+    phoneme_cache: Optional[PhonemeCache] = None
+    audio_cache: Optional[AudioCache] = None
+    model_hash: str = ""
+    """Hash of model file, used in audio cache keys"""
+
+    decoder: Optional[onnxruntime.InferenceSession] = None
+    """Decoder of a streaming model (session is the encoder)"""
+
+    chunk_size: int = 45
+    """Frames decoded at a time by a streaming model"""
+
+    chunk_padding: int = 5
+    """Frames of context added to each side of a chunk to avoid artifacts"""
+
+    first_chunk_size: Optional[int] = None
+    """Frames in the first chunk, growing to chunk_size (None = chunk_size)"""
+
+    crossfade_frames: int = 2
+    """Frames overlap-added at each chunk boundary (at most chunk_padding)"""
+
+    crossfade_window: CrossfadeWindow = CrossfadeWindow.HANN
+
+    gain: GainSettings = field(default_factory=GainSettings)
+    """How float audio is scaled to 16-bit"""
+
+    output_sample_rate: Optional[int] = None
+    """Resample audio to this rate (None = config.sample_rate)"""
+
+    resample_quality: ResampleQuality = ResampleQuality.MEDIUM
 
     @staticmethod
     def load(
         model_path: Union[str, Path],
         config_path: Optional[Union[str, Path]] = None,
         use_cuda: bool = False,
+        phoneme_cache: Optional[PhonemeCache] = None,
+        audio_cache: Optional[AudioCache] = None,
+        session_profile: Optional[SessionProfile] = None,
+        model_cache_dir: Optional[Union[str, Path]] = None,
+        chunk_size: int = 45,
+        chunk_padding: int = 5,
+        first_chunk_size: Optional[int] = None,
+        crossfade_frames: int = 2,
+        crossfade_window: CrossfadeWindow = CrossfadeWindow.HANN,
+        gain: Optional[GainSettings] = None,
+        output_sample_rate: Optional[int] = None,
+        resample_quality: ResampleQuality = ResampleQuality.MEDIUM,
+        phoneme_silence: Optional[Mapping[str, float]] = None,
     ) -> "PiperVoice":
-        """Load an ONNX model and config."""
+        """Load an ONNX model and config.
+
+        If model_path is a directory with encoder.onnx and decoder.onnx from
+        export_onnx_streaming.py, audio is streamed in chunks of chunk_size
+        frames while a sentence is being decoded. Its config defaults to
+        config.json in the same directory. With first_chunk_size, chunks start
+        small and grow once audio is buffered ahead of playback.
+
+        If model_cache_dir is set, the optimized model and parsed config are
+        cached there so later loads are faster.
+
+        By default, each sentence is scaled to its own peak. See GainSettings
+        for keeping loudness consistent across sentences.
+
+        If output_sample_rate is set, audio is resampled to it. Caches still
+        hold audio at the model's sample rate.
+
+        phoneme_silence adds to (or overrides) the config's phoneme_silence,
+        which splits sentences into phrases (see split_phrases).
+        """
+        model_dir = Path(model_path)
+        is_streaming = model_dir.is_dir()
+        if is_streaming:
+            model_path = model_dir / _ENCODER_NAME
+            decoder_path = model_dir / _DECODER_NAME
+            if config_path is None:
+                config_path = model_dir / _STREAMING_CONFIG_NAME
+
         if config_path is None:
             config_path = f"{model_path}.json"
 
-        with open(config_path, "r", encoding="utf-8") as config_file:
-            config_dict = json.load(config_file)
+        model_hash = ""
+        decoder_hash = ""
+        if (audio_cache is not None) or model_cache_dir:
+            model_hash = get_file_hash(model_path)
+            if is_streaming:
+                decoder_hash = get_file_hash(decoder_path)
 
-        providers: List[Union[str, Tuple[str, Dict[str, Any]]]]
+        config = load_config(config_path, cache_dir=model_cache_dir)
+        if phoneme_silence:
+            config = dataclasses.replace(
+                config, phoneme_silence={**config.phoneme_silence, **phoneme_silence}
+            )
+
+        providers: Providers
         if use_cuda:
             providers = [
                 (
@@ -45,17 +154,91 @@ class PiperVoice:
         else:
             providers = ["CPUExecutionProvider"]
 
+        decoder: Optional[onnxruntime.InferenceSession] = None
+        if is_streaming:
+            decoder_profile = session_profile
+            if (session_profile is not None) and session_profile.optimized_model_path:
+                # Keep the optimized encoder and decoder apart
+                optimized_path = Path(session_profile.optimized_model_path)
+                decoder_profile = dataclasses.replace(
+                    session_profile,
+                    optimized_model_path=str(
+                        optimized_path.with_name(
+                            f"{optimized_path.stem}.decoder{optimized_path.suffix}"
+                        )
+                    ),
+                )
+
+            decoder = make_session(
+                decoder_path,
+                session_profile=decoder_profile,
+                providers=providers,
+                cache_dir=model_cache_dir,
+                model_hash=decoder_hash,
+            )
+
         return PiperVoice(
-            config=PiperConfig.from_dict(config_dict),
-            session=onnxruntime.InferenceSession(
-                str(model_path),
-                sess_options=onnxruntime.SessionOptions(),
+            config=config,
+            session=make_session(
+                model_path,
+                session_profile=session_profile,
                 providers=providers,
+                cache_dir=model_cache_dir,
+                model_hash=model_hash,
             ),
+            phoneme_cache=phoneme_cache,
+            audio_cache=audio_cache,
+            model_hash=model_hash + decoder_hash,
+            decoder=decoder,
+            chunk_size=chunk_size,
+            chunk_padding=chunk_padding,
+            first_chunk_size=first_chunk_size,
+            crossfade_frames=crossfade_frames,
+            crossfade_window=CrossfadeWindow(crossfade_window),
+            gain=gain if gain is not None else GainSettings(),
+            output_sample_rate=output_sample_rate,
+            resample_quality=ResampleQuality(resample_quality),
         )
 
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of output audio."""
+        return self.output_sample_rate or self.config.sample_rate
+
+    @property
+    def is_streaming(self) -> bool:
+        """True if audio is decoded in chunks (encoder/decoder model)."""
+        return self.decoder is not None
+
     def phonemize(self, text: str) -> List[List[str]]:
-        """Text to phonemes grouped by sentence."""
+        """Text to phonemes grouped by sentence.
+
+        Results are looked up in and added to the phoneme cache, if set.
+        """
+        text = normalize_text(text)
+        if self.phoneme_cache is None:
+            return self._phonemize(text)
+
+        cache_key = (
+            self.config.espeak_voice,
+            self.config.phoneme_type.value,
+            text,
+        )
+        sentences = self.phoneme_cache.get(cache_key)
+        if sentences is None:
+            sentences = self._phonemize(text)
+            self.phoneme_cache.put(cache_key, sentences)
+
+        return sentences
+
+    def phonemize_ids(self, text: str) -> SentencePhonemeIds:
+        """Text to (phonemes, phoneme ids) grouped by sentence."""
+        return [
+            (phonemes, self.phonemes_to_ids(phonemes))
+            for phonemes in self.phonemize(text)
+        ]
+
+    def _phonemize(self, text: str) -> List[List[str]]:
         if self.config.phoneme_type == PhonemeType.ESPEAK:
             if self.config.espeak_voice == "ar":
                 # Arabic diacritization
@@ -69,6 +252,51 @@ class PiperVoice:
 
         raise ValueError(f"Unexpected phoneme type: {self.config.phoneme_type}")
 
+    def phonemize_ids_pipelined(
+        self, text: str
+    ) -> Iterable[Tuple[List[str], List[int]]]:
+        """Text to (phonemes, phoneme ids) by sentence, using a worker thread.
+
+        Text is split at sentence boundaries and each piece is phonemized in
+        the background, so sentences can be consumed while later ones are
+        still being phonemized.
+        """
+        sentence_queue: "queue.Queue[Any]" = queue.Queue()
+        is_stopped = threading.Event()
+        done = object()
+
+        def phonemize_sentences() -> None:
+            try:
+                for text_part in SENTENCE_END.split(text):
+                    if is_stopped.is_set():
+                        break
+
+                    if not text_part.strip():
+                        continue
+
+                    for sentence in self.phonemize_ids(text_part):
+                        sentence_queue.put(sentence)
+            except Exception as err:
+                sentence_queue.put(err)
+            finally:
+                sentence_queue.put(done)
+
+        thread = threading.Thread(target=phonemize_sentences, daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                item = sentence_queue.get()
+                if item is done:
+                    break
+
+                if isinstance(item, Exception):
+                    raise item
+
+                yield item
+        finally:
+            is_stopped.set()
+
     def phonemes_to_ids(self, phonemes: List[str]) -> List[int]:
         """Phonemes to ids."""
         id_map = self.config.phoneme_id_map
@@ -86,6 +314,23 @@ class PiperVoice:
 
         return ids
 
+    def split_phrase_ids(
+        self, phonemes: List[str], phoneme_ids: List[int]
+    ) -> List[Tuple[List[int], float]]:
+        """Split a sentence into phrases after phonemes in config.phoneme_silence.
+
+        Returns phoneme ids and seconds of silence after each phrase. Without
+        phoneme_silence, the whole sentence is one phrase.
+        """
+        phrases = split_phrases(phonemes, self.config.phoneme_silence)
+        if (len(phrases) == 1) and (phrases[0][1] <= 0):
+            return [(phoneme_ids, 0.0)]
+
+        return [
+            (self.phonemes_to_ids(phrase_phonemes), silence_seconds)
+            for phrase_phonemes, silence_seconds in phrases
+        ]
+
     def synthesize(
         self,
         text: str,
@@ -95,12 +340,37 @@ class PiperVoice:
         noise_scale: Optional[float] = None,
         noise_w: Optional[float] = None,
         sentence_silence: float = 0.0,
+        max_batch_size: int = 1,
+        pipeline: bool = False,
     ):
-        """Synthesize WAV audio from text."""
-        wav_file.setframerate(self.config.sample_rate)
+        """Synthesize WAV audio from text.
+
+        If max_batch_size > 1, sentences are synthesized together in batches
+        (unless gain is carried across sentences).
+        """
+        wav_file.setframerate(self.sample_rate)
         wav_file.setsampwidth(2)  # 16-bit
         wav_file.setnchannels(1)  # mono
 
+        if (max_batch_size > 1) and self.gain.is_stateful:
+            _LOGGER.debug("Not batching with gain mode: %s", self.gain.mode)
+            max_batch_size = 1
+
+        if max_batch_size > 1:
+            # Phrases of all sentences, with seconds of silence after each
+            phrases = list(self._get_phrases(text, sentence_silence))
+            for audio_bytes in self._synthesize_phrase_batch(
+                phrases,
+                speaker_id=speaker_id,
+                length_scale=length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+                max_batch_size=max_batch_size,
+            ):
+                wav_file.writeframes(audio_bytes)
+
+            return
+
         for audio_bytes in self.synthesize_stream_raw(
             text,
             speaker_id=speaker_id,
@@ -108,6 +378,7 @@ class PiperVoice:
             noise_scale=noise_scale,
             noise_w=noise_w,
             sentence_silence=sentence_silence,
+            pipeline=pipeline,
         ):
             wav_file.writeframes(audio_bytes)
 
@@ -119,23 +390,396 @@ class PiperVoice:
         noise_scale: Optional[float] = None,
         noise_w: Optional[float] = None,
         sentence_silence: float = 0.0,
+        pipeline: bool = False,
+        gain_stage: Optional[GainStage] = None,
+        resampler: Optional[Resampler] = None,
     ) -> Iterable[bytes]:
-        """Synthesize raw audio per sentence from text."""
-        sentence_phonemes = self.phonemize(text)
+        """Synthesize raw audio per sentence from text.
+
+        If pipeline is True, the next sentence is phonemized while the
+        current one is being synthesized.
+
+        Gain state (running peak/RMS) is carried across sentences, and across
+        calls if the same gain_stage is passed in. The same goes for
+        resampler, which the caller must flush if it's passed in.
+        """
+        sentences: Iterable[Tuple[List[str], List[int]]]
+        if pipeline:
+            sentences = self.phonemize_ids_pipelined(text)
+        else:
+            sentences = self.phonemize_ids(text)
+
+        if gain_stage is None:
+            gain_stage = self.make_gain_stage()
+
+        flush_resampler = False
+        if resampler is None:
+            resampler = self.make_resampler()
+            flush_resampler = resampler is not None
 
         # 16-bit mono
-        num_silence_samples = int(sentence_silence * self.config.sample_rate)
-        silence_bytes = bytes(num_silence_samples * 2)
+        silence = np.zeros(
+            (int(sentence_silence * self.config.sample_rate),), dtype=np.int16
+        )
+        silence_bytes = silence.tobytes()
 
-        for phonemes in sentence_phonemes:
-            phoneme_ids = self.phonemes_to_ids(phonemes)
+        for phonemes, phoneme_ids in sentences:
+            phrases = self.split_phrase_ids(phonemes, phoneme_ids)
+            if len(phrases) > 1:
+                yield from self._synthesize_phrases(
+                    phrases,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    gain_stage=gain_stage,
+                    resampler=resampler,
+                )
+            elif self.is_streaming:
+                # Audio for each chunk of the sentence as soon as it's decoded
+                yield from self.synthesize_ids_to_raw_stream(
+                    phoneme_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    gain_stage=gain_stage,
+                    resampler=resampler,
+                )
+            else:
+                yield self.synthesize_ids_to_raw(
+                    phoneme_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    gain_stage=gain_stage,
+                    resampler=resampler,
+                )
+
+            if silence_bytes:
+                # Separately, to avoid copying the sentence audio
+                if resampler is not None:
+                    # Keeps resampler state in order
+                    yield resampler.process(silence).tobytes()
+                else:
+                    yield silence_bytes
+
+        if flush_resampler:
+            assert resampler is not None
+            yield resampler.flush().tobytes()
+
+    def synthesize_stream_audio(
+        self,
+        text: str,
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        sentence_silence: float = 0.0,
+        pipeline: bool = False,
+        gain_stage: Optional[GainStage] = None,
+        resampler: Optional[Resampler] = None,
+    ) -> Iterable[np.ndarray]:
+        """Synthesize 16-bit audio samples per sentence from text.
+
+        Like synthesize_stream_raw, but yields read-only int16 views of the
+        raw audio instead of bytes.
+        """
+        for audio_bytes in self.synthesize_stream_raw(
+            text,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            sentence_silence=sentence_silence,
+            pipeline=pipeline,
+            gain_stage=gain_stage,
+            resampler=resampler,
+        ):
+            yield np.frombuffer(audio_bytes, dtype=np.int16)
+
+    def _synthesize_phrases(
+        self,
+        phrases: List[Tuple[List[int], float]],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+        resampler: Optional[Resampler] = None,
+    ) -> Iterable[bytes]:
+        """Raw audio and silence for the phrases of a sentence.
+
+        Phrases are run through Onnx together if the model supports batching
+        (and gain isn't carried across them). Streaming models decode each
+        phrase in turn, so the first one is heard sooner.
+        """
+
+        def get_silence(seconds: float) -> bytes:
+            silence = np.zeros((int(seconds * self.config.sample_rate),), np.int16)
+            if resampler is not None:
+                return resampler.process(silence).tobytes()
+
+            return self._resample(silence).tobytes()
+
+        if self.is_streaming:
+            for phoneme_ids, silence_seconds in phrases:
+                yield from self.synthesize_ids_to_raw_stream(
+                    phoneme_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    gain_stage=gain_stage,
+                    resampler=resampler,
+                )
+                if silence_seconds > 0:
+                    yield get_silence(silence_seconds)
+
+            return
+
+        if self.supports_batching and (not self.gain.is_stateful):
+            # One Onnx call for the whole sentence
+            phrase_audio = self._synthesize_batch(
+                [phoneme_ids for phoneme_ids, _silence_seconds in phrases],
+                speaker_id=speaker_id,
+                length_scale=length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+                max_batch_size=len(phrases),
+                max_padding_ratio=float("inf"),
+            )
+            for audio_bytes, (_phoneme_ids, silence_seconds) in zip(
+                phrase_audio, phrases
+            ):
+                if (resampler is not None) or (
+                    self.sample_rate != self.config.sample_rate
+                ):
+                    audio_bytes = self._resample(
+                        np.frombuffer(audio_bytes, dtype=np.int16), resampler
+                    ).tobytes()
+
+                yield audio_bytes
+                if silence_seconds > 0:
+                    yield get_silence(silence_seconds)
+
+            return
+
+        for phoneme_ids, silence_seconds in phrases:
             yield self.synthesize_ids_to_raw(
                 phoneme_ids,
                 speaker_id=speaker_id,
                 length_scale=length_scale,
                 noise_scale=noise_scale,
                 noise_w=noise_w,
-            ) + silence_bytes
+                gain_stage=gain_stage,
+                resampler=resampler,
+            )
+            if silence_seconds > 0:
+                yield get_silence(silence_seconds)
+
+    def _get_phrases(
+        self, text: str, sentence_silence: float = 0.0
+    ) -> Iterable[Tuple[List[int], float]]:
+        """Phrases of all sentences, with seconds of silence after each."""
+        for phonemes, phoneme_ids in self.phonemize_ids(text):
+            phrases = self.split_phrase_ids(phonemes, phoneme_ids)
+            for phrase_idx, (phrase_ids, silence_seconds) in enumerate(phrases):
+                if phrase_idx == (len(phrases) - 1):
+                    silence_seconds += sentence_silence
+
+                yield (phrase_ids, silence_seconds)
+
+    def _synthesize_phrase_batch(
+        self,
+        phrases: List[Tuple[List[int], float]],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        max_batch_size: int = 8,
+    ) -> Iterable[bytes]:
+        """Raw audio and silence for phrases synthesized in batches."""
+        phrase_audio = self.synthesize_batch(
+            [phoneme_ids for phoneme_ids, _silence_seconds in phrases],
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            max_batch_size=max_batch_size,
+        )
+
+        # Audio is already at the output sample rate
+        for audio_bytes, (_phoneme_ids, silence_seconds) in zip(phrase_audio, phrases):
+            yield audio_bytes
+            if silence_seconds > 0:
+                yield bytes(int(silence_seconds * self.sample_rate) * 2)
+
+    def synthesize_ssml(
+        self,
+        ssml: str,
+        wav_file: wave.Wave_write,
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        sentence_silence: float = 0.0,
+        max_batch_size: int = 8,
+    ):
+        """Synthesize WAV audio from SSML (see synthesize_ssml_stream_raw)."""
+        wav_file.setframerate(self.sample_rate)
+        wav_file.setsampwidth(2)  # 16-bit
+        wav_file.setnchannels(1)  # mono
+
+        for audio_bytes in self.synthesize_ssml_stream_raw(
+            ssml,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            sentence_silence=sentence_silence,
+            max_batch_size=max_batch_size,
+        ):
+            wav_file.writeframes(audio_bytes)
+
+    def synthesize_ssml_stream_raw(
+        self,
+        ssml: str,
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        sentence_silence: float = 0.0,
+        max_batch_size: int = 8,
+    ) -> Iterable[bytes]:
+        """Synthesize raw audio from SSML (see piper.ssml for what's supported).
+
+        Consecutive sentences (and phrases) with the same speaker and rate are
+        synthesized together in batches, unless gain is carried across
+        sentences. Each group is yielded as soon as it's done. Breaks are
+        silence and don't run the model. speaker_id and length_scale are
+        defaults for text outside of <voice> and <prosody>.
+        """
+        if length_scale is None:
+            length_scale = self.config.length_scale
+
+        # Silence or a phrase to synthesize
+        plan: List[Union[BreakSegment, _SsmlPhrase]] = []
+        for segment in parse_ssml(ssml, self.config.speaker_id_map):
+            if isinstance(segment, BreakSegment):
+                plan.append(segment)
+                continue
+
+            segment_speaker_id = speaker_id
+            if segment.speaker_id is not None:
+                if segment.speaker_id >= self.config.num_speakers:
+                    raise ValueError(f"No speaker with id: {segment.speaker_id}")
+
+                segment_speaker_id = segment.speaker_id
+
+            segment_length_scale = length_scale / segment.rate
+            for phrase_ids, silence_seconds in self._get_phrases(
+                segment.text, sentence_silence
+            ):
+                plan.append(
+                    _SsmlPhrase(
+                        speaker_id=segment_speaker_id,
+                        length_scale=segment_length_scale,
+                        phoneme_ids=phrase_ids,
+                    )
+                )
+                if silence_seconds > 0:
+                    plan.append(BreakSegment(seconds=silence_seconds))
+
+        if (max_batch_size > 1) and self.gain.is_stateful:
+            _LOGGER.debug("Not batching with gain mode: %s", self.gain.mode)
+            max_batch_size = 1
+
+        if (max_batch_size > 1) and self.supports_batching:
+
+            def synthesize_group(
+                phrases: List[Tuple[List[int], float]],
+                key: Tuple[Optional[int], float],
+            ) -> Iterable[bytes]:
+                return self._synthesize_phrase_batch(
+                    phrases,
+                    speaker_id=key[0],
+                    length_scale=key[1],
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    max_batch_size=max_batch_size,
+                )
+
+            # Consecutive phrases with the same speaker and rate, with seconds
+            # of silence after each
+            group: List[Tuple[List[int], float]] = []
+            group_key: Tuple[Optional[int], float] = (speaker_id, length_scale)
+            for item in plan:
+                if isinstance(item, BreakSegment):
+                    if group:
+                        phrase_ids, silence_seconds = group[-1]
+                        group[-1] = (phrase_ids, silence_seconds + item.seconds)
+                    else:
+                        yield bytes(int(item.seconds * self.sample_rate) * 2)
+
+                    continue
+
+                item_key = (item.speaker_id, item.length_scale)
+                if group and (item_key != group_key):
+                    # Heard before the next group is run
+                    yield from synthesize_group(group, group_key)
+                    group = []
+
+                group_key = item_key
+                group.append((item.phoneme_ids, 0.0))
+
+            if group:
+                yield from synthesize_group(group, group_key)
+
+            return
+
+        # One sentence at a time, carrying gain and resampler state
+        gain_stage = self.make_gain_stage()
+        resampler = self.make_resampler()
+
+        def get_silence(seconds: float) -> bytes:
+            silence = np.zeros((int(seconds * self.config.sample_rate),), np.int16)
+            if resampler is not None:
+                return resampler.process(silence).tobytes()
+
+            return silence.tobytes()
+
+        for item in plan:
+            if isinstance(item, BreakSegment):
+                yield get_silence(item.seconds)
+                continue
+
+            yield self.synthesize_ids_to_raw(
+                item.phoneme_ids,
+                speaker_id=item.speaker_id,
+                length_scale=item.length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+                gain_stage=gain_stage,
+                resampler=resampler,
+            )
+
+        if resampler is not None:
+            yield resampler.flush().tobytes()
+
+    def make_gain_stage(self) -> GainStage:
+        """New gain stage for a stream of sentences."""
+        return GainStage(self.gain, self.config.sample_rate)
+
+    def make_resampler(self) -> Optional[Resampler]:
+        """New resampler for a stream of sentences, or None if not needed."""
+        if self.sample_rate == self.config.sample_rate:
+            return None
+
+        return Resampler(
+            self.config.sample_rate, self.sample_rate, quality=self.resample_quality
+        )
 
     def synthesize_ids_to_raw(
         self,
@@ -144,8 +788,594 @@ class PiperVoice:
         length_scale: Optional[float] = None,
         noise_scale: Optional[float] = None,
         noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+        resampler: Optional[Resampler] = None,
     ) -> bytes:
-        """Synthesize raw audio from phoneme ids."""
+        """Synthesize raw audio from phoneme ids.
+
+        Audio is looked up in and added to the audio cache, if set. Pass the
+        same gain_stage for consecutive sentences to carry gain state.
+        Without a resampler, audio is resampled as a whole sentence.
+        """
+        if self.is_streaming:
+            return b"".join(
+                self.synthesize_ids_to_raw_stream(
+                    phoneme_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    gain_stage=gain_stage,
+                    resampler=resampler,
+                )
+            )
+
+        audio_bytes = self._synthesize_ids_to_raw(
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            gain_stage=gain_stage,
+        )
+        if (resampler is None) and (self.sample_rate == self.config.sample_rate):
+            return audio_bytes
+
+        return self._resample(
+            np.frombuffer(audio_bytes, dtype=np.int16), resampler
+        ).tobytes()
+
+    def _synthesize_ids_to_raw(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+    ) -> bytes:
+        """Raw audio at the model's sample rate, using the audio cache."""
+        if self.is_streaming:
+            return b"".join(
+                self._synthesize_ids_to_raw_stream(
+                    phoneme_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                    gain_stage=gain_stage,
+                )
+            )
+
+        cache_key = self._get_audio_cache_key(
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+        if cache_key is not None:
+            assert self.audio_cache is not None
+            cached_audio_bytes = self.audio_cache.get(cache_key)
+            if cached_audio_bytes is not None:
+                return cached_audio_bytes
+
+        audio = self._infer(
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+        audio_bytes = self._apply_gain(audio, gain_stage).tobytes()
+
+        if cache_key is not None:
+            assert self.audio_cache is not None
+            self.audio_cache.put(cache_key, audio_bytes)
+
+        return audio_bytes
+
+    def synthesize_ids_to_audio(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+        out: Optional[np.ndarray] = None,
+        resampler: Optional[Resampler] = None,
+    ) -> np.ndarray:
+        """Synthesize 16-bit audio samples from phoneme ids.
+
+        Like synthesize_ids_to_raw, but returns a read-only int16 view of the
+        raw audio. If out (int16) is large enough, samples are copied to the
+        start of it and a view of out is returned instead.
+        """
+        audio = np.frombuffer(
+            self.synthesize_ids_to_raw(
+                phoneme_ids,
+                speaker_id=speaker_id,
+                length_scale=length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+                gain_stage=gain_stage,
+                resampler=resampler,
+            ),
+            dtype=np.int16,
+        )
+        return _copy_to_buffer(audio, out)
+
+    def _infer(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+    ) -> np.ndarray:
+        """Float audio for a single sentence (not a streaming model)."""
+        phoneme_ids_array = np.expand_dims(np.array(phoneme_ids, dtype=np.int64), 0)
+        phoneme_ids_lengths = np.array([phoneme_ids_array.shape[1]], dtype=np.int64)
+        args = self._get_run_args(
+            phoneme_ids_array,
+            phoneme_ids_lengths,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+
+        # Synthesize through Onnx
+        return self.session.run(None, args)[0].reshape(-1)
+
+    def _resample(
+        self, audio: np.ndarray, resampler: Optional[Resampler] = None
+    ) -> np.ndarray:
+        """Resample audio to sample_rate.
+
+        Without a resampler, audio is treated as a whole sentence.
+        """
+        if resampler is not None:
+            return resampler.process(audio)
+
+        resampler = self.make_resampler()
+        if resampler is None:
+            return audio
+
+        return np.concatenate([resampler.process(audio), resampler.flush()])
+
+    def synthesize_ids_to_raw_stream(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+        resampler: Optional[Resampler] = None,
+    ) -> Iterable[bytes]:
+        """Synthesize raw audio from phoneme ids in chunks.
+
+        Only streaming models produce more than one chunk. Since the loudest
+        part of the sentence isn't known up front, in the default gain mode
+        each chunk is scaled by the highest peak seen so far.
+
+        Without a resampler, audio is resampled as a whole sentence.
+        """
+        if not self.is_streaming:
+            yield self.synthesize_ids_to_raw(
+                phoneme_ids,
+                speaker_id=speaker_id,
+                length_scale=length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+                gain_stage=gain_stage,
+                resampler=resampler,
+            )
+            return
+
+        flush_resampler = False
+        if resampler is None:
+            resampler = self.make_resampler()
+            flush_resampler = resampler is not None
+
+        for audio_bytes in self._synthesize_ids_to_raw_stream(
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            gain_stage=gain_stage,
+        ):
+            if resampler is not None:
+                audio_bytes = resampler.process(
+                    np.frombuffer(audio_bytes, dtype=np.int16)
+                ).tobytes()
+
+            if audio_bytes:
+                yield audio_bytes
+
+        if flush_resampler:
+            assert resampler is not None
+            yield resampler.flush().tobytes()
+
+    def _synthesize_ids_to_raw_stream(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        gain_stage: Optional[GainStage] = None,
+    ) -> Iterable[bytes]:
+        """Raw audio chunks at the model's sample rate, using the audio cache."""
+        assert self.decoder is not None
+
+        cache_key = self._get_audio_cache_key(
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+        if cache_key is not None:
+            assert self.audio_cache is not None
+            cached_audio_bytes = self.audio_cache.get(cache_key)
+            if cached_audio_bytes is not None:
+                yield cached_audio_bytes
+                return
+
+        phoneme_ids_array = np.expand_dims(np.array(phoneme_ids, dtype=np.int64), 0)
+        phoneme_ids_lengths = np.array([phoneme_ids_array.shape[1]], dtype=np.int64)
+        args = self._get_run_args(
+            phoneme_ids_array,
+            phoneme_ids_lengths,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+
+        # z, y_mask[, g]
+        encoder_outputs = self.session.run(None, args)
+        decoder_inputs = dict(
+            zip((output.name for output in self.session.get_outputs()), encoder_outputs)
+        )
+
+        if gain_stage is None:
+            gain_stage = self.make_gain_stage()
+
+        # Reused for each chunk's 16-bit samples before they're copied to bytes
+        buffer = np.zeros((0,), dtype=np.int16)
+
+        chunks: List[bytes] = []
+        for audio in self._decode_chunks(decoder_inputs):
+            if buffer.size < audio.size:
+                buffer = np.empty((audio.size,), dtype=np.int16)
+
+            audio_bytes = gain_stage.process(audio, out=buffer).tobytes()
+            if not audio_bytes:
+                continue
+
+            chunks.append(audio_bytes)
+            yield audio_bytes
+
+        # Samples held back by the limiter
+        audio_bytes = gain_stage.flush().tobytes()
+        gain_stage.end_sentence()
+        if audio_bytes:
+            chunks.append(audio_bytes)
+            yield audio_bytes
+
+        if cache_key is not None:
+            assert self.audio_cache is not None
+            self.audio_cache.put(cache_key, b"".join(chunks))
+
+    def _decode_chunks(
+        self, decoder_inputs: Dict[str, np.ndarray]
+    ) -> Iterable[np.ndarray]:
+        """Decode frames in chunks with padding on both sides.
+
+        Padding is cut off, except for crossfade_frames on each side of a
+        chunk boundary which are overlap-added with the next chunk.
+        """
+        assert self.decoder is not None
+
+        z = decoder_inputs["z"]
+        y_mask = decoder_inputs["y_mask"]
+        g = decoder_inputs.get("g")
+        num_frames = z.shape[2]
+
+        overlap = max(0, min(self.crossfade_frames, self.chunk_padding))
+
+        # Chunks must be long enough to hold a crossfade on both ends
+        min_chunk_size = (2 * overlap) + 1
+        max_chunk_size = max(min_chunk_size, self.chunk_size)
+        scheduler = ChunkScheduler(
+            first_chunk_size=max(
+                min_chunk_size, self.first_chunk_size or max_chunk_size
+            ),
+            max_chunk_size=max_chunk_size,
+        )
+
+        if num_frames <= (scheduler.chunk_size + (2 * self.chunk_padding)):
+            # Too short to stream
+            yield self._decode(z, y_mask, g)
+            return
+
+        stitcher = AudioStitcher(self.crossfade_window)
+        first_audio_time: Optional[float] = None
+        num_samples = 0
+
+        chunk_start = 0
+        while chunk_start < num_frames:
+            chunk_end = min(num_frames, chunk_start + scheduler.chunk_size)
+            if (num_frames - chunk_end) < min_chunk_size:
+                # Too little left for another chunk
+                chunk_end = num_frames
+
+            overlap_start = overlap if chunk_start > 0 else 0
+            overlap_end = overlap if chunk_end < num_frames else 0
+            pad_start = min(self.chunk_padding, chunk_start)
+            pad_end = min(self.chunk_padding, num_frames - chunk_end)
+
+            frames = slice(chunk_start - pad_start, chunk_end + pad_end)
+            decode_start_time = time.monotonic()
+            audio = self._decode(z[:, :, frames], y_mask[:, :, frames], g)
+            decode_seconds = time.monotonic() - decode_start_time
+
+            # Samples per frame
+            hop_length = len(audio) // (frames.stop - frames.start)
+            audio = audio[
+                (pad_start - overlap_start) * hop_length : len(audio)
+                - ((pad_end - overlap_end) * hop_length)
+            ]
+
+            yield stitcher.add(audio, tail_samples=2 * overlap_end * hop_length)
+
+            # Assume playback starts with the first chunk
+            now = time.monotonic()
+            if first_audio_time is None:
+                first_audio_time = now
+
+            num_samples += len(audio) - (2 * overlap_end * hop_length)
+            buffered_seconds = (num_samples / self.config.sample_rate) - (
+                now - first_audio_time
+            )
+            scheduler.update(chunk_end - chunk_start, decode_seconds, buffered_seconds)
+            chunk_start = chunk_end
+
+        yield stitcher.flush()
+
+    def _decode(
+        self, z: np.ndarray, y_mask: np.ndarray, g: Optional[np.ndarray]
+    ) -> np.ndarray:
+        assert self.decoder is not None
+
+        decoder_args = {"z": z, "y_mask": y_mask}
+        if g is not None:
+            decoder_args["g"] = g
+
+        return self.decoder.run(None, decoder_args)[0].reshape(-1)
+
+    @property
+    def supports_batching(self) -> bool:
+        """True if the model reports per-utterance audio lengths."""
+        return any(
+            output.name == _OUTPUT_LENGTHS for output in self.session.get_outputs()
+        )
+
+    def synthesize_batch(
+        self,
+        phoneme_ids_batch: Sequence[List[int]],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        max_batch_size: int = 8,
+        max_padding_ratio: float = 1.5,
+    ) -> List[bytes]:
+        """Synthesize raw audio for multiple phoneme id sequences.
+
+        Sequences of similar length are padded and run through Onnx together.
+        A batch holds at most max_batch_size sequences, and its padded size is
+        at most max_padding_ratio times its real size.
+
+        Audio is returned in the same order as phoneme_ids_batch. Without
+        noise, it's the same as synthesizing each sequence on its own.
+        """
+        results = self._synthesize_batch(
+            phoneme_ids_batch,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+            max_batch_size=max_batch_size,
+            max_padding_ratio=max_padding_ratio,
+        )
+        if self.sample_rate == self.config.sample_rate:
+            return results
+
+        return [
+            self._resample(np.frombuffer(audio_bytes, dtype=np.int16)).tobytes()
+            for audio_bytes in results
+        ]
+
+    def _synthesize_batch(
+        self,
+        phoneme_ids_batch: Sequence[List[int]],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+        max_batch_size: int = 8,
+        max_padding_ratio: float = 1.5,
+    ) -> List[bytes]:
+        """Raw audio at the model's sample rate, using the audio cache."""
+        if (max_batch_size <= 1) or (not self.supports_batching):
+            if max_batch_size > 1:
+                _LOGGER.debug("Model has no %s output, not batching", _OUTPUT_LENGTHS)
+
+            return [
+                self._synthesize_ids_to_raw(
+                    phoneme_ids,
+                    speaker_id=speaker_id,
+                    length_scale=length_scale,
+                    noise_scale=noise_scale,
+                    noise_w=noise_w,
+                )
+                for phoneme_ids in phoneme_ids_batch
+            ]
+
+        results: List[Optional[bytes]] = [None] * len(phoneme_ids_batch)
+        cache_keys: List[Optional[str]] = [
+            self._get_audio_cache_key(
+                phoneme_ids,
+                speaker_id=speaker_id,
+                length_scale=length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+            )
+            for phoneme_ids in phoneme_ids_batch
+        ]
+
+        if self.audio_cache is not None:
+            for idx, cache_key in enumerate(cache_keys):
+                if cache_key is not None:
+                    results[idx] = self.audio_cache.get(cache_key)
+
+        # Only synthesize what wasn't cached
+        missing_indexes = [idx for idx, result in enumerate(results) if result is None]
+        for batch_indexes in _make_batches(
+            [len(phoneme_ids_batch[idx]) for idx in missing_indexes],
+            max_batch_size=max_batch_size,
+            max_padding_ratio=max_padding_ratio,
+        ):
+            batch_indexes = [missing_indexes[idx] for idx in batch_indexes]
+            batch_audio = self._synthesize_padded(
+                [phoneme_ids_batch[idx] for idx in batch_indexes],
+                speaker_id=speaker_id,
+                length_scale=length_scale,
+                noise_scale=noise_scale,
+                noise_w=noise_w,
+            )
+            for idx, audio_bytes in zip(batch_indexes, batch_audio):
+                results[idx] = audio_bytes
+
+                cache_key = cache_keys[idx]
+                if (self.audio_cache is not None) and (cache_key is not None):
+                    self.audio_cache.put(cache_key, audio_bytes)
+
+        return [audio_bytes or b"" for audio_bytes in results]
+
+    def _synthesize_padded(
+        self,
+        phoneme_ids_batch: Sequence[List[int]],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+    ) -> List[bytes]:
+        """Synthesize a single padded batch of phoneme ids."""
+        pad_id = self.config.phoneme_id_map[PAD][0]
+        batch_size = len(phoneme_ids_batch)
+        max_length = max(len(phoneme_ids) for phoneme_ids in phoneme_ids_batch)
+
+        # [B, T]
+        phoneme_ids_array = np.full((batch_size, max_length), pad_id, dtype=np.int64)
+        phoneme_ids_lengths = np.zeros((batch_size,), dtype=np.int64)
+        for batch_idx, phoneme_ids in enumerate(phoneme_ids_batch):
+            phoneme_ids_array[batch_idx, : len(phoneme_ids)] = phoneme_ids
+            phoneme_ids_lengths[batch_idx] = len(phoneme_ids)
+
+        args = self._get_run_args(
+            phoneme_ids_array,
+            phoneme_ids_lengths,
+            speaker_id=speaker_id,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+
+        # Synthesize through Onnx
+        audio, audio_lengths = self.session.run(["output", _OUTPUT_LENGTHS], args)
+        audio = audio.reshape((batch_size, -1))
+
+        # Slice off padding and scale each utterance independently
+        gain_stage = self.make_gain_stage()
+        return [
+            self._apply_gain(
+                audio[batch_idx, : audio_lengths[batch_idx]], gain_stage
+            ).tobytes()
+            for batch_idx in range(batch_size)
+        ]
+
+    def _apply_gain(
+        self, audio: np.ndarray, gain_stage: Optional[GainStage] = None
+    ) -> np.ndarray:
+        """Scale a whole sentence of float audio to 16-bit samples."""
+        if gain_stage is None:
+            gain_stage = self.make_gain_stage()
+
+        return gain_stage.process_sentence(audio)
+
+    def _get_audio_cache_key(
+        self,
+        phoneme_ids: List[int],
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+    ) -> Optional[str]:
+        """Audio cache key, or None if audio can't be cached."""
+        if (self.audio_cache is None) or self.gain.is_stateful:
+            # Running gain depends on previous sentences
+            return None
+
+        if noise_scale is None:
+            noise_scale = self.config.noise_scale
+
+        if noise_w is None:
+            noise_w = self.config.noise_w
+
+        if ((noise_scale != 0) or (noise_w != 0)) and (
+            not self.audio_cache.allow_noise
+        ):
+            # Audio is different every time
+            return None
+
+        model_hash = self.model_hash
+        if self.gain.mode != GainMode.SENTENCE:
+            model_hash = f"{model_hash}|{self.gain}"
+
+        if self.config.num_speakers <= 1:
+            speaker_id = None
+        elif speaker_id is None:
+            # Default speaker
+            speaker_id = 0
+
+        return make_audio_cache_key(
+            model_hash,
+            phoneme_ids,
+            speaker_id=speaker_id,
+            length_scale=(
+                self.config.length_scale if length_scale is None else length_scale
+            ),
+            noise_scale=noise_scale,
+            noise_w=noise_w,
+        )
+
+    def _get_run_args(
+        self,
+        phoneme_ids_array: np.ndarray,
+        phoneme_ids_lengths: np.ndarray,
+        speaker_id: Optional[int] = None,
+        length_scale: Optional[float] = None,
+        noise_scale: Optional[float] = None,
+        noise_w: Optional[float] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Onnx inputs for a [B, T] phoneme id array."""
         if length_scale is None:
             length_scale = self.config.length_scale
 
@@ -155,8 +1385,6 @@ class PiperVoice:
         if noise_w is None:
             noise_w = self.config.noise_w
 
-        phoneme_ids_array = np.expand_dims(np.array(phoneme_ids, dtype=np.int64), 0)
-        phoneme_ids_lengths = np.array([phoneme_ids_array.shape[1]], dtype=np.int64)
         scales = np.array(
             [noise_scale, length_scale, noise_w],
             dtype=np.float32,
@@ -165,7 +1393,7 @@ class PiperVoice:
         args = {
             "input": phoneme_ids_array,
             "input_lengths": phoneme_ids_lengths,
-            "scales": scales
+            "scales": scales,
         }
 
         if self.config.num_speakers <= 1:
@@ -176,10 +1404,46 @@ class PiperVoice:
             speaker_id = 0
 
         if speaker_id is not None:
-            sid = np.array([speaker_id], dtype=np.int64)
+            sid = np.full((phoneme_ids_array.shape[0],), speaker_id, dtype=np.int64)
             args["sid"] = sid
 
-        # Synthesize through Onnx
-        audio = self.session.run(None, args, )[0].squeeze((0, 1))
-        audio = audio_float_to_int16(audio.squeeze())
-        return audio.tobytes()
+        return args
+
+
+# -----------------------------------------------------------------------------
+
+
+def _copy_to_buffer(audio: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    """Copy audio to the start of out if it fits, otherwise return audio."""
+    if (out is None) or (out.size < audio.size):
+        return audio
+
+    out = out[: audio.size]
+    out[:] = audio
+    return out
+
+
+def _make_batches(
+    lengths: Sequence[int], max_batch_size: int, max_padding_ratio: float
+) -> Iterable[List[int]]:
+    """Group indexes of similar lengths into batches."""
+    batch_indexes: List[int] = []
+    batch_real_length = 0
+
+    # Longest first, so the first item in each batch sets the padded length
+    for idx in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        if batch_indexes:
+            padded_length = lengths[batch_indexes[0]] * (len(batch_indexes) + 1)
+            real_length = batch_real_length + lengths[idx]
+            if (len(batch_indexes) >= max_batch_size) or (
+                padded_length > (max_padding_ratio * real_length)
+            ):
+                yield batch_indexes
+                batch_indexes = []
+                batch_real_length = 0
+
+        batch_indexes.append(idx)
+        batch_real_length += lengths[idx]
+
+    if batch_indexes:
+        yield batch_indexes
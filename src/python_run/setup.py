@@ -33,7 +33,12 @@ setup(
         ]
     },
     install_requires=requirements,
-    extras_require={"gpu": ["onnxruntime-gpu>=1.11.0,<2"], "http": ["flask>=3,<4"]},
+    extras_require={
+        "gpu": ["onnxruntime-gpu>=1.11.0,<2"],
+        "http": ["flask>=3,<4"],
+        "asgi": ["uvicorn[standard]>=0.20,<1"],
+        "encoders": ["soundfile>=0.13,<1"],
+    },
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
@@ -0,0 +1,44 @@
+"""Tests for the bulk synthesis manifest"""
+import json
+
+from piper.bulk import get_text_hash, read_manifest
+
+
+def _entry_line(index: int, text: str) -> str:
+    return (
+        json.dumps(
+            {
+                "index": index,
+                "text_hash": get_text_hash(text),
+                "file": f"{index:08d}.wav",
+            }
+        )
+        + "\n"
+    )
+
+
+def test_missing_manifest(tmp_path) -> None:
+    assert read_manifest(tmp_path / "manifest.jsonl") == set()
+
+
+def test_partial_line(tmp_path) -> None:
+    """A partial last line from a crash is cut off."""
+    manifest_path = tmp_path / "manifest.jsonl"
+    complete_lines = _entry_line(0, "First line.") + _entry_line(2, "Third line.")
+    manifest_path.write_text(complete_lines + '{"index": 3, "te', encoding="utf-8")
+
+    assert read_manifest(manifest_path) == {
+        (0, get_text_hash("First line.")),
+        (2, get_text_hash("Third line.")),
+    }
+    assert manifest_path.read_text(encoding="utf-8") == complete_lines
+
+
+def test_bad_line(tmp_path) -> None:
+    """Complete lines that can't be read are skipped, but kept."""
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest_text = _entry_line(0, "First line.") + "not json\n" + '{"index": 1}\n'
+    manifest_path.write_text(manifest_text, encoding="utf-8")
+
+    assert read_manifest(manifest_path) == {(0, get_text_hash("First line."))}
+    assert manifest_path.read_text(encoding="utf-8") == manifest_text
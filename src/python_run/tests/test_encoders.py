@@ -0,0 +1,42 @@
+"""Tests for choosing an output format"""
+import pytest
+
+from piper.encoders import OutputFormat, get_output_format
+
+ALL_FORMATS = list(OutputFormat)
+
+
+@pytest.mark.parametrize(
+    "accept,expected_format",
+    [
+        (None, OutputFormat.WAV),
+        ("", OutputFormat.WAV),
+        ("*/*", OutputFormat.WAV),
+        ("audio/*", OutputFormat.WAV),
+        ("audio/flac", OutputFormat.FLAC),
+        ("Audio/MPEG", OutputFormat.MP3),
+        ("audio/opus", OutputFormat.OGG),
+        # Highest quality wins
+        ("audio/flac;q=0.5, audio/ogg;q=0.9", OutputFormat.OGG),
+        ("audio/ogg; q=0.2, audio/mpeg", OutputFormat.MP3),
+        # Specific types win over wildcards with the same quality
+        ("*/*, audio/flac", OutputFormat.FLAC),
+        ("audio/flac;q=0.5, */*", OutputFormat.WAV),
+        # q=0 means not acceptable
+        ("audio/flac;q=0", None),
+        ("audio/flac;q=0, audio/mpeg;q=0.1", OutputFormat.MP3),
+        ("audio/flac;q=oops", None),
+        ("text/html", None),
+    ],
+)
+def test_get_output_format(accept, expected_format) -> None:
+    assert get_output_format(accept, ALL_FORMATS) == expected_format
+
+
+def test_unavailable_format() -> None:
+    """Formats without an encoder are skipped."""
+    assert get_output_format("audio/flac", [OutputFormat.WAV]) is None
+    assert (
+        get_output_format("audio/flac, audio/wav;q=0.5", [OutputFormat.WAV])
+        == OutputFormat.WAV
+    )
@@ -0,0 +1,62 @@
+"""Tests for gain and limiting"""
+import numpy as np
+import pytest
+
+from piper.gain import GainMode, GainSettings, GainStage
+
+SAMPLE_RATE = 22050
+
+
+def _get_loud_audio() -> np.ndarray:
+    """Sine wave with sudden peaks."""
+    rng = np.random.default_rng(1234)
+    seconds = np.arange(SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    audio = 0.3 * np.sin(2 * np.pi * 220 * seconds)
+    peaks = rng.integers(0, len(audio), size=20)
+    audio[peaks] = rng.choice([-1.0, 1.0], size=len(peaks))
+
+    return audio.astype(np.float32)
+
+
+def _process_chunks(gain_stage: GainStage, audio: np.ndarray) -> np.ndarray:
+    chunks = [
+        gain_stage.process(audio[chunk_start : chunk_start + 1000])
+        for chunk_start in range(0, len(audio), 1000)
+    ]
+    chunks.append(gain_stage.flush())
+
+    return np.concatenate(chunks)
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        GainSettings(mode=GainMode.FIXED, gain_db=20.0),
+        GainSettings(mode=GainMode.RMS, target_rms_db=-3.0),
+    ],
+)
+def test_limiter_ceiling(settings: GainSettings) -> None:
+    """Limited audio never goes over the ceiling."""
+    audio = _get_loud_audio()
+    output = _process_chunks(GainStage(settings, SAMPLE_RATE), audio)
+
+    assert len(output) == len(audio)
+    assert np.abs(output.astype(np.int32)).max() <= (settings.ceiling * 32767) + 1
+
+
+def test_no_limiter_clips() -> None:
+    """Without the limiter, loud audio is clipped to full scale."""
+    settings = GainSettings(mode=GainMode.FIXED, gain_db=20.0, limiter=False)
+    output = _process_chunks(GainStage(settings, SAMPLE_RATE), _get_loud_audio())
+
+    assert np.abs(output.astype(np.int32)).max() == 32767
+
+
+def test_sentence_peak() -> None:
+    """Sentence mode scales each sentence to its own peak."""
+    gain_stage = GainStage(GainSettings(), SAMPLE_RATE)
+    loud = gain_stage.process_sentence(_get_loud_audio())
+    quiet = gain_stage.process_sentence(_get_loud_audio() * 0.1)
+
+    assert np.abs(loud.astype(np.int32)).max() == 32767
+    assert np.abs(quiet.astype(np.int32)).max() == 32767
@@ -0,0 +1,73 @@
+"""Tests for the phoneme cache"""
+from piper.phoneme_cache import PhonemeCache, _estimate_bytes
+
+
+def _key(text: str):
+    return ("en-us", "espeak", text)
+
+
+SENTENCES = [["h", "ə", "l", "oʊ"]]
+
+
+def test_lru_eviction() -> None:
+    """Least recently used entries are evicted first."""
+    entry_bytes = _estimate_bytes(_key("a"), SENTENCES)
+    cache = PhonemeCache(max_bytes=entry_bytes * 2)
+
+    cache.put(_key("a"), SENTENCES)
+    cache.put(_key("b"), SENTENCES)
+    assert cache.get(_key("a")) == SENTENCES
+
+    # "b" is least recently used
+    cache.put(_key("c"), SENTENCES)
+
+    assert len(cache) == 2
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("a")) == SENTENCES
+    assert cache.get(_key("c")) == SENTENCES
+    assert cache.num_bytes <= cache.max_bytes
+
+
+def test_replace_entry() -> None:
+    """Putting the same key again doesn't count its size twice."""
+    cache = PhonemeCache()
+    cache.put(_key("a"), SENTENCES)
+    num_bytes = cache.num_bytes
+    cache.put(_key("a"), SENTENCES)
+
+    assert len(cache) == 1
+    assert cache.num_bytes == num_bytes
+
+
+def test_too_big() -> None:
+    """Entries bigger than the whole cache aren't added."""
+    cache = PhonemeCache(max_bytes=10)
+    cache.put(_key("a"), SENTENCES)
+
+    assert len(cache) == 0
+    assert cache.num_bytes == 0
+
+
+def test_hit_ratio() -> None:
+    cache = PhonemeCache()
+    cache.put(_key("a"), SENTENCES)
+    cache.get(_key("a"))
+    cache.get(_key("b"))
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_ratio == 0.5
+
+
+def test_save_load(tmp_path) -> None:
+    cache_path = tmp_path / "phonemes.json"
+    cache = PhonemeCache()
+    cache.put(_key("a"), SENTENCES)
+    cache.put(_key("b"), [["b"], ["c"]])
+    cache.save(cache_path)
+
+    loaded_cache = PhonemeCache()
+    loaded_cache.load(cache_path)
+
+    assert len(loaded_cache) == 2
+    assert loaded_cache.get(_key("a")) == SENTENCES
+    assert loaded_cache.get(_key("b")) == [["b"], ["c"]]
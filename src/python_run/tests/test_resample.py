@@ -0,0 +1,56 @@
+"""Tests for streaming sample rate conversion"""
+import math
+
+import numpy as np
+import pytest
+
+from piper.resample import ResampleQuality, Resampler
+
+
+@pytest.mark.parametrize("input_rate,output_rate", [(22050, 16000), (16000, 48000)])
+@pytest.mark.parametrize("quality", list(ResampleQuality))
+def test_chunked_equals_whole(
+    input_rate: int, output_rate: int, quality: ResampleQuality
+) -> None:
+    """Resampling in chunks of any size gives the same audio as all at once."""
+    rng = np.random.default_rng(1234)
+    audio = rng.integers(-10000, 10000, size=input_rate // 2).astype(np.int16)
+
+    resampler = Resampler(input_rate, output_rate, quality=quality)
+    whole = np.concatenate([resampler.process(audio), resampler.flush()])
+
+    chunks = []
+    chunk_start = 0
+    for chunk_size in [1, 7, 100, 0, 2048, 333] * 100:
+        if chunk_start >= len(audio):
+            break
+
+        chunks.append(resampler.process(audio[chunk_start : chunk_start + chunk_size]))
+        chunk_start += chunk_size
+
+    chunks.append(resampler.flush())
+    chunked = np.concatenate(chunks)
+
+    assert len(whole) == math.ceil(len(audio) * output_rate / input_rate)
+    np.testing.assert_array_equal(chunked, whole)
+
+
+def test_flush_starts_over() -> None:
+    """After flush, the next stream is resampled from scratch."""
+    audio = np.arange(-4000, 4000, 3, dtype=np.int16)
+    resampler = Resampler(22050, 16000)
+
+    first = np.concatenate([resampler.process(audio), resampler.flush()])
+    second = np.concatenate([resampler.process(audio), resampler.flush()])
+
+    np.testing.assert_array_equal(first, second)
+
+
+def test_passthrough() -> None:
+    """Audio at the output rate isn't changed."""
+    audio = np.arange(100, dtype=np.int16)
+    resampler = Resampler(16000, 16000)
+
+    assert resampler.is_passthrough
+    np.testing.assert_array_equal(resampler.process(audio), audio)
+    assert resampler.flush().size == 0
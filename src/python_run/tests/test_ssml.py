@@ -0,0 +1,82 @@
+"""Tests for SSML parsing"""
+import pytest
+
+from piper.ssml import BreakSegment, SpeechSegment, parse_ssml
+
+
+def test_text_and_breaks() -> None:
+    assert parse_ssml(
+        "<speak>Hello <break time='500ms'/> world <break strength='strong'/>"
+        "<break time='2s'/></speak>"
+    ) == [
+        SpeechSegment(text="Hello"),
+        BreakSegment(seconds=0.5),
+        SpeechSegment(text="world"),
+        BreakSegment(seconds=0.75),
+        BreakSegment(seconds=2.0),
+    ]
+
+
+def test_namespace() -> None:
+    assert parse_ssml(
+        '<speak xmlns="http://www.w3.org/2001/10/synthesis">Hello</speak>'
+    ) == [SpeechSegment(text="Hello")]
+
+
+def test_prosody_rate() -> None:
+    """Nested rates are multiplied."""
+    assert parse_ssml(
+        "<speak>"
+        "<prosody rate='slow'>Slow <prosody rate='200%'>medium</prosody></prosody>"
+        "<prosody rate='+100%'>fast</prosody>"
+        "</speak>"
+    ) == [
+        SpeechSegment(text="Slow", rate=0.75),
+        SpeechSegment(text="medium", rate=1.5),
+        SpeechSegment(text="fast", rate=2.0),
+    ]
+
+
+def test_voice() -> None:
+    """Voices are speaker names or ids."""
+    assert parse_ssml(
+        "<speak><voice name='alice'>One</voice> <voice name='2'>Two</voice></speak>",
+        speaker_id_map={"alice": 1},
+    ) == [
+        SpeechSegment(text="One", speaker_id=1),
+        SpeechSegment(text="Two", speaker_id=2),
+    ]
+
+
+def test_merge_text() -> None:
+    """Adjacent text with the same parameters is one segment, except across s/p."""
+    assert parse_ssml(
+        "<speak>A <sub alias='substitute'>sub</sub> and "
+        "<say-as interpret-as='characters'>abc</say-as>"
+        "<s>New sentence</s></speak>"
+    ) == [
+        SpeechSegment(text="A substitute and a b c"),
+        SpeechSegment(text="New sentence"),
+    ]
+
+
+def test_say_as() -> None:
+    assert parse_ssml(
+        "<speak><say-as interpret-as='telephone'>555-1234</say-as></speak>"
+    ) == [SpeechSegment(text="5 5 5, 1 2 3 4")]
+
+
+@pytest.mark.parametrize(
+    "ssml",
+    [
+        "<speak>Unclosed",
+        "<notspeak>Hello</notspeak>",
+        "<speak><break time='soon'/></speak>",
+        "<speak><break strength='loud'/></speak>",
+        "<speak><prosody rate='-100%'>Stop</prosody></speak>",
+        "<speak><voice name='nobody'>Hello</voice></speak>",
+    ],
+)
+def test_invalid(ssml: str) -> None:
+    with pytest.raises(ValueError):
+        parse_ssml(ssml)